@@ -4,19 +4,21 @@ from .utils.cell_clear_selection import CellClearSelection
 from ..cell.utils.cell_widgets import CellWidgets
 
 class InteractiveContinuousCell(VariableCell):
-    def __init__(self, name, control):
+    def __init__(self, name, control, lazy = False):
         """
             Parameters:
             --------
                 name            A String within the set {"<variableName>"}.
                 control         A Control object
+                lazy            A Boolean: if True, the cell's spaces are built on demand.
         """
         self.selection = {}
         self.sel_samples = {}
         self.non_sel_samples = {}
         self.reconstructed = {}
         self.clear_selection = {}
-        VariableCell.__init__(self, name, control)
+        self.sorted_samples = {}
+        VariableCell.__init__(self, name, control, lazy)
 
     def initialize_cds(self, space):
         CellContinuousHandler.initialize_cds_interactive(self, space)
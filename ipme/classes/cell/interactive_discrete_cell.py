@@ -4,17 +4,19 @@ from .utils.cell_clear_selection import CellClearSelection
 from ..cell.utils.cell_widgets import CellWidgets
 
 class InteractiveDiscreteCell(VariableCell):
-    def __init__(self, name, control):
+    def __init__(self, name, control, lazy = False):
         """
             Parameters:
             --------
                 name            A String within the set {"<variableName>"}.
                 control         A Control object
+                lazy            A Boolean: if True, the cell's spaces are built on demand.
         """
+        self.codes = {}
         self.selection = {}
         self.reconstructed = {}
         self.clear_selection = {}
-        VariableCell.__init__(self, name, control)
+        VariableCell.__init__(self, name, control, lazy)
 
     def initialize_cds(self, space):
         CellDiscreteHandler.initialize_cds_interactive(self, space)
@@ -8,6 +8,7 @@ from ..cell.utils.cell_widgets import CellWidgets
 
 # import numpy as np
 from bokeh.models import LegendItem
+from bokeh.core.properties import value
 
 # import threading
 # from abc import abstractmethod
@@ -78,14 +79,22 @@ class InteractivePredCheckCell(PredictiveCheckCell):
     #     self.plot[space].tools.append(hover)
 
     ## Update legends when data in _pvalue_rec cds is updated
+    ## The p-value item is relabelled in place once created: replacing it adds a
+    ## new model to the document, which recomputes all of the document's models.
     def update_legends(self, space, attr, old, new):
-        if len(self.plot[space].legend.items) == 3:
-            self.plot[space].legend.items.pop()
+        if not len(self.plot[space].legend):
+            return
+        legend = self.plot[space].legend[0]
         r = self.plot[space].select(name="sel")
         pvalue = self.pvalue_rec[space].data["pv"]
         if len(r) and len(pvalue):
-            self.plot[space].legend.items.append(LegendItem(label="p-value = " + format(pvalue[0], '.4f'), \
-                                                            renderers=[r[0]]))
+            label = "p-value = " + format(pvalue[0], '.4f')
+            if len(legend.items) == 3:
+                legend.items[2].label = value(label)
+            else:
+                legend.items = legend.items + [LegendItem(label = label, renderers = [r[0]])]
+        elif len(legend.items) == 3:
+            legend.items = legend.items[:2]
 
     # def widget_callback(self, attr, old, new, w_title, space):
     #     inds = self.ic.data.get_indx_for_idx_dim(self.name, w_title, new)
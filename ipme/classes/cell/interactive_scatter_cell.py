@@ -1,18 +1,34 @@
 from ipme.interfaces.scatter_cell import ScatterCell
 from .utils.cell_scatter_handler import CellScatterHandler
 from ..cell.utils.cell_widgets import CellWidgets
+from ipme.utils.constants import RASTER_THRESHOLD, CONTOURS_PREFETCH
 
 class InteractiveScatterCell(ScatterCell):
-    def __init__(self, vars, control):
+    def __init__(self, vars, control, lazy = False, raster_threshold = RASTER_THRESHOLD, contours_prefetch = CONTOURS_PREFETCH):
         """
             Parameters:
             --------
-                name            A String within the set {"<variableName>"}.
-                control         A Control object
+                name                A String within the set {"<variableName>"}.
+                control             A Control object
+                lazy                A Boolean: if True, the cell's spaces are built on demand.
+                raster_threshold    An Int of the number of draws above which the samples are drawn
+                                    as an image (None: never).
+                contours_prefetch   A Boolean: if True, the contours of the adjacent index dimensions values
+                                    are computed in the background after a change of index dimension.
+            Sets:
+            --------
+                raster              A Dict {<space>: Boolean, True if the samples of <space> are rasterised}.
+                raster_codes        A Dict {<space>: numpy.ndarray of the pixel of each sample (see encode_raster)}.
+                raster_image        A Dict {<space>: cds of the image of the samples, as uint8 indices into the raster palette}.
         """
         self.sel_samples = {}
         self.non_sel_samples = {}
-        ScatterCell.__init__(self, vars, control)
+        self.raster_threshold = raster_threshold
+        self.contours_prefetch = contours_prefetch
+        self.raster = {}
+        self.raster_codes = {}
+        self.raster_image = {}
+        ScatterCell.__init__(self, vars, control, lazy)
 
     def initialize_cds(self, space):
         CellScatterHandler.initialize_cds_interactive(self, space)
@@ -2,17 +2,19 @@ from ipme.interfaces.variable_cell import VariableCell
 from .utils.cell_discrete_handler import CellDiscreteHandler
 from ..cell.utils.cell_widgets import CellWidgets
 
-from ipme.utils.functions import get_stratum_range, find_indices
+from ipme.utils.functions import get_stratum_range, find_mask
 
 class StaticDiscreteCell(VariableCell):
-    def __init__(self, name, control):
+    def __init__(self, name, control, lazy = False):
         """
             Parameters:
             --------
                 name            A String within the set {"<variableName>"}.
                 control         A Control object
+                lazy            A Boolean: if True, the cell's spaces are built on demand.
         """
-        VariableCell.__init__(self, name, control)
+        self.codes = {}
+        VariableCell.__init__(self, name, control, lazy)
 
     def initialize_cds(self, space):
         CellDiscreteHandler.initialize_cds_static(self, space)
@@ -37,7 +39,6 @@ class StaticDiscreteCell(VariableCell):
         """
         samples = self.get_samples_for_cur_idx_dims_values(space)
         xmin,xmax = get_stratum_range(samples, stratum)
-        inds = find_indices(samples, lambda e: xmin <= e <= xmax, xmin, xmax)
-        self.ic.set_sel_var_inds(space, self.name, inds)
-        self.compute_intersection_of_samples(space)
+        self.ic.set_sel_var_mask(space, self.name, find_mask(samples, xmin, xmax))
+        self.ic.compute_intersection_of_samples(space, self.name)
         return (xmin,xmax)
@@ -3,14 +3,15 @@ from .utils.cell_scatter_handler import CellScatterHandler
 from ..cell.utils.cell_widgets import CellWidgets
 
 class StaticScatterCell(ScatterCell):
-    def __init__(self, vars, control):
+    def __init__(self, vars, control, lazy = False):
         """
             Parameters:
             --------
                 vars            A List of variableNames of the model.
                 control         A Control object
+                lazy            A Boolean: if True, the cell's spaces are built on demand.
         """
-        ScatterCell.__init__(self, vars, control)
+        ScatterCell.__init__(self, vars, control, lazy)
 
     def initialize_cds(self, space):
         CellScatterHandler.initialize_cds_static(self, space)
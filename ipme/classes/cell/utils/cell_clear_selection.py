@@ -23,23 +23,23 @@ class CellClearSelection:
         """
             Updates clear_selection ColumnDataSource (cds).
         """
-        sel_var_idx_dims_values = variableCell.ic.get_sel_var_idx_dims_values()
-        sel_space = variableCell.ic.get_sel_space()
-        var_x_range = variableCell.ic.get_var_x_range()
+        state = variableCell.ic.get_state()
         cur_idx_dims_values = {}
         if variableCell.name in variableCell.cur_idx_dims_values:
             cur_idx_dims_values = variableCell.cur_idx_dims_values[variableCell.name]
-        if (variableCell.name in sel_var_idx_dims_values and space == sel_space and
-            cur_idx_dims_values == sel_var_idx_dims_values[variableCell.name]):
-            min_x_range = var_x_range[(space, variableCell.name)].data['xmin'][0]
-            max_x_range = var_x_range[(space, variableCell.name)].data['xmax'][0]
-            hp = find_highest_point(variableCell.reconstructed[space].data['x'], variableCell.reconstructed[space].data['y'])
+        if (variableCell.name in state.sel_var_idx_dims_values and space == state.sel_space and
+            cur_idx_dims_values == state.sel_var_idx_dims_values[variableCell.name]):
+            min_x_range = state.var_x_range[(space, variableCell.name)]['xmin'][0]
+            max_x_range = state.var_x_range[(space, variableCell.name)]['xmax'][0]
+            reconstructed = variableCell.ic.get_model_property(variableCell.reconstructed[space], 'data')
+            selection = variableCell.ic.get_model_property(variableCell.selection[space], 'data')
+            hp = find_highest_point(reconstructed['x'], reconstructed['y'])
             if not hp:
-                hp = find_highest_point(variableCell.selection[space].data['x'], variableCell.selection[space].data['y'])
+                hp = find_highest_point(selection['x'], selection['y'])
                 if not hp:
                     hp = find_highest_point(variableCell.source[space].data['x'], variableCell.source[space].data['y'])
                     if not hp:
                         hp = (0,0)
-            variableCell.clear_selection[space].data = dict( x = [(max_x_range + min_x_range) / 2.], y = [hp[1]+hp[1]*0.1], isIn = [0])
+            variableCell.ic.set_model_properties(variableCell.clear_selection[space], data = dict( x = [(max_x_range + min_x_range) / 2.], y = [hp[1]+hp[1]*0.1], isIn = [0]))
         else:
-            variableCell.clear_selection[space].data = dict( x = [], y = [], isIn = [])
+            variableCell.ic.set_model_properties(variableCell.clear_selection[space], data = dict( x = [], y = [], isIn = []))
@@ -1,8 +1,9 @@
 from .cell_clear_selection import CellClearSelection
+from .cell_selection_views import CellSelectionViews
 
 from ipme.utils.constants import  COLORS, BORDER_COLORS, PLOT_HEIGHT, PLOT_WIDTH, SIZING_MODE, RUG_DIST_RATIO, RUG_SIZE, DATA_DIST_RATIO, DATA_SIZE
 from ipme.utils.stats import kde
-from ipme.utils.functions import find_inds_before_after, find_indices
+from ipme.utils.functions import find_inds_before_after, find_mask, find_sorted_mask
 
 from bokeh.models import ColumnDataSource, BoxSelectTool, HoverTool
 
@@ -24,8 +25,9 @@ class CellContinuousHandler:
         so = variableCell.plot[space].line('x', 'y', line_color = COLORS[0], line_width = 2, source = variableCell.source[space])
         re = variableCell.plot[space].line('x', 'y', line_color = COLORS[1], line_width = 2, source = variableCell.reconstructed[space])
         variableCell.plot[space].line('x', 'y', line_color = COLORS[2], line_width = 2, source = variableCell.selection[space])
-        variableCell.plot[space].dash('x', 'y', size='size', angle = 90.0, angle_units = 'deg', line_color = COLORS[0], source = variableCell.non_sel_samples[space])
-        variableCell.plot[space].dash('x', 'y', size='size', angle = 90.0, angle_units = 'deg', line_color = COLORS[1], source = variableCell.sel_samples[space])
+        rug_y = -1*variableCell.get_max_prob(space)/RUG_DIST_RATIO
+        variableCell.plot[space].dash('x', rug_y, size = RUG_SIZE, angle = 90.0, angle_units = 'deg', line_color = COLORS[0], source = variableCell.samples[space], view = variableCell.non_sel_samples[space], name = "rug")
+        variableCell.plot[space].dash('x', rug_y, size = RUG_SIZE, angle = 90.0, angle_units = 'deg', line_color = COLORS[1], source = variableCell.samples[space], view = variableCell.sel_samples[space], name = "rug")
         hover_renderer.append(so)
         hover_renderer.append(re)
         ## Add observations as yellow asterisks
@@ -71,42 +73,38 @@ class CellContinuousHandler:
         variableCell.plot[space].on_event(events.Tap, partial(CellContinuousHandler.clear_selection_callback, variableCell, space))
         variableCell.plot[space].on_event(events.SelectionGeometry, partial(CellContinuousHandler.selectionbox_callback, variableCell, space))
         ##on_change
-        variableCell.ic.sample_inds_update[space].on_change('data', partial(variableCell.sample_inds_callback, space))
+        variableCell.ic.subscribe_sample_inds_update(space, partial(variableCell.sample_inds_callback, space))
 
     @staticmethod
     def initialize_fig_static(variableCell, space):
         CellContinuousHandler.initialize_fig(variableCell, space)
         ##on_change
-        variableCell.ic.sample_inds_update[space].on_change('data', partial(variableCell.sample_inds_callback, space))
+        variableCell.ic.subscribe_sample_inds_update(space, partial(variableCell.sample_inds_callback, space))
 
     @staticmethod
     def initialize_cds(variableCell, space):
         samples = variableCell.get_samples_for_cur_idx_dims_values(variableCell.name, space)
         variableCell.samples[space] = ColumnDataSource(data = dict( x = samples))
-        variableCell.source[space] = ColumnDataSource(data = kde(samples)) 
+        variableCell.source[space] = ColumnDataSource(data = kde(samples))
         # data cds
         data = variableCell.get_data_for_cur_idx_dims_values(variableCell.name)        
         if data is not None:
             max_v = variableCell.source[space].data['y'].max()
             variableCell.data[space] =  ColumnDataSource(data = dict(x = data, y = np.asarray([-1*max_v/DATA_DIST_RATIO]*len(data))))
         # initialize sample inds
-        variableCell.ic.initialize_sample_inds(space, dict(inds = [False]*len(variableCell.samples[space].data['x'])), dict(non_inds = [True]*len(variableCell.samples[space].data['x'])))
+        variableCell.ic.initialize_sample_inds(space, len(variableCell.samples[space].data['x']))
 
     @staticmethod
     def initialize_cds_interactive(variableCell, space):
         CellContinuousHandler.initialize_cds(variableCell, space)
         
-        inds, non_inds = variableCell.ic.get_sample_inds(space)
-        max_v = variableCell.source[space].data['y'].max()
-        sel_samples = variableCell.samples[space].data['x'][inds]
-        non_sel_samples = variableCell.samples[space].data['x'][non_inds]
-        variableCell.sel_samples[space] = ColumnDataSource(data = dict( x = sel_samples, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(sel_samples)), size = np.asarray([RUG_SIZE]*len(sel_samples))))
-        variableCell.non_sel_samples[space] = ColumnDataSource(data = dict( x = non_sel_samples, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(non_sel_samples)), size = np.asarray([RUG_SIZE]*len(non_sel_samples))))
+        CellSelectionViews.initialize_sel_samples_views(variableCell, space)
         
         variableCell.selection[space] = ColumnDataSource(data = dict(x = np.array([]), y = np.array([])))
         variableCell.reconstructed[space] = ColumnDataSource(data = dict(x = np.array([]), y = np.array([])))
         variableCell.clear_selection[space] = ColumnDataSource(data = dict(x = [], y = [], isIn = []))
-        variableCell.ic.var_x_range[(space, variableCell.name)] = ColumnDataSource(data = dict(xmin = np.array([]), xmax = np.array([])))
+        variableCell.ic.initialize_var_x_range(space, variableCell.name)
+        variableCell.ic.register_kde_cell(space, variableCell)
 
     @staticmethod
     def initialize_cds_static(variableCell, space):
@@ -122,18 +120,16 @@ class CellContinuousHandler:
         """
             Updates interaction-related ColumnDataSources (cds).
         """
-        sel_var_idx_dims_values = variableCell.ic.get_sel_var_idx_dims_values()
-        sel_space = variableCell.ic.get_sel_space()
-        var_x_range = variableCell.ic.get_var_x_range()
-        global_update = variableCell.ic.get_global_update()
-        if global_update:
+        state = variableCell.ic.get_state()
+        if state.global_update:
             cur_idx_dims_values = {}
             if variableCell.name in variableCell.cur_idx_dims_values:
                 cur_idx_dims_values = variableCell.cur_idx_dims_values[variableCell.name]
-            if variableCell.name in sel_var_idx_dims_values and space == sel_space and cur_idx_dims_values == sel_var_idx_dims_values[variableCell.name]:
-                variableCell.update_selection_cds(space, var_x_range[(space, variableCell.name)].data['xmin'][0], var_x_range[(space, variableCell.name)].data['xmax'][0])
+            if variableCell.name in state.sel_var_idx_dims_values and space == state.sel_space and cur_idx_dims_values == state.sel_var_idx_dims_values[variableCell.name]:
+                x_range = state.var_x_range[(space, variableCell.name)]
+                variableCell.update_selection_cds(space, x_range['xmin'][0], x_range['xmax'][0])
             else:
-                variableCell.selection[space].data = dict( x = np.array([]), y = np.array([]))
+                variableCell.ic.set_model_properties(variableCell.selection[space], data = dict( x = np.array([]), y = np.array([])))
         variableCell.update_reconstructed_cds(space)
         CellClearSelection.update_clear_selection_cds(variableCell, space)
 
@@ -142,22 +138,24 @@ class CellContinuousHandler:
         """
             Update source & samples cds in the static mode
         """
+        if variableCell.mask_unchanged(space):
+            return
         samples = variableCell.get_samples_for_cur_idx_dims_values(variableCell.name, space)
         inds, _ = variableCell.ic.get_sample_inds(space)
         if True in inds:
             sel_sample = samples[inds]
-            variableCell.source[space].data = kde(sel_sample)
+            variableCell.ic.set_model_properties(variableCell.source[space], data = kde(sel_sample))
             max_v = variableCell.get_max_prob(space)
-            variableCell.samples[space].data = dict( x = sel_sample, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(sel_sample)), size = np.asarray([RUG_SIZE]*len(sel_sample)))
+            variableCell.ic.set_model_properties(variableCell.samples[space], data = dict( x = sel_sample, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(sel_sample)), size = np.asarray([RUG_SIZE]*len(sel_sample))))
         else:
-            variableCell.source[space].data = kde(samples)
+            variableCell.ic.set_model_properties(variableCell.source[space], data = kde(samples))
             max_v = variableCell.get_max_prob(space)
-            variableCell.samples[space].data = dict( x = samples, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(samples)), size = np.asarray([RUG_SIZE]*len(samples)))
+            variableCell.ic.set_model_properties(variableCell.samples[space], data = dict( x = samples, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(samples)), size = np.asarray([RUG_SIZE]*len(samples))))
         # data cds
         data = variableCell.get_data_for_cur_idx_dims_values(variableCell.name)
         if data is not None:
             max_v = variableCell.get_max_prob(space)
-            variableCell.data[space].data = dict(x = data, y = np.asarray([-1*max_v/DATA_DIST_RATIO]*len(data)))
+            variableCell.ic.set_model_properties(variableCell.data[space], data = dict(x = data, y = np.asarray([-1*max_v/DATA_DIST_RATIO]*len(data))))
 
     ## ONLY FOR INTERACTIVE CASE
     @staticmethod
@@ -167,12 +165,21 @@ class CellContinuousHandler:
         """
         xmin = event.geometry['x0']
         xmax = event.geometry['x1']
+        variableCell.ic.debounce(variableCell.name, partial(CellContinuousHandler._selectionbox_update, variableCell, space, xmin, xmax), variableCell.plot[space].document)
+
+    @staticmethod
+    def _selectionbox_update(variableCell, space, xmin, xmax):
+        """
+            Applies the selection [xmin, xmax] drawn in <space> to all the spaces of the variable.
+        """
         # variableCell.ic.increase_selection_interactions()
         cur_idx_dims_values = {}
         if variableCell.name in variableCell.cur_idx_dims_values:
             cur_idx_dims_values = variableCell.cur_idx_dims_values[variableCell.name]
         variableCell.ic.set_selection(variableCell.name, space, (xmin, xmax), cur_idx_dims_values)
         for sp in variableCell.spaces:
+            if not variableCell.is_initialized(sp):
+                continue
             samples = variableCell.samples[sp].data['x']
             variableCell.ic.add_space_threads(threading.Thread(target = partial(CellContinuousHandler._selectionbox_space_thread, variableCell, sp, samples, xmin, xmax), daemon = True))
             # CellContinuousHandler._selectionbox_space_thread(variableCell, sp, samples, xmin, xmax)
@@ -186,11 +193,22 @@ class CellContinuousHandler:
         if len(xmin_list):
             variableCell.update_selection_cds(space, xmin_list[0], xmax_list[0])
         else:
-            variableCell.selection[space].data = dict(x = np.array([]), y = np.array([]))
-        inds = find_indices(samples, lambda e: xmin <= e <= xmax, xmin, xmax)
-        variableCell.ic.set_sel_var_inds(space, variableCell.name, inds)
-        variableCell.compute_intersection_of_samples(space)
-        variableCell.ic.selection_threads_join(space)
+            variableCell.ic.set_model_properties(variableCell.selection[space], data = dict(x = np.array([]), y = np.array([])))
+        perm, sorted_samples = CellContinuousHandler.get_sorted_samples(variableCell, space, samples)
+        variableCell.ic.set_sel_var_mask(space, variableCell.name, find_sorted_mask(samples, perm, sorted_samples, xmin, xmax))
+        variableCell.ic.compute_intersection_of_samples(space, variableCell.name)
+        variableCell.ic.wait_sample_inds_update(space)
+
+    @staticmethod
+    def get_sorted_samples(variableCell, space, samples):
+        """
+            Returns the argsort permutation and the sorted elements of the <samples> of <space>.
+            They are computed once per samples array, on the first selection.
+        """
+        if space not in variableCell.sorted_samples or variableCell.sorted_samples[space][0] is not samples:
+            perm = np.argsort(samples, kind = 'stable')
+            variableCell.sorted_samples[space] = (samples, perm, samples[perm])
+        return variableCell.sorted_samples[space][1:]
 
     @staticmethod
     def update_source_cds_interactive(variableCell, space):
@@ -210,16 +228,16 @@ class CellContinuousHandler:
         data = {}
         data['x'] = np.array([])
         data['y'] = np.array([])
-        kde_indices = find_indices(variableCell.source[space].data['x'], lambda e: xmin <= e <= xmax, xmin, xmax)
-        if len(kde_indices) == 0:
-            variableCell.selection[space].data = dict( x = np.array([]), y = np.array([]))
+        kde_indices = find_mask(variableCell.source[space].data['x'], xmin, xmax)
+        if not kde_indices.any():
+            variableCell.ic.set_model_properties(variableCell.selection[space], data = dict( x = np.array([]), y = np.array([])))
             return
         data['x'] = variableCell.source[space].data['x'][kde_indices]
         data['y'] = variableCell.source[space].data['y'][kde_indices]
 
         # Add interpolated points at xmin, xmax
         xmin_inds = find_inds_before_after(variableCell.source[space].data['x'], xmin)
-        if -1 not in xmin_inds:
+        if -1 not in xmin_inds and xmin_inds[0] != xmin_inds[1]:
             xmin_l = variableCell.source[space].data['x'][xmin_inds[0]]
             xmin_h = variableCell.source[space].data['x'][xmin_inds[1]]
             ymin_l = variableCell.source[space].data['y'][xmin_inds[0]]
@@ -229,7 +247,7 @@ class CellContinuousHandler:
             data['y'] = np.insert(data['y'], 0, ymin)
 
         xmax_inds = find_inds_before_after(variableCell.source[space].data['x'], xmax)
-        if -1 not in xmax_inds:
+        if -1 not in xmax_inds and xmax_inds[0] != xmax_inds[1]:
             xmax_l = variableCell.source[space].data['x'][xmax_inds[0]]
             xmax_h = variableCell.source[space].data['x'][xmax_inds[1]]
             ymax_l = variableCell.source[space].data['y'][xmax_inds[0]]
@@ -243,27 +261,45 @@ class CellContinuousHandler:
         data['y'] = np.append(data['y'], 0)
         data['x'] = np.insert(data['x'], 0, data['x'][0])
         data['x'] = np.append(data['x'], data['x'][-1])
-        variableCell.selection[space].data = data
+        variableCell.ic.set_model_properties(variableCell.selection[space], data = data)
 
     @staticmethod
     def update_reconstructed_cds_interactive(variableCell, space):
         """
             Updates reconstructed ColumnDataSource (cds).
         """
-        samples = variableCell.samples[space].data['x']
-        inds, non_inds = variableCell.ic.get_sample_inds(space)
-        sel_sample = samples[inds]
-        non_sel_samples = samples[non_inds]
-        variableCell.reconstructed[space].data = kde(sel_sample)        
-        max_v = variableCell.get_max_prob(space) 
-        # update rug plot            
-        variableCell.sel_samples[space].data = dict( x = sel_sample, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(sel_sample)), size = np.asarray([RUG_SIZE]*len(sel_sample)))
-        variableCell.non_sel_samples[space].data = dict( x = non_sel_samples, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(non_sel_samples)), size = np.asarray([RUG_SIZE]*len(non_sel_samples)))
+        if variableCell.mask_unchanged(space):
+            return
+        state = variableCell.ic.get_state()
+        inds = state.sample_inds[space]
+        key = variableCell.get_selection_key(space, state.sample_inds_hash[space])
+        sel_data = variableCell.ic.get_selection_data(key, partial(CellContinuousHandler._compute_selection_data, variableCell, space, inds, state))
+        variableCell.ic.set_model_properties(variableCell.reconstructed[space], data = sel_data['reconstructed'])
+        max_v = variableCell.get_max_prob(space)
+        # update rug plot: the selected samples are filtered by the views
+        for re in variableCell.plot[space].renderers:
+            if re.name == "rug":
+                variableCell.ic.set_model_properties(re.glyph, y = -1*max_v/RUG_DIST_RATIO)
         # update data
         data = variableCell.get_data_for_cur_idx_dims_values(variableCell.name)
         if data is not None:
-            variableCell.data[space].data = dict(x = data, y = np.asarray([-1*max_v/DATA_DIST_RATIO]*len(data)))
+            variableCell.ic.set_model_properties(variableCell.data[space], data = dict(x = data, y = np.asarray([-1*max_v/DATA_DIST_RATIO]*len(data))))
     
+    @staticmethod
+    def _compute_selection_data(variableCell, space, inds, state):
+        """
+            Computes the reconstructed kde of the samples of <space> selected by <inds>,
+            the sample indices of the ICState <state>.
+            Returns:
+            --------
+                A Dict {'reconstructed'} of cds data.
+        """
+        samples = variableCell.samples[space].data['x']
+        reconstructed = variableCell.ic.get_reconstructed_kde(space, variableCell.name, samples, state)
+        if reconstructed is None:
+            reconstructed = kde(samples[inds])
+        return dict(reconstructed = reconstructed)
+
     @staticmethod
     def clear_selection_callback(variableCell, space, event):
         """
@@ -271,10 +307,20 @@ class CellContinuousHandler:
         """
         isIn = variableCell.clear_selection[space].data['isIn']
         if 1 in isIn:
-            variableCell.ic.set_var_x_range(space, variableCell.name, dict(xmin = np.array([]), xmax = np.array([])))
-            variableCell.ic.delete_sel_var_idx_dims_values(variableCell.name)
-            for sp in variableCell.spaces:
-                variableCell.ic.add_space_threads(threading.Thread(target = partial(CellContinuousHandler._clear_selection_cds_update, variableCell, sp), daemon = True))
+            variableCell.ic.debounce(variableCell.name, partial(CellContinuousHandler._clear_selection_update, variableCell, space), variableCell.plot[space].document)
+
+    @staticmethod
+    def _clear_selection_update(variableCell, space):
+        """
+            Clears the selection of the variable in all its spaces.
+        """
+        variableCell.ic.set_var_x_range(space, variableCell.name, dict(xmin = np.array([]), xmax = np.array([])))
+        variableCell.ic.delete_sel_var_idx_dims_values(variableCell.name)
+        variableCell.ic.delete_sel_var_range(variableCell.name)
+        for sp in variableCell.spaces:
+            if not variableCell.is_initialized(sp):
+                continue
+            variableCell.ic.add_space_threads(threading.Thread(target = partial(CellContinuousHandler._clear_selection_cds_update, variableCell, sp), daemon = True))
         variableCell.ic.space_threads_join()
 
     @staticmethod
@@ -285,8 +331,8 @@ class CellContinuousHandler:
         if len(xmin_list):
             variableCell.update_selection_cds(space, xmin_list[0], xmax_list[0])
         else:
-            variableCell.selection[space].data = dict(x = np.array([]), y = np.array([]))
-        variableCell.ic.delete_sel_var_inds(space, variableCell.name)
-        variableCell.compute_intersection_of_samples(space)
-        variableCell.ic.selection_threads_join(space)
+            variableCell.ic.set_model_properties(variableCell.selection[space], data = dict(x = np.array([]), y = np.array([])))
+        variableCell.ic.delete_sel_var_mask(space, variableCell.name)
+        variableCell.ic.compute_intersection_of_samples(space, variableCell.name)
+        variableCell.ic.wait_sample_inds_update(space)
 
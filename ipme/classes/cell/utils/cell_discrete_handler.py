@@ -1,8 +1,8 @@
 from ipme.classes.cell.utils.cell_clear_selection import CellClearSelection
 
 from ipme.utils.constants import  COLORS, BORDER_COLORS, PLOT_HEIGHT, PLOT_WIDTH, SIZING_MODE, RUG_DIST_RATIO, DATA_SIZE
-from ipme.utils.stats import pmf
-from ipme.utils.functions import find_indices
+from ipme.utils.stats import encode_discrete, pmf_from_codes
+from ipme.utils.functions import find_mask
 
 from bokeh.models import ColumnDataSource, BoxSelectTool, HoverTool
 
@@ -76,18 +76,33 @@ class CellDiscreteHandler:
         variableCell.plot[space].on_event(events.Tap, partial(CellDiscreteHandler.clear_selection_callback, variableCell, space))
         variableCell.plot[space].on_event(events.SelectionGeometry, partial(CellDiscreteHandler.selectionbox_callback, variableCell, space))
         ##on_change
-        variableCell.ic.sample_inds_update[space].on_change('data', partial(variableCell.sample_inds_callback, space))
+        variableCell.ic.subscribe_sample_inds_update(space, partial(variableCell.sample_inds_callback, space))
 
     @staticmethod
     def initialize_fig_static(variableCell, space):
         CellDiscreteHandler.initialize_fig(variableCell, space)
         ##on_change
-        variableCell.ic.sample_inds_update[space].on_change('data', partial(variableCell.sample_inds_callback, space))
+        variableCell.ic.subscribe_sample_inds_update(space, partial(variableCell.sample_inds_callback, space))
+
+    @staticmethod
+    def get_codes(variableCell, space, samples = None):
+        """
+            Returns the integer codes and the levels (see encode_discrete) of the samples of
+            the current index dimensions values in <space>. The samples are encoded once
+            per index dimensions values.
+        """
+        key = str(variableCell.cur_idx_dims_values.get(variableCell.name, {}))
+        if space not in variableCell.codes or variableCell.codes[space][0] != key:
+            if samples is None:
+                samples = variableCell.get_samples_for_cur_idx_dims_values(variableCell.name, space)
+            variableCell.codes[space] = (key,) + encode_discrete(samples)
+        return variableCell.codes[space][1:]
 
     @staticmethod
     def initialize_cds(variableCell, space):
         samples = variableCell.get_samples_for_cur_idx_dims_values(variableCell.name, space)
-        variableCell.source[space] = ColumnDataSource(data = pmf(samples))
+        codes, levels = CellDiscreteHandler.get_codes(variableCell, space, samples)
+        variableCell.source[space] = ColumnDataSource(data = pmf_from_codes(codes, levels))
         variableCell.samples[space] = ColumnDataSource(data = dict(x = samples))
         # data cds
         data = variableCell.get_data_for_cur_idx_dims_values(variableCell.name)
@@ -95,7 +110,7 @@ class CellDiscreteHandler:
             max_v = variableCell.source[space].data['y'].max()
             variableCell.data[space] =  ColumnDataSource(data = dict(x = data, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(data))))
         # initialize sample inds
-        variableCell.ic.initialize_sample_inds(space, dict(inds = [False]*len(variableCell.samples[space].data['x'])), dict(non_inds = [True]*len(variableCell.samples[space].data['x'])))
+        variableCell.ic.initialize_sample_inds(space, len(variableCell.samples[space].data['x']))
 
     @staticmethod
     def initialize_cds_interactive(variableCell, space):
@@ -103,7 +118,7 @@ class CellDiscreteHandler:
         variableCell.selection[space] = ColumnDataSource(data = dict(x = np.array([]), y = np.array([]), y0 = np.array([])))
         variableCell.reconstructed[space] = ColumnDataSource(data = dict(x = np.array([]), y = np.array([]), y0 = np.array([])))
         variableCell.clear_selection[space] = ColumnDataSource(data = dict(x = [], y = [], isIn = []))
-        variableCell.ic.var_x_range[(space, variableCell.name)] = ColumnDataSource(data = dict(xmin = np.array([]), xmax = np.array([])))
+        variableCell.ic.initialize_var_x_range(space, variableCell.name)
   
     @staticmethod
     def initialize_cds_static(variableCell, space):
@@ -115,18 +130,16 @@ class CellDiscreteHandler:
         """
             Updates interaction-related ColumnDataSources (cds).
         """
-        sel_var_idx_dims_values = variableCell.ic.get_sel_var_idx_dims_values()
-        sel_space = variableCell.ic.get_sel_space()
-        var_x_range = variableCell.ic.get_var_x_range()
-        global_update = variableCell.ic.get_global_update()
-        if global_update:
+        state = variableCell.ic.get_state()
+        if state.global_update:
             cur_idx_dims_values = {}
             if variableCell.name in variableCell.cur_idx_dims_values:
                 cur_idx_dims_values = variableCell.cur_idx_dims_values[variableCell.name]
-            if variableCell.name in sel_var_idx_dims_values and space == sel_space and cur_idx_dims_values == sel_var_idx_dims_values[variableCell.name]:
-                variableCell.update_selection_cds(space, var_x_range[(space, variableCell.name)].data['xmin'][0], var_x_range[(space, variableCell.name)].data['xmax'][0])
+            if variableCell.name in state.sel_var_idx_dims_values and space == state.sel_space and cur_idx_dims_values == state.sel_var_idx_dims_values[variableCell.name]:
+                x_range = state.var_x_range[(space, variableCell.name)]
+                variableCell.update_selection_cds(space, x_range['xmin'][0], x_range['xmax'][0])
             else:
-                variableCell.selection[space].data = dict(x = np.array([]), y = np.array([]), y0 = np.array([]))
+                variableCell.ic.set_model_properties(variableCell.selection[space], data = dict(x = np.array([]), y = np.array([]), y0 = np.array([])))
         variableCell.update_reconstructed_cds(space)
         CellClearSelection.update_clear_selection_cds(variableCell, space)
 
@@ -135,20 +148,22 @@ class CellDiscreteHandler:
         """
             Update source & samples cds in the static mode
         """
+        if variableCell.mask_unchanged(space):
+            return
         samples = variableCell.get_samples_for_cur_idx_dims_values(variableCell.name, space)
+        codes, levels = CellDiscreteHandler.get_codes(variableCell, space, samples)
         inds,_ = variableCell.ic.get_sample_inds(space)
         if True in inds:
-            sel_sample = samples[inds]
-            variableCell.source[space].data = pmf(sel_sample)
-            variableCell.samples[space].data = dict( x = sel_sample)
+            variableCell.ic.set_model_properties(variableCell.source[space], data = pmf_from_codes(codes, levels, inds))
+            variableCell.ic.set_model_properties(variableCell.samples[space], data = dict( x = samples[inds]))
         else:
-            variableCell.source[space].data = pmf(samples)
-            variableCell.samples[space].data = dict( x = samples)
+            variableCell.ic.set_model_properties(variableCell.source[space], data = pmf_from_codes(codes, levels))
+            variableCell.ic.set_model_properties(variableCell.samples[space], data = dict( x = samples))
         # data cds
         data = variableCell.get_data_for_cur_idx_dims_values(variableCell.name)
         if data is not None:
             max_v = variableCell.get_max_prob(space)
-            variableCell.data[space] =  ColumnDataSource(data = dict(x = data, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(data))))
+            variableCell.ic.set_model_properties(variableCell.data[space], data = dict(x = data, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(data))))
 
     ## ONLY FOR INTERACTIVE CASE
     @staticmethod
@@ -158,11 +173,20 @@ class CellDiscreteHandler:
         """
         xmin = event.geometry['x0']
         xmax = event.geometry['x1']
+        variableCell.ic.debounce(variableCell.name, partial(CellDiscreteHandler._selectionbox_update, variableCell, space, xmin, xmax), variableCell.plot[space].document)
+
+    @staticmethod
+    def _selectionbox_update(variableCell, space, xmin, xmax):
+        """
+            Applies the selection [xmin, xmax] drawn in <space> to all the spaces of the variable.
+        """
         cur_idx_dims_values = {}
         if variableCell.name in variableCell.cur_idx_dims_values:
             cur_idx_dims_values = variableCell.cur_idx_dims_values[variableCell.name]
         variableCell.ic.set_selection(variableCell.name, space, (xmin, xmax), cur_idx_dims_values)
         for sp in variableCell.spaces:
+            if not variableCell.is_initialized(sp):
+                continue
             samples = variableCell.samples[sp].data['x']
             variableCell.ic.add_space_threads(threading.Thread(target = partial(CellDiscreteHandler._selectionbox_space_thread, variableCell, sp, samples, xmin, xmax), daemon = True))
         variableCell.ic.space_threads_join()
@@ -175,11 +199,13 @@ class CellDiscreteHandler:
         if len(xmin_list):
             variableCell.update_selection_cds(space, xmin_list[0], xmax_list[0])
         else:
-            variableCell.selection[space].data = dict(x = np.array([]), y = np.array([]), y0 = np.array([]))
-        inds = find_indices(samples, lambda e: xmin <= e <= xmax, xmin, xmax)
-        variableCell.ic.set_sel_var_inds(space, variableCell.name, inds)
-        variableCell.compute_intersection_of_samples(space)
-        variableCell.ic.selection_threads_join(space)
+            variableCell.ic.set_model_properties(variableCell.selection[space], data = dict(x = np.array([]), y = np.array([]), y0 = np.array([])))
+        codes, levels = CellDiscreteHandler.get_codes(variableCell, space, samples)
+        # levels within the selection (the extra code of the non-finite samples is never selected)
+        sel_levels = np.append((levels >= xmin) & (levels <= xmax), False)
+        variableCell.ic.set_sel_var_mask(space, variableCell.name, sel_levels[codes])
+        variableCell.ic.compute_intersection_of_samples(space, variableCell.name)
+        variableCell.ic.wait_sample_inds_update(space)
 
     @staticmethod
     def update_source_cds_interactive(variableCell, space):
@@ -187,7 +213,8 @@ class CellDiscreteHandler:
             Updates source ColumnDataSource (cds).
         """
         samples = variableCell.get_samples_for_cur_idx_dims_values(variableCell.name, space)
-        variableCell.source[space].data = pmf(samples)
+        codes, levels = CellDiscreteHandler.get_codes(variableCell, space, samples)
+        variableCell.source[space].data = pmf_from_codes(codes, levels)
         variableCell.samples[space].data = dict( x = samples)
 
     @staticmethod
@@ -199,30 +226,32 @@ class CellDiscreteHandler:
         data = {}
         data['x'] = np.array([])
         data['y'] = np.array([])
-        kde_indices = find_indices(variableCell.source[space].data['x'], lambda e: xmin <= e <= xmax, xmin, xmax)
-        if len(kde_indices) == 0:
-            variableCell.selection[space].data = dict(x = np.array([]), y = np.array([]), y0 = np.array([]))
+        kde_indices = find_mask(variableCell.source[space].data['x'], xmin, xmax)
+        if not kde_indices.any():
+            variableCell.ic.set_model_properties(variableCell.selection[space], data = dict(x = np.array([]), y = np.array([]), y0 = np.array([])))
             return
         data['x'] = variableCell.source[space].data['x'][kde_indices]
         data['y'] = variableCell.source[space].data['y'][kde_indices]
         data['y0'] = np.asarray(len(data['x'])*[0])
-        variableCell.selection[space].data = data
+        variableCell.ic.set_model_properties(variableCell.selection[space], data = data)
 
     @staticmethod
     def update_reconstructed_cds_interactive(variableCell, space):
         """
             Updates reconstructed ColumnDataSource (cds).
         """
-        samples = variableCell.samples[space].data['x']
-        inds,_ = variableCell.ic.get_sample_inds(space)
-        # if Tulen(inds):
-        sel_sample = samples[inds]
-        variableCell.reconstructed[space].data = pmf(sel_sample)
+        if variableCell.mask_unchanged(space):
+            return
+        state = variableCell.ic.get_state()
+        inds = state.sample_inds[space]
+        key = variableCell.get_selection_key(space, state.sample_inds_hash[space])
+        sel_data = variableCell.ic.get_selection_data(key, partial(CellDiscreteHandler._compute_selection_data, variableCell, space, inds))
+        variableCell.ic.set_model_properties(variableCell.reconstructed[space], data = sel_data['reconstructed'])
         # data cds
         data = variableCell.get_data_for_cur_idx_dims_values(variableCell.name)
         if data is not None:
             max_v = variableCell.get_max_prob(space)
-            variableCell.data[space] =  ColumnDataSource(data = dict(x = data, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(data))))
+            variableCell.ic.set_model_properties(variableCell.data[space], data = dict(x = data, y = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(data))))
         # # else:
         # #     variableCell.reconstructed[space].data = dict(x = np.array([]), y = np.array([]), y0 = np.array([]))
         # ##########TEST###################to be deleted
@@ -230,6 +259,17 @@ class CellDiscreteHandler:
         # # if max_v!=-1:
         # #     variableCell.samples[space].data['y'] = np.asarray([-1*max_v/RUG_DIST_RATIO]*len(variableCell.samples[space].data['x']))
 
+    @staticmethod
+    def _compute_selection_data(variableCell, space, inds):
+        """
+            Computes the pmf of the samples of <space> selected by <inds>.
+            Returns:
+            --------
+                A Dict {'reconstructed'} of cds data.
+        """
+        codes, levels = CellDiscreteHandler.get_codes(variableCell, space)
+        return dict(reconstructed = pmf_from_codes(codes, levels, inds))
+
     @staticmethod
     def clear_selection_callback(variableCell, space, event):
         """
@@ -237,10 +277,20 @@ class CellDiscreteHandler:
         """
         isIn = variableCell.clear_selection[space].data['isIn']
         if 1 in isIn:
-            variableCell.ic.set_var_x_range(space, variableCell.name, dict(xmin = np.array([]), xmax = np.array([])))
-            variableCell.ic.delete_sel_var_idx_dims_values(variableCell.name)
-            for sp in variableCell.spaces:
-                variableCell.ic.add_space_threads(threading.Thread(target = partial(CellDiscreteHandler._clear_selection_cds_update, variableCell, sp), daemon = True))
+            variableCell.ic.debounce(variableCell.name, partial(CellDiscreteHandler._clear_selection_update, variableCell, space), variableCell.plot[space].document)
+
+    @staticmethod
+    def _clear_selection_update(variableCell, space):
+        """
+            Clears the selection of the variable in all its spaces.
+        """
+        variableCell.ic.set_var_x_range(space, variableCell.name, dict(xmin = np.array([]), xmax = np.array([])))
+        variableCell.ic.delete_sel_var_idx_dims_values(variableCell.name)
+        variableCell.ic.delete_sel_var_range(variableCell.name)
+        for sp in variableCell.spaces:
+            if not variableCell.is_initialized(sp):
+                continue
+            variableCell.ic.add_space_threads(threading.Thread(target = partial(CellDiscreteHandler._clear_selection_cds_update, variableCell, sp), daemon = True))
         variableCell.ic.space_threads_join()
 
     @staticmethod
@@ -251,7 +301,7 @@ class CellDiscreteHandler:
         if len(xmin_list):
             variableCell.update_selection_cds(space, xmin_list[0], xmax_list[0])
         else:
-            variableCell.selection[space].data = dict(x = np.array([]), y = np.array([]), y0 = np.array([]))
-        variableCell.ic.delete_sel_var_inds(space, variableCell.name)
-        variableCell.compute_intersection_of_samples(space)
-        variableCell.ic.selection_threads_join(space)
+            variableCell.ic.set_model_properties(variableCell.selection[space], data = dict(x = np.array([]), y = np.array([]), y0 = np.array([])))
+        variableCell.ic.delete_sel_var_mask(space, variableCell.name)
+        variableCell.ic.compute_intersection_of_samples(space, variableCell.name)
+        variableCell.ic.wait_sample_inds_update(space)
@@ -77,25 +77,33 @@ class CellPredCheckHandler:
     @staticmethod
     def initialize_fig_interactive(predcheckCell, space):
         CellPredCheckHandler.initialize_fig(predcheckCell, space)
-        predcheckCell.ic.sample_inds[space].on_change('data', partial(predcheckCell.sample_inds_callback, space))
+        predcheckCell.ic.subscribe_sample_inds_update(space, partial(predcheckCell.sample_inds_callback, space))
 
     @staticmethod
     def initialize_fig_static(predcheckCell, space):
         CellPredCheckHandler.initialize_fig(predcheckCell, space)
 
     @staticmethod
-    def initialize_cds(predcheckCell, space):
-        ## ColumnDataSource for full sample set
-        data, samples = predcheckCell.get_samples_for_cur_idx_dims_values(space)
-        predcheckCell.samples[space] = ColumnDataSource(data=dict(x=samples))
+    def get_full_cds_data(predcheckCell, space, data, samples, inds = None):
+        """
+            Computes the p-value, the histogram and the segment of the observed check statistic.
+
+            Parameters:
+            --------
+                data            A numpy.ndarray of the observed data.
+                samples         A numpy.ndarray of the check statistic of each predictive draw.
+                inds            A boolean numpy.ndarray of the draws <samples> were selected from (None if they
+                                are all the draws): the bins of a Discrete variable are the unique values of these draws.
+            Returns:
+            --------
+                A Tuple of the data Dicts of the (pvalue, source, seg) cds.
+        """
         #data func
         if ~np.isfinite(data).all():
             data = get_finite_samples(data)
         data_func = get_samples_for_pred_check(data, predcheckCell.func)
         #samples func
-        if ~np.isfinite(samples).all():
-            samples = get_finite_samples(samples)
-        samples_func = get_samples_for_pred_check(samples, predcheckCell.func)
+        samples_func = samples[np.isfinite(samples)]
         if samples_func.size:
             #pvalue
             pv = np.count_nonzero(samples_func>=data_func) / len(samples_func)
@@ -104,18 +112,27 @@ class CellPredCheckHandler:
             if type == "Continuous":
                 bins, range = get_hist_bins_range(samples_func, predcheckCell.func, type)
             else:
-                bins, range = get_hist_bins_range(samples_func, predcheckCell.func, type, ref_length = None, ref_values=np.unique(samples.flatten()))
+                if inds is None:
+                    ref_values = predcheckCell._data.get_pred_check_stats(predcheckCell.name, space)['values']
+                else:
+                    ref_values = predcheckCell._data.get_pred_check_values(predcheckCell.name, space, inds)
+                bins, range = get_hist_bins_range(samples_func, predcheckCell.func, type, ref_length = None, ref_values=ref_values)
 
             his, edges = hist(samples_func, bins=bins, range=range, density = True)
-            #cds
-            predcheckCell.pvalue[space] = ColumnDataSource(data=dict(pv=[pv]))
-            predcheckCell.source[space] = ColumnDataSource(data=dict(left=edges[:-1], top=his, right=edges[1:], bottom=np.zeros(len(his))))
-            predcheckCell.seg[space] = ColumnDataSource(data=dict(x0=[data_func], x1=[data_func], y0=[0], y1=[his.max() + 0.1 * his.max()]))
-        else:
-            predcheckCell.pvalue[space] = ColumnDataSource(data=dict(pv=[]))
-            predcheckCell.source[space] = ColumnDataSource(data=dict(left=[], top=[], right=[], bottom=[]))
-            predcheckCell.seg[space] = ColumnDataSource(data=dict(x0=[], x1=[], y0=[], y1=[]))
-        predcheckCell.ic.initialize_sample_inds(space, dict(inds = [False]*len(predcheckCell.samples[space].data['x'])), dict(non_inds = [True]*len(predcheckCell.samples[space].data['x'])))
+            return (dict(pv=[pv]), dict(left=edges[:-1], top=his, right=edges[1:], bottom=np.zeros(len(his))),
+                    dict(x0=[data_func], x1=[data_func], y0=[0], y1=[his.max() + 0.1 * his.max()]))
+        return (dict(pv=[]), dict(left=[], top=[], right=[], bottom=[]), dict(x0=[], x1=[], y0=[], y1=[]))
+
+    @staticmethod
+    def initialize_cds(predcheckCell, space):
+        ## cds for full sample set
+        data, samples = predcheckCell.get_samples_for_cur_idx_dims_values(space)
+        predcheckCell.samples[space] = samples
+        pvalue, source, seg = CellPredCheckHandler.get_full_cds_data(predcheckCell, space, data, samples)
+        predcheckCell.pvalue[space] = ColumnDataSource(data=pvalue)
+        predcheckCell.source[space] = ColumnDataSource(data=source)
+        predcheckCell.seg[space] = ColumnDataSource(data=seg)
+        predcheckCell.ic.initialize_sample_inds(space, len(predcheckCell.samples[space]))
 
     @staticmethod
     def initialize_cds_interactive(predcheckCell, space):
@@ -141,39 +158,20 @@ class CellPredCheckHandler:
         """
             Update samples cds in the static mode
         """
-        ## ColumnDataSource for full sample set
+        if predcheckCell.mask_unchanged(space):
+            return
+        ## cds for full sample set
         data, samples = predcheckCell.get_samples_for_cur_idx_dims_values(space)
         inds, _ = predcheckCell.ic.get_sample_inds(space)
         if True in inds:
             samples = samples[inds]
-        predcheckCell.samples[space].data = dict(x=samples)
-        #data func
-        if ~np.isfinite(data).all():
-            data = get_finite_samples(data)
-        data_func = get_samples_for_pred_check(data, predcheckCell.func)
-        #samples func
-        if ~np.isfinite(samples).all():
-            samples = get_finite_samples(samples)
-        samples_func = get_samples_for_pred_check(samples, predcheckCell.func)
-        if samples_func.size:
-            #pvalue
-            pv = np.count_nonzero(samples_func>=data_func) / len(samples_func)
-            #histogram     
-            type =  predcheckCell._data.get_var_dist_type(predcheckCell.name)          
-            if type == "Continuous":
-                bins, range = get_hist_bins_range(samples_func, predcheckCell.func, type)
-            else:
-                bins, range = get_hist_bins_range(samples_func, predcheckCell.func, type, ref_length = None, ref_values=np.unique(samples.flatten()))
-
-            his, edges = hist(samples_func, bins=bins, range=range, density = True)
-            #cds
-            predcheckCell.pvalue[space].data = dict(pv=[pv])
-            predcheckCell.source[space].data = dict(left=edges[:-1], top=his, right=edges[1:], bottom=np.zeros(len(his)))
-            predcheckCell.seg[space].data = dict(x0=[data_func], x1=[data_func], y0=[0], y1=[his.max() + 0.1 * his.max()])
         else:
-            predcheckCell.pvalue[space].data = dict(pv=[])
-            predcheckCell.source[space].data = dict(left=[], top=[], right=[], bottom=[])
-            predcheckCell.seg[space].data = dict(x0=[], x1=[], y0=[], y1=[])
+            inds = None
+        predcheckCell.samples[space] = samples
+        pvalue, source, seg = CellPredCheckHandler.get_full_cds_data(predcheckCell, space, data, samples, inds)
+        predcheckCell.ic.set_model_properties(predcheckCell.pvalue[space], data = pvalue)
+        predcheckCell.ic.set_model_properties(predcheckCell.source[space], data = source)
+        predcheckCell.ic.set_model_properties(predcheckCell.seg[space], data = seg)
 
     ## ONLY FOR INTERACTIVE CASE
     @staticmethod
@@ -181,51 +179,28 @@ class CellPredCheckHandler:
         """
             Updates samples ColumnDataSource (cds).
         """
-        ## ColumnDataSource for full sample set
+        ## cds for full sample set
         data, samples = predcheckCell.get_samples_for_cur_idx_dims_values(space)
-        predcheckCell.samples[space].data = dict(x=samples)
-        #data func
-        if ~np.isfinite(data).all():
-            data = get_finite_samples(data)
-        data_func = get_samples_for_pred_check(data, predcheckCell.func)
-        #samples func
-        if ~np.isfinite(samples).all():
-            samples = get_finite_samples(samples)
-        samples_func = get_samples_for_pred_check(samples, predcheckCell.func)
-        if samples_func.size:
-            #pvalue
-            pv = np.count_nonzero(samples_func>=data_func) / len(samples_func)
-            #histogram     
-            type =  predcheckCell._data.get_var_dist_type(predcheckCell.name)          
-            if type == "Continuous":
-                bins, range = get_hist_bins_range(samples_func, predcheckCell.func, type)
-            else:
-                bins, range = get_hist_bins_range(samples_func, predcheckCell.func, type, ref_length = None, ref_values=np.unique(samples.flatten()))
-
-            his, edges = hist(samples_func, bins=bins, range=range, density = True)
-            #cds
-            predcheckCell.pvalue[space].data = dict(pv=[pv])
-            predcheckCell.source[space].data = dict(left=edges[:-1], top=his, right=edges[1:], bottom=np.zeros(len(his)))
-            predcheckCell.seg[space].data = dict(x0=[data_func], x1=[data_func], y0=[0], y1=[his.max() + 0.1 * his.max()])
-        else:
-            predcheckCell.pvalue[space].data = data=dict(pv=[])
-            predcheckCell.source[space].data = dict(left=[], top=[], right=[], bottom=[])
-            predcheckCell.seg[space].data = dict(x0=[], x1=[], y0=[], y1=[])
+        predcheckCell.samples[space] = samples
+        pvalue, source, seg = CellPredCheckHandler.get_full_cds_data(predcheckCell, space, data, samples)
+        predcheckCell.pvalue[space].data = pvalue
+        predcheckCell.source[space].data = source
+        predcheckCell.seg[space].data = seg
 
     @staticmethod
     def update_sel_samples_cds_interactive(predcheckCell, space):
         """
             Updates reconstructed ColumnDataSource (cds).
         """
-        samples = predcheckCell.samples[space].data['x']
+        if predcheckCell.mask_unchanged(space):
+            return
+        samples = predcheckCell.samples[space]
         max_full_hist = predcheckCell.source[space].data['top'].max()
+        inds,_ = predcheckCell.ic.get_sample_inds(space)
+        sel_sample_func = samples[inds] if samples.size else samples
+        sel_sample_func = sel_sample_func[np.isfinite(sel_sample_func)]
         if samples.size:
-            inds,_ = predcheckCell.ic.get_sample_inds(space)
-            if True in inds:
-                sel_sample = samples[inds]
-                if ~np.isfinite(sel_sample).all():
-                    sel_sample = get_finite_samples(sel_sample)
-                sel_sample_func = get_samples_for_pred_check(sel_sample, predcheckCell.func)
+            if sel_sample_func.size:
                 #data func
                 data_func = predcheckCell.seg[space].data['x0'][0]
                 #pvalue in restricted space
@@ -237,7 +212,7 @@ class CellPredCheckHandler:
                 max_c = sel_sample_func.max()
                 if  min_c < min_p or max_c > max_p:
                     ref_len = predcheckCell.source[space].data['right'][0] - min_p
-                    bins, range = get_hist_bins_range(sel_sample_func, predcheckCell.func, predcheckCell._type, ref_length=ref_len)
+                    bins, range = get_hist_bins_range(sel_sample_func, predcheckCell.func, predcheckCell._data.get_var_dist_type(predcheckCell.name), ref_length=ref_len)
                 else:
                     range = (min_p,max_p)
                     bins = len(predcheckCell.source[space].data['right'])
@@ -245,16 +220,20 @@ class CellPredCheckHandler:
                 ##max selected hist
                 max_sel_hist = his.max()
                 #update reconstructed cds
-                predcheckCell.pvalue_rec[space].data = dict(pv=[sel_pv])
-                predcheckCell.reconstructed[space].data = dict(left=edges[:-1], top=his, right =edges[1:], bottom=np.zeros(len(his)))
-                predcheckCell.seg[space].data['y1'] = [max_sel_hist + 0.1 * max_sel_hist]
+                CellPredCheckHandler.set_reconstructed_cds_data(predcheckCell, space, dict(pv=[sel_pv]), dict(left=edges[:-1], top=his, right =edges[1:], bottom=np.zeros(len(his))), max_sel_hist + 0.1 * max_sel_hist)
             else:
-                predcheckCell.pvalue_rec[space].data = dict(pv=[])
-                predcheckCell.reconstructed[space].data = dict(left=[], top=[], right=[], bottom=[])
-                predcheckCell.seg[space].data['y1'] = [max_full_hist + 0.1 * max_full_hist]
+                CellPredCheckHandler.set_reconstructed_cds_data(predcheckCell, space, dict(pv=[]), dict(left=[], top=[], right=[], bottom=[]), max_full_hist + 0.1 * max_full_hist)
         else:
-            predcheckCell.pvalue_rec[space].data = dict(pv=[])
-            predcheckCell.reconstructed[space].data = dict(left=[], top=[], right=[], bottom=[])
-            predcheckCell.seg[space].data['y1'] = [max_full_hist + 0.1 * max_full_hist]
+            CellPredCheckHandler.set_reconstructed_cds_data(predcheckCell, space, dict(pv=[]), dict(left=[], top=[], right=[], bottom=[]), max_full_hist + 0.1 * max_full_hist)
+
+    @staticmethod
+    def set_reconstructed_cds_data(predcheckCell, space, pvalue_rec, reconstructed, seg_y1):
+        """
+            Sets the p-value and the histogram of the selected samples and the height <seg_y1> of the segment of the observed data.
+        """
+        seg = predcheckCell.ic.get_model_property(predcheckCell.seg[space], 'data')
+        predcheckCell.ic.set_model_properties(predcheckCell.pvalue_rec[space], data = pvalue_rec)
+        predcheckCell.ic.set_model_properties(predcheckCell.reconstructed[space], data = reconstructed)
+        predcheckCell.ic.set_model_properties(predcheckCell.seg[space], data = dict(seg, y1 = [seg_y1]))
         
 
@@ -1,10 +1,14 @@
 from logging import error
-from ipme.utils.constants import  COLORS, BORDER_COLORS, PLOT_HEIGHT, PLOT_WIDTH, SIZING_MODE
+from .cell_selection_views import CellSelectionViews
+from ipme.utils.constants import  COLORS, BORDER_COLORS, PLOT_HEIGHT, PLOT_WIDTH, SIZING_MODE, RASTER_SIZE, RASTER_ALPHA_LEVELS, RASTER_MIN_ALPHA, \
+                                   CONTOUR_GRID_SIZE, CONTOUR_HDI_PROBS
+from ipme.utils.stats import encode_raster, raster_counts, kde_2d, hdi_levels
+from ipme.utils.functions import find_contour_segments
 
-from bokeh.models import ColumnDataSource, HoverTool
+from bokeh.models import ColumnDataSource, HoverTool, LinearColorMapper
 from bokeh.plotting import figure
 
-import arviz as az
+import numpy as np
 from functools import partial
 
 class CellScatterHandler:
@@ -14,18 +18,34 @@ class CellScatterHandler:
 
     @staticmethod
     def initialize_glyphs_interactive(scatterCell, space):
-        so = scatterCell.plot[space].circle(x="x", y="y", source = scatterCell.non_sel_samples[space], size=4, color=COLORS[0], line_color=None, fill_alpha = 0.1)        
-        scatterCell.plot[space].patches(xs="x", ys="y", source = scatterCell.contours[space], line_color="line_color", fill_alpha="fill_alpha")
-        re = scatterCell.plot[space].circle(x="x", y="y", source = scatterCell.sel_samples[space], size=4, color=COLORS[1], line_color=None, fill_alpha = 0.4, name="re")
+        if scatterCell.raster[space]:
+            CellScatterHandler.initialize_glyphs_raster(scatterCell, space)
+            return
+        so = scatterCell.plot[space].circle(x="x", y="y", source = scatterCell.samples[space], view = scatterCell.non_sel_samples[space], size=4, color=COLORS[0], line_color=None, fill_alpha = 0.1)        
+        scatterCell.plot[space].segment(x0="x0", y0="y0", x1="x1", y1="y1", source = scatterCell.contours[space], line_color="black")
+        re = scatterCell.plot[space].circle(x="x", y="y", source = scatterCell.samples[space], view = scatterCell.sel_samples[space], size=4, color=COLORS[1], line_color=None, fill_alpha = 0.4, name="re")
         ##Tooltips
         TOOLTIPS = [("x", "@x"), ("y","@y"),]
         hover = HoverTool( tooltips = TOOLTIPS, renderers = [so,re], mode = 'mouse')
         scatterCell.plot[space].tools.append(hover)
 
+    @staticmethod
+    def initialize_glyphs_raster(scatterCell, space):
+        """
+            Draws the samples of <space> as one image spanning the x-ranges of the cell's variables.
+            The pixel values are mapped to the colors of get_raster_palette().
+        """
+        xmin, xmax = scatterCell.x_range[scatterCell.vars[1]][space]
+        ymin, ymax = scatterCell.x_range[scatterCell.vars[0]][space]
+        palette = CellScatterHandler.get_raster_palette()
+        color_mapper = LinearColorMapper(palette = palette, low = -0.5, high = len(palette) - 0.5)
+        scatterCell.plot[space].image(image = "image", x = xmin, y = ymin, dw = xmax - xmin, dh = ymax - ymin, source = scatterCell.raster_image[space], color_mapper = color_mapper, name = "raster")
+        scatterCell.plot[space].segment(x0="x0", y0="y0", x1="x1", y1="y1", source = scatterCell.contours[space], line_color="black")
+
     @staticmethod
     def initialize_glyphs_static(scatterCell, space):
         so = scatterCell.plot[space].circle(x="x", y="y", source = scatterCell.samples[space], size=7, color=COLORS[0], line_color=None, fill_alpha = 0.1)
-        scatterCell.plot[space].patches(xs="x", ys="y", source = scatterCell.contours[space], line_color="line_color", fill_alpha="fill_alpha")
+        scatterCell.plot[space].segment(x0="x0", y0="y0", x1="x1", y1="y1", source = scatterCell.contours[space], line_color="black")
         ##Tooltips
         TOOLTIPS = [("x", "@x"), ("y","@y"),]
         hover = HoverTool( tooltips = TOOLTIPS, renderers = [so], mode = 'mouse')
@@ -49,13 +69,13 @@ class CellScatterHandler:
     def initialize_fig_interactive(scatterCell, space):
         CellScatterHandler.initialize_fig(scatterCell, space)
         ##on_change
-        scatterCell.ic.sample_inds_update[space].on_change('data', partial(scatterCell.sample_inds_callback, space))
+        scatterCell.ic.subscribe_sample_inds_update(space, partial(scatterCell.sample_inds_callback, space))
 
     @staticmethod
     def initialize_fig_static(scatterCell, space):
         CellScatterHandler.initialize_fig(scatterCell, space)
         ##on_change
-        scatterCell.ic.sample_inds_update[space].on_change('data', partial(scatterCell.sample_inds_callback, space))
+        scatterCell.ic.subscribe_sample_inds_update(space, partial(scatterCell.sample_inds_callback, space))
 
     @staticmethod
     def initialize_cds(scatterCell, space):
@@ -64,20 +84,20 @@ class CellScatterHandler:
         samples1 = scatterCell.get_samples_for_cur_idx_dims_values(var1, space)
         samples2 = scatterCell.get_samples_for_cur_idx_dims_values(var2, space)
         scatterCell.samples[space] = ColumnDataSource(data = dict(x = samples2, y = samples1))
-        patch_x, patch_y = CellScatterHandler.get_contours(samples2, samples1)
-        scatterCell.contours[space] = ColumnDataSource(data = dict(x = patch_x, y = patch_y, line_color=["black"]*len(patch_x), fill_alpha=[0]*len(patch_x)))
-        scatterCell.ic.initialize_sample_inds(space, dict(inds = [False]*len(scatterCell.samples[space].data['x'])), dict(non_inds = [True]*len(scatterCell.samples[space].data['x'])))
+        scatterCell.contours[space] = ColumnDataSource(data = CellScatterHandler.get_cached_contours(scatterCell, space))
+        scatterCell.ic.initialize_sample_inds(space, len(scatterCell.samples[space].data['x']))
   
     @staticmethod
     def initialize_cds_interactive(scatterCell, space):
         CellScatterHandler.initialize_cds(scatterCell, space)
-        inds, non_inds = scatterCell.ic.get_sample_inds(space)
-        sel_y = scatterCell.samples[space].data['y'][inds]
-        non_sel_y = scatterCell.samples[space].data['y'][non_inds]
-        sel_samples = scatterCell.samples[space].data['x'][inds]
-        non_sel_samples = scatterCell.samples[space].data['x'][non_inds]
-        scatterCell.sel_samples[space] = ColumnDataSource(data = dict( x = sel_samples, y = sel_y))
-        scatterCell.non_sel_samples[space] = ColumnDataSource(data = dict( x = non_sel_samples, y = non_sel_y))
+        num_samples = len(scatterCell.samples[space].data['x'])
+        scatterCell.raster[space] = scatterCell.raster_threshold is not None and num_samples > scatterCell.raster_threshold
+        if scatterCell.raster[space]:
+            ## the samples cds is not referenced by any glyph, so it is not sent to the browser
+            CellScatterHandler.set_raster_codes(scatterCell, space)
+            scatterCell.raster_image[space] = ColumnDataSource(data = dict(image = [CellScatterHandler.get_raster_image(scatterCell, space)]))
+        else:
+            CellSelectionViews.initialize_sel_samples_views(scatterCell, space)
         
     @staticmethod
     def initialize_cds_static(scatterCell, space):
@@ -96,6 +116,8 @@ class CellScatterHandler:
         """
             Update samples cds in the static mode
         """
+        if scatterCell.mask_unchanged(space):
+            return
         var1 = scatterCell.vars[0]
         var2 = scatterCell.vars[1]
         samples1 = scatterCell.get_samples_for_cur_idx_dims_values(var1, space)
@@ -104,13 +126,11 @@ class CellScatterHandler:
         if True in inds:
             sel_sample1 = samples1[inds]
             sel_sample2 = samples2[inds]
-            scatterCell.samples[space].data = dict(x=sel_sample2, y=sel_sample1)
-            patch_x, patch_y = CellScatterHandler.get_contours(sel_sample2, sel_sample1)
-            scatterCell.contours[space].data = dict(x = patch_x, y = patch_y, line_color=["black"]*len(patch_x), fill_alpha=[0]*len(patch_x))
+            scatterCell.ic.set_model_properties(scatterCell.samples[space], data = dict(x=sel_sample2, y=sel_sample1))
+            scatterCell.ic.set_model_properties(scatterCell.contours[space], data = CellScatterHandler.get_contours(sel_sample2, sel_sample1))
         else:
-            scatterCell.samples[space].data = dict(x=samples2, y=samples1)
-            patch_x, patch_y = CellScatterHandler.get_contours(samples2, samples1)
-            scatterCell.contours[space].data = dict(x = patch_x, y = patch_y, line_color=["black"]*len(patch_x), fill_alpha=[0]*len(patch_x))
+            scatterCell.ic.set_model_properties(scatterCell.samples[space], data = dict(x=samples2, y=samples1))
+            scatterCell.ic.set_model_properties(scatterCell.contours[space], data = CellScatterHandler.get_cached_contours(scatterCell, space))
             
     ## ONLY FOR INTERACTIVE CASE
     @staticmethod
@@ -123,33 +143,83 @@ class CellScatterHandler:
         samples1 = scatterCell.get_samples_for_cur_idx_dims_values(var1, space)
         samples2 = scatterCell.get_samples_for_cur_idx_dims_values(var2, space)
         scatterCell.samples[space].data = dict(x=samples2, y=samples1)
-        patch_x, patch_y = CellScatterHandler.get_contours(samples2, samples1)
-        scatterCell.contours[space].data = dict(x = patch_x, y = patch_y, line_color=["black"]*len(patch_x), fill_alpha=[0]*len(patch_x))
+        if scatterCell.raster[space]:
+            CellScatterHandler.set_raster_codes(scatterCell, space)
+        scatterCell.contours[space].data = CellScatterHandler.get_cached_contours(scatterCell, space)
+        if scatterCell.contours_prefetch:
+            CellScatterHandler.prefetch_contours(scatterCell, space)
 
     @staticmethod
     def update_sel_samples_cds_interactive(scatterCell, space):
         """
-            Updates reconstructed ColumnDataSource (cds).
+            Updates the glyphs of the selected samples. The selected and non-selected
+            samples are filtered by the views of the samples cds in the browser.
         """
-        samples1 = scatterCell.samples[space].data['x']
-        samples2 = scatterCell.samples[space].data['y']
-        inds, non_inds = scatterCell.ic.get_sample_inds(space)
-        # update sel samples
-        sel_sample1 = samples1[inds]
-        sel_sample2 = samples2[inds]
-        scatterCell.sel_samples[space].data = dict(x=sel_sample1, y=sel_sample2)
+        if scatterCell.mask_unchanged(space):
+            return
+        if scatterCell.raster[space]:
+            scatterCell.ic.set_model_properties(scatterCell.raster_image[space], data = dict(image = [CellScatterHandler.get_raster_image(scatterCell, space)]))
+            return
+        inds, _ = scatterCell.ic.get_sample_inds(space)
+        num_sel = np.count_nonzero(inds)
         # update transparency
         for re in scatterCell.plot[space].renderers:
-            if re.name == "re" and len(sel_sample1) < 50:
-                re.glyph.fill_alpha = 0.8
-            elif re.name == "re" and len(sel_sample1) < 200:
-                re.glyph.fill_alpha = 0.5
+            if re.name == "re" and num_sel < 50:
+                scatterCell.ic.set_model_properties(re.glyph, fill_alpha = 0.8)
+            elif re.name == "re" and num_sel < 200:
+                scatterCell.ic.set_model_properties(re.glyph, fill_alpha = 0.5)
             elif re.name == "re":
-                re.glyph.fill_alpha = 0.2
-        # update non_sel samples
-        non_sel_sample1 = samples1[non_inds]
-        non_sel_sample2 = samples2[non_inds]
-        scatterCell.non_sel_samples[space].data = dict(x=non_sel_sample1, y=non_sel_sample2)
+                scatterCell.ic.set_model_properties(re.glyph, fill_alpha = 0.2)
+
+    ## RASTER MODE
+    @staticmethod
+    def set_raster_codes(scatterCell, space):
+        """
+            Sets the pixel of each sample of <space> on the raster grid.
+        """
+        var1 = scatterCell.vars[0]
+        var2 = scatterCell.vars[1]
+        scatterCell.raster_codes[space] = encode_raster(scatterCell.samples[space].data['x'], scatterCell.samples[space].data['y'],
+                                                        scatterCell.x_range[var2][space], scatterCell.x_range[var1][space], RASTER_SIZE)
+
+    @staticmethod
+    def get_raster_palette():
+        """
+            Returns a List of the RGBA colors of the raster pixel values: 0 is transparent,
+            1 + l is the non-selected color and 1 + RASTER_ALPHA_LEVELS + l the selected one
+            with the opacity of level l.
+        """
+        palette = [(0, 0, 0, 0.)]
+        for color in COLORS[:2]:
+            rgb = tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
+            for alpha in np.linspace(RASTER_MIN_ALPHA, 1., RASTER_ALPHA_LEVELS):
+                palette.append(rgb + (round(float(alpha), 3),))
+        return palette
+
+    @staticmethod
+    def get_raster_image(scatterCell, space):
+        """
+            Returns the image of the samples of <space> as indices into get_raster_palette(), not as
+            RGBA colors: a pixel takes the index of the selected color if it holds any selected
+            sample, otherwise that of the non-selected color (0 if it is empty). Its opacity level
+            increases with the log of its count. The browser maps the indices to the palette.
+
+            Returns:
+            --------
+                A <RASTER_SIZE>x<RASTER_SIZE> numpy.ndarray of uint8 palette indices, the first row at the bottom.
+        """
+        codes = scatterCell.raster_codes[space]
+        inds, _ = scatterCell.ic.get_sample_inds(space)
+        sel_counts = raster_counts(codes, RASTER_SIZE, weights = inds)
+        non_sel_counts = raster_counts(codes, RASTER_SIZE) - sel_counts
+        image = np.zeros((RASTER_SIZE, RASTER_SIZE), dtype = np.uint8)
+        for i, counts in enumerate([non_sel_counts, sel_counts]):
+            occupied = counts > 0
+            if not occupied.any():
+                continue
+            levels = np.log1p(counts[occupied]) / np.log1p(counts.max())
+            image[occupied] = 1 + i * RASTER_ALPHA_LEVELS + np.round(levels * (RASTER_ALPHA_LEVELS - 1)).astype(np.uint8)
+        return image
 
     # @staticmethod
     # def set_transparency(samples1, samples2, sel_samples1, sel_samples2):
@@ -163,19 +233,43 @@ class CellScatterHandler:
     #     sels_y_min = sel_samples2.min()
     #     sels_y_max = sel_samples2.max()
 
+    ## CONTOURS
+    @staticmethod
+    def get_cached_contours(scatterCell, space, idx_dims_values = None):
+        """
+            Returns the contours (see get_contours) of the samples of <space> for <idx_dims_values>
+            (defaults to the current ones), cached by IC.
+        """
+        if idx_dims_values is None:
+            idx_dims_values = {var: dict(values) for var, values in scatterCell.cur_idx_dims_values.items()}
+        key = scatterCell.get_contours_key(space, idx_dims_values)
+        return scatterCell.ic.get_contours_data(key, partial(CellScatterHandler._compute_contours, scatterCell, space, idx_dims_values))
+
+    @staticmethod
+    def prefetch_contours(scatterCell, space):
+        """
+            Computes in the background the contours of <space> for the adjacent options
+            of the index dimensions widgets, so that moving to them does not wait for the kde.
+        """
+        for idx_dims_values in scatterCell.get_adjacent_idx_dims_values():
+            key = scatterCell.get_contours_key(space, idx_dims_values)
+            scatterCell.ic.prefetch_contours_data(key, partial(CellScatterHandler._compute_contours, scatterCell, space, idx_dims_values))
+
+    @staticmethod
+    def _compute_contours(scatterCell, space, idx_dims_values):
+        samples1 = scatterCell.get_samples_for_idx_dims_values(scatterCell.vars[0], space, idx_dims_values)
+        samples2 = scatterCell.get_samples_for_idx_dims_values(scatterCell.vars[1], space, idx_dims_values)
+        return CellScatterHandler.get_contours(samples2, samples1)
+
     @staticmethod
     def get_contours(x, y):
-        try:
-            _, contour_glyphs = az.plot_kde(x, y,
-            #     hdi_probs=[0.393, 0.865, 0.989],  # 1, 2 and 3 sigma contours
-                contour_kwargs={"line_color":"black", "line_alpha":1},
-                contourf_kwargs={"fill_alpha": 0, "cmap": "viridis"},
-                backend="bokeh", return_glyph = True, show = False )
-            patch_x = []
-            patch_y = []
-            for renderer in contour_glyphs:
-                patch_x.append(renderer.data_source.data['x'].tolist())
-                patch_y.append(renderer.data_source.data['y'].tolist())
-            return patch_x, patch_y
-        except ValueError:
-            return [],[]
\ No newline at end of file
+        """
+            Returns a Dict {'x0','y0','x1','y1'} of the line segments of the contours of the kde of
+            (<x>,<y>) around the highest density regions of CONTOUR_HDI_PROBS. The Dict has empty
+            arrays if the kde cannot be estimated.
+        """
+        density = kde_2d(x, y, grid_size = CONTOUR_GRID_SIZE)
+        if density is None:
+            return dict(x0 = np.array([]), y0 = np.array([]), x1 = np.array([]), y1 = np.array([]))
+        levels = hdi_levels(density['density'], CONTOUR_HDI_PROBS)
+        return find_contour_segments(density['x'], density['y'], density['density'], levels)
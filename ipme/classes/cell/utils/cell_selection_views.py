@@ -0,0 +1,19 @@
+from ipme.utils.js_code import SELECTION_FILTER_CODE, SELECTION_VIEWS_CODE
+
+from bokeh.models import CDSView, CustomJSFilter, CustomJS
+
+class CellSelectionViews:
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def initialize_sel_samples_views(cell, space):
+        """
+            Creates the views of the selected and non-selected samples of <space>. They filter the samples
+            cds in the browser with the shared selection cds of IC, so that only the mask is sent on a selection.
+        """
+        selection = cell.ic.get_sample_inds_cds(space)
+        cell.sel_samples[space] = CDSView(source = cell.samples[space], filters = [CustomJSFilter(args = dict(selection = selection, selected = 1), code = SELECTION_FILTER_CODE)])
+        cell.non_sel_samples[space] = CDSView(source = cell.samples[space], filters = [CustomJSFilter(args = dict(selection = selection, selected = 0), code = SELECTION_FILTER_CODE)])
+        selection.js_on_change('data', CustomJS(args = dict(views = [cell.sel_samples[space], cell.non_sel_samples[space]]), code = SELECTION_VIEWS_CODE))
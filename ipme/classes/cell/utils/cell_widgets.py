@@ -127,6 +127,8 @@ class CellWidgets:
                 variableCell.cur_idx_dims_values[var][w_title] = inds
             if w2_title and w2_title in variableCell.cur_idx_dims_values[var]:
                 variableCell.cur_idx_dims_values[var][w2_title] = [0]        
+        if not variableCell.is_initialized(space):
+            return
         variableCell.update_source_cds(space)
         variableCell.ic.set_global_update(True)
         variableCell.update_cds(space)
@@ -161,6 +163,8 @@ class CellWidgets:
                 variableCell.cur_idx_dims_values[var][w_title] = inds
             if w2_title and w2_title in variableCell.cur_idx_dims_values[var]:
                 variableCell.cur_idx_dims_values[var][w2_title] = [0]
+        if not variableCell.is_initialized(space):
+            return
         variableCell.update_cds(space)
 
     @staticmethod
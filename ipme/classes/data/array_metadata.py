@@ -0,0 +1,14 @@
+class ArrayMetadata:
+    def __init__(self, array_name, dims=[], shape=None, dtype=None):
+        """
+            Parameters:
+            --------
+                array_name      A String of the array name in the inference data.
+                dims            A List of Strings of the array dimensions names (e.g. ['chain','draw',...]).
+                shape           A Tuple of the array shape (None if unknown).
+                dtype           A numpy.dtype of the array (None if unknown).
+        """
+        self.array_name=array_name
+        self.dims=dims
+        self.shape=shape
+        self.dtype=dtype
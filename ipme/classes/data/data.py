@@ -1,19 +1,36 @@
 import numpy as np
 import json
+import ast
+import struct
+from functools import partial
 
 from ...interfaces.data_interface import Data_Interface
 from .dimension import Dimension
+from .array_metadata import ArrayMetadata
+from ...utils.cache import LRUCache, get_base_nbytes
+from ...utils.constants import ARRAYS_CACHE_MAX_BYTES
+from ...utils.stats import find_x_range, pred_check_stats
+from ...utils.functions import get_finite_samples
 
 class Data(Data_Interface):
 
-    def __init__(self, inference_path):
+    def __init__(self, inference_path, cache_max_bytes = ARRAYS_CACHE_MAX_BYTES):
         """
             Parameters:
             --------
                 inference_path      A String of the inference data file path.
+                cache_max_bytes     An Int of the memory budget (in bytes) of the decoded arrays cache.
             Sets:
             --------
+                _arrays_cache       A LRUCache {<array_name>: decoded numpy.ndarray,
+                                    ('samples',<var_name>,<space>): (samples, x_range) of the samples shared by all the cells,
+                                    ('pred_checks',<var_name>,<space>): Dict of the predictive check statistics of every draw
+                                    shared by the predictive check cells}.
+                                    The shared samples are views of the decoded arrays: they are accounted with the whole
+                                    array they keep alive, so that evicted arrays do not outlive the budget.
                 _inferencedata      A structure of the inference data.
+                _header             A Dict of the inference data header parsed once at load time.
+                _arrays_index       A Dict {<space>:{<var_name>:ArrayMetadata obj}}.
                 _graph              A structure of the  model's variables graph data.
                 _observed_variables A List of Strings of the observed variables.
                 _idx_dimensions     A List of Dimension Objects defining
@@ -21,6 +38,7 @@ class Data(Data_Interface):
                 _spaces             A List of Strings in {'prior', 'posterior'} of all
                                     the available MCMC sample spaces in the inference data
         """
+        self._arrays_cache = LRUCache(cache_max_bytes, sizeof = get_base_nbytes)
         Data_Interface.__init__(self, inference_path)
 
     def _load_inference_data(self, datapath):
@@ -40,6 +58,92 @@ class Data(Data_Interface):
             print("File %s cannot be loaded" % datapath)
             return None
 
+    def _get_header(self):
+        """
+            The header of the inference data in json format is parsed
+            once at load time and kept in memory.
+
+            Returns:
+            --------
+                A Dictionary of header data
+        """
+        try:
+            return json.loads(self._inferencedata['header.json'])
+        except (KeyError, TypeError):
+            print("Inference_data has no key 'header.json'")
+            return {}
+
+    def _get_arrays_index(self):
+        """
+            Indexes the arrays of the inference data by space and variable.
+
+            Returns:
+            --------
+                A Dict {<space>:{<var_name>:ArrayMetadata obj}}
+        """
+        arrays_index = {}
+        if 'inference_data' not in self._header:
+            return arrays_index
+        for space, space_data in self._header['inference_data'].items():
+            if not isinstance(space_data, dict) or 'array_names' not in space_data:
+                continue
+            arrays_index[space] = {}
+            vars_data = space_data.get('vars', {})
+            for var_name, array_name in space_data['array_names'].items():
+                dims = []
+                if var_name in vars_data and 'dims' in vars_data[var_name]:
+                    dims = vars_data[var_name]['dims']
+                shape, dtype = self._read_array_header(array_name)
+                arrays_index[space][var_name] = ArrayMetadata(array_name, dims = dims, shape = shape, dtype = dtype)
+        return arrays_index
+
+    def _read_array_header(self, array_name):
+        """
+            Reads shape and dtype from the .npy header of <array_name>
+            without decompressing the array data.
+
+            Returns:
+            --------
+                A Tuple (shape, dtype), (None, None) if the header cannot be read.
+        """
+        try:
+            with self._inferencedata.zip.open(array_name + '.npy') as fp:
+                return Data._read_npy_header(fp)
+        except (KeyError, ValueError, AttributeError):
+            return (None, None)
+
+    @staticmethod
+    def _read_npy_header(fp):
+        """
+            Reads shape and dtype from the header of the .npy file object <fp>.
+            The header length is 2 bytes in format 1.0 and 4 bytes in formats 2.0 and 3.0,
+            and the header of format 3.0 is utf-8 encoded (instead of latin1).
+
+            Returns:
+            --------
+                A Tuple (shape, dtype).
+            Raises:
+            --------
+                ValueError if <fp> is not a .npy file or its format version is not supported.
+        """
+        version = np.lib.format.read_magic(fp)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(fp)
+        elif version == (2, 0):
+            shape, _, dtype = np.lib.format.read_array_header_2_0(fp)
+        elif version == (3, 0):
+            header_length = struct.unpack('<I', fp.read(4))[0]
+            header = fp.read(header_length)
+            if len(header) != header_length:
+                raise ValueError("Truncated .npy header")
+            header = ast.literal_eval(header.decode('utf8'))
+            if not isinstance(header, dict) or not {'descr', 'fortran_order', 'shape'} <= header.keys():
+                raise ValueError("Invalid .npy header: %r" % (header,))
+            shape, dtype = tuple(header['shape']), np.lib.format.descr_to_dtype(header['descr'])
+        else:
+            raise ValueError("Unsupported .npy format version %d.%d" % version)
+        return (shape, dtype)
+
     def _get_graph(self):
         """
             A graph of the probabilistic model in json format is
@@ -51,9 +155,7 @@ class Data(Data_Interface):
         """
         graph=""
         try:
-            header = self._inferencedata['header.json']
-            header_js = json.loads(header)
-            graph = header_js["inference_data"]["sample_stats"]["attrs"]["graph"]
+            graph = self._header["inference_data"]["sample_stats"]["attrs"]["graph"]
         except KeyError:
             print("Inference_data has no key 'header.json'")
             return None
@@ -89,13 +191,10 @@ class Data(Data_Interface):
                           'constant_data', 'sample_stats', 'log_likelihood', 'predictions', 'predictions_constant_data'}
         """
         spaces=[]
-        if 'header.json' in self._inferencedata:
-            header = self._inferencedata['header.json']
-            header_js = json.loads(header)
-            if 'inference_data' in header_js:
-                for space in ['prior','posterior','prior_predictive','posterior_predictive','observed_data','constant_data', 'sample_stats', 'log_likelihood', 'predictions', 'predictions_constant_data']:
-                    if space in header_js['inference_data']:
-                        spaces.append(space)
+        if 'inference_data' in self._header:
+            for space in ['prior','posterior','prior_predictive','posterior_predictive','observed_data','constant_data', 'sample_stats', 'log_likelihood', 'predictions', 'predictions_constant_data']:
+                if space in self._header['inference_data']:
+                    spaces.append(space)
         return spaces
 
     def is_observed_variable(self,var_name):
@@ -131,14 +230,18 @@ class Data(Data_Interface):
         else:
             return []
 
-    def get_samples(self, var_name, space=['prior','posterior']):
+    def get_samples(self, var_name, space=['prior','posterior'], average_chains = False):
         """
             Returns the samples of <var_name> variable of the given space(s).
+            The chains are concatenated along the draw axis, as a view of the
+            stored array when its layout allows it.
 
             Parameters:
             --------
-                var_name      A String of the model's variables name
-                space         Either a List of Strings or a String with String in {'prior','posterior'}
+                var_name        A String of the model's variables name
+                space           Either a List of Strings or a String with String in {'prior','posterior'}
+                average_chains  A Boolean: if True, the samples are averaged over the chain dimension
+                                instead of being concatenated.
             Returns:
             --------
                 A Dictionary of the form { <space> : <samples> }
@@ -151,56 +254,186 @@ class Data(Data_Interface):
                 If a String of space is given, it returns the numpy.ndarray.
 
         """
-        array_name=""
-        header = self._inferencedata['header.json']
-        header_js = json.loads(header)
         if isinstance(space, list):
             data = {}
             for sp in space:
                 if sp in self._spaces and self._is_var_in_space(var_name,sp):
-                    array_name = header_js['inference_data'][sp]['array_names'][var_name]
-                    if 'chain' in header_js['inference_data'][sp]['vars'][var_name]['dims']:
-                        data[sp] = np.mean(self._inferencedata[array_name],axis=0)
-                    else:
-                        data[sp] = self._inferencedata[array_name]
+                    data[sp] = self._get_var_array(var_name, sp, average_chains)
             return data
         elif isinstance(space, str):
             data = np.asarray([])
             if space in self._spaces and self._is_var_in_space(var_name,space):
-                array_name = header_js['inference_data'][space]['array_names'][var_name]
-                if 'chain' in header_js['inference_data'][space]['vars'][var_name]['dims']:
-                    data = np.mean(self._inferencedata[array_name],axis=0)
-                else:
-                    data = self._inferencedata[array_name]
+                data = self._get_var_array(var_name, space, average_chains)
             return data
         else:
             raise ValueError("space argument of get_sample should be either a List of Strings or a String")
 
-    def get_observations(self, var_name):
+    def get_samples_space(self, var_name, space):
         """
-            Returns the observations of <var_name> variable.
+            Returns the space where the samples of <var_name> are drawn from in <space>.
+            For observed variables, these are the samples of the predictive spaces.
+
+            Parameters:
+            --------
+                var_name      A String of the model's variables name
+                space         A String in {'prior','posterior'}
+            Returns:
+            --------
+                A String in {'prior','posterior','prior_predictive','posterior_predictive'}
+        """
+        if self.get_var_type(var_name) == "observed":
+            if space == "posterior" and "posterior_predictive" in self._spaces:
+                return "posterior_predictive"
+            elif space == "prior" and "prior_predictive" in self._spaces:
+                return "prior_predictive"
+        return space
+
+    def get_shared_samples(self, var_name, space):
+        """
+            Returns the samples of <var_name> in <space> and their x-range.
+            They are retrieved and computed once and shared by all the cells,
+            until they are evicted from the arrays cache.
 
             Parameters:
             --------
                 var_name      A String of the model's variables name
+                space         A String in {'prior','posterior'}
+            Returns:
+            --------
+                A Tuple (samples, x_range):
+                samples    A read-only numpy.ndarray of the samples with the draws in the last axis.
+                x_range    A Tuple (min,max) of the samples' x-range.
+        """
+        return self._arrays_cache.get_or_compute(('samples', var_name, space), partial(self._get_shared_samples, var_name, space))
+
+    def _get_shared_samples(self, var_name, space):
+        samples = self.get_samples(var_name, self.get_samples_space(var_name, space)).T.view()
+        samples.flags.writeable = False
+        return (samples, find_x_range(samples))
+
+    def get_pred_check_stats(self, var_name, space):
+        """
+            Returns the predictive check statistics of every draw of the predictive samples of the
+            observed variable <var_name> in <space>. They are computed once in one pass over
+            the samples and shared by all the predictive check cells, until they are evicted from the
+            arrays cache.
+
+            Parameters:
+            --------
+                var_name      A String of the model's observed variables name
+                space         A String in {'prior','posterior'}
+            Returns:
+            --------
+                A Dict {'min','max','mean','std'} of numpy.ndarrays with one value per draw (NaN for the
+                draws with non-finite samples) and 'values': a numpy.ndarray of the unique finite
+                sample values of a Discrete variable (None for a Continuous one).
+        """
+        return self._arrays_cache.get_or_compute(('pred_checks', var_name, space), partial(self._get_pred_check_stats, var_name, space))
+
+    def _get_pred_check_stats(self, var_name, space):
+        samples = self.get_samples(var_name, self.get_samples_space(var_name, space))
+        stats = pred_check_stats(samples)
+        stats['values'] = None
+        if self.get_var_dist_type(var_name) == "Discrete":
+            stats['values'] = self._get_pred_check_values(samples)
+        return stats
+
+    def get_pred_check_values(self, var_name, space, inds):
+        """
+            Returns the unique finite sample values of the predictive draws selected by <inds>
+            of the Discrete observed variable <var_name> in <space>.
+
+            Parameters:
+            --------
+                var_name      A String of the model's observed variables name
+                space         A String in {'prior','posterior'}
+                inds          A boolean numpy.ndarray of the selected draws
+            Returns:
+            --------
+                A numpy.ndarray of the unique values (the reference values of the check histograms).
+        """
+        samples = self.get_samples(var_name, self.get_samples_space(var_name, space))
+        return self._get_pred_check_values(samples[inds])
+
+    @staticmethod
+    def _get_pred_check_values(samples):
+        if ~np.isfinite(samples).all():
+            samples = get_finite_samples(samples)
+        return np.unique(samples.flatten())
+
+    def get_observations(self, var_name, average_chains = False):
+        """
+            Returns the observations of <var_name> variable.
+
+            Parameters:
+            --------
+                var_name        A String of the model's variables name
+                average_chains  A Boolean: if True, the observations are averaged over the chain dimension
+                                instead of being concatenated.
             Returns:
             --------
                 A numpy.ndarray of observations of the <var_name> parameter.
         """
-        array_name=""
-        header = self._inferencedata['header.json']
-        header_js = json.loads(header)
-        data = None  
-        if var_name in header_js['inference_data']['observed_data']['array_names']:
-            array_name = header_js['inference_data']['observed_data']['array_names'][var_name]
-            dims = header_js['inference_data']['observed_data']['vars'][var_name]['dims']
-            if 'chain' in dims:
-                data = np.mean(self._inferencedata[array_name], axis=0)
-            else:
-                data = self._inferencedata[array_name]
-            return data
+        if self._is_var_in_space(var_name, 'observed_data'):
+            return self._get_var_array(var_name, 'observed_data', average_chains)
         else:
-            return data
+            return None
+
+    def get_array_metadata(self, var_name, space):
+        """
+            Returns the ArrayMetadata object of <var_name> in <space>
+            or None if <var_name> is not in <space>.
+        """
+        if self._is_var_in_space(var_name, space):
+            return self._arrays_index[space][var_name]
+        else:
+            return None
+
+    def _get_var_array(self, var_name, space, average_chains = False):
+        """
+            Returns the array of <var_name> in <space> with its chains either
+            concatenated along the draw axis or averaged (<average_chains>=True).
+        """
+        metadata = self._arrays_index[space][var_name]
+        array = self._get_array(metadata.array_name)
+        if 'chain' not in metadata.dims:
+            return array
+        if average_chains or 'draw' not in metadata.dims:
+            return np.mean(array, axis = metadata.dims.index('chain'))
+        return self._stack_chains(array, metadata.dims)
+
+    @staticmethod
+    def _stack_chains(array, dims):
+        """
+            Concatenates the chains of <array> along the draw axis.
+
+            Parameters:
+            --------
+                array   A numpy.ndarray with 'chain' and 'draw' dimensions.
+                dims    A List of Strings of the <array> dimensions names.
+            Returns:
+            --------
+                A numpy.ndarray of shape (chain*draw, ...). It is a view of <array> (no copy)
+                when 'chain','draw' are the leading dimensions of a C-contiguous array.
+        """
+        chain_axis = dims.index('chain')
+        draw_axis = dims.index('draw')
+        if (chain_axis, draw_axis) != (0, 1):
+            array = np.moveaxis(array, [chain_axis, draw_axis], [0, 1])
+        return array.reshape((-1,) + array.shape[2:])
+
+    def _get_array(self, array_name):
+        """
+            Returns the decoded array <array_name>. Each npz member is decompressed
+            once and kept in the arrays cache until it is evicted.
+            Cached arrays are shared, so they are returned read-only.
+        """
+        return self._arrays_cache.get_or_compute(array_name, partial(self._decode_array, array_name))
+
+    def _decode_array(self, array_name):
+        array = self._inferencedata[array_name]
+        array.flags.writeable = False
+        return array
 
     def get_range(self, var_name, space=['prior','posterior']):
         """
@@ -215,11 +448,8 @@ class Data(Data_Interface):
                 Tuple (min,max)
 
         """
-        if self.get_var_type(var_name) == "observed":
-            if space == "posterior" and "posterior_predictive" in self.get_spaces():
-                space="posterior_predictive"
-            elif space == "prior" and "prior_predictive" in self.get_spaces():
-                space="prior_predictive"
+        if isinstance(space, str):
+            space = self.get_samples_space(var_name, space)
         data = self.get_samples(var_name, space)
         min=0
         max=0
@@ -266,9 +496,7 @@ class Data(Data_Interface):
             --------
                 A Boolean
         """
-        header = self._inferencedata['header.json']
-        header_js = json.loads(header)
-        if var_name in header_js['inference_data'][space]['array_names']:
+        if space in self._arrays_index and var_name in self._arrays_index[space]:
             return True
         else:
             return False
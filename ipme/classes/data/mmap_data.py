@@ -0,0 +1,103 @@
+import numpy as np
+import json
+import os
+import threading
+
+from .data import Data
+from ...utils.constants import MMAP_METADATA_FILE
+
+class MmapData(Data):
+    def __init__(self, inference_path, store_path = None):
+        """
+            Inference data backed by a directory of uncompressed .npy files
+            that are opened as read-only memory maps.
+
+            Parameters:
+            --------
+                inference_path      A String of the .npz inference data file path.
+                store_path          A String of the directory of the uncompressed store.
+                                    Defaults to <inference_path> (without extension) + '_mmap'.
+            Sets:
+            --------
+                _store_path         A String of the directory of the uncompressed store.
+                _inferencedata      A Dict {'header': <header data>, 'arrays': {<array_name>: {'shape','dtype'}}}
+                                    of the store metadata.
+                _memmaps            A Dict {<array_name>: numpy.memmap}.
+        """
+        if store_path is None:
+            store_path = os.path.splitext(inference_path)[0] + "_mmap"
+        self._store_path = store_path
+        self._memmaps = {}
+        self._memmaps_lock = threading.Lock()
+        Data.__init__(self, inference_path)
+
+    def _load_inference_data(self, datapath):
+        """
+            The .npz inference data is converted once into the store directory.
+            The store is reused as long as it is not older than <datapath>.
+
+            Parameters:
+            --------
+                datapath   A String of the inference data path.
+            Returns:
+            --------
+                A Dictionary of the store metadata
+        """
+        metadata_path = os.path.join(self._store_path, MMAP_METADATA_FILE)
+        try:
+            if not os.path.isfile(metadata_path) or \
+                (os.path.isfile(datapath) and os.path.getmtime(metadata_path) < os.path.getmtime(datapath)):
+                self._convert_to_store(datapath)
+            with open(metadata_path) as f:
+                return json.load(f)
+        except IOError:
+            print("File %s cannot be loaded" % datapath)
+            return None
+
+    def _convert_to_store(self, datapath):
+        """
+            Decompresses the npz members one at a time into raw .npy files and writes
+            the metadata json file last, so that an interrupted conversion is redone.
+        """
+        os.makedirs(self._store_path, exist_ok = True)
+        arrays = {}
+        header = {}
+        with np.load(datapath) as npz:
+            for name in npz.files:
+                if name == 'header.json':
+                    header = json.loads(npz[name])
+                    continue
+                array = npz[name]
+                np.save(os.path.join(self._store_path, name + ".npy"), array)
+                arrays[name] = dict(shape = list(array.shape), dtype = array.dtype.str)
+        metadata_path = os.path.join(self._store_path, MMAP_METADATA_FILE)
+        with open(metadata_path + ".tmp", 'w') as f:
+            json.dump(dict(header = header, arrays = arrays), f)
+        os.replace(metadata_path + ".tmp", metadata_path)
+
+    def _get_header(self):
+        try:
+            return self._inferencedata['header']
+        except (KeyError, TypeError):
+            print("Inference_data has no key 'header.json'")
+            return {}
+
+    def _read_array_header(self, array_name):
+        try:
+            array_data = self._inferencedata['arrays'][array_name]
+            return (tuple(array_data['shape']), np.dtype(array_data['dtype']))
+        except (KeyError, TypeError):
+            return (None, None)
+
+    def _get_array(self, array_name):
+        """
+            Returns the read-only memory map of <array_name>. Pages are read from
+            disk only when the corresponding part of the array is accessed.
+        """
+        with self._memmaps_lock:
+            if array_name not in self._memmaps:
+                self._memmaps[array_name] = np.load(os.path.join(self._store_path, array_name + ".npy"), mmap_mode = 'r')
+            return self._memmaps[array_name]
+
+    def get_store_path(self):
+        return self._store_path
@@ -1,12 +1,14 @@
 from .data.data import Data
+from .data.mmap_data import MmapData
 from .grid.graph_grid import GraphGrid
 from .grid.predictive_ckecks_grid import PredictiveChecksGrid
 from .interaction_control.interaction_control import IC
 
 import panel as pn
+from functools import partial
 
 class Graph():
-    def __init__(self, data_path, mode = "i", vars = 'all', spaces = 'all', predictive_checks = []):
+    def __init__(self, data_path, mode = "i", vars = 'all', spaces = 'all', predictive_checks = [], memory_map = False, lazy = False, asynchronous = False):
         """
             Parameters:
             --------
@@ -16,17 +18,27 @@ class Graph():
                 vars                    A List of variables to be presented in the graph
                 spaces                  A List of spaces to be included in graph
                 predictive_checks       A List of observed variables to plot predictive checks.
+                memory_map              A Boolean: if True, the inference data is converted once into
+                                        an uncompressed store of .npy files that are memory-mapped.
+                lazy                    A Boolean: if True, the cells of a space are built when its tab
+                                        is first opened instead of all at start-up.
+                asynchronous            A Boolean: if True (and served by a Bokeh server), the updates of a selection
+                                        are computed in an executor and their document changes are sent together.
             Sets:
             --------
                 _mode                   A String in {"i","s"}, "i":interactive, "s":static.
                 _graph                  A Panel component object to visualize model's graoh.
         """
-        self.ic = IC(Data(data_path))
+        if memory_map:
+            self.ic = IC(MmapData(data_path), asynchronous)
+        else:
+            self.ic = IC(Data(data_path), asynchronous)
         if mode not in ["s","i"]:
             raise ValueError("ValueError: mode should take a value in {'i','s'}")
         self._mode = mode
         self._vars = vars
         self._spaces = spaces
+        self._lazy = lazy
         self._pred_checks = predictive_checks
         self._graph_grid = self._create_graph_grid()
         self._predictive_checks_grid = self._create_pred_checks_grid()
@@ -38,7 +50,7 @@ class Graph():
             collection of Panel grids (one per space) and a
             collection of plotted widges.
         """
-        return GraphGrid(self.ic, self._mode, self._vars, self._spaces)
+        return GraphGrid(self.ic, self._mode, self._vars, self._spaces, self._lazy)
 
     def _create_pred_checks_grid(self):
         """
@@ -57,7 +69,9 @@ class Graph():
         ## Tabs for prior-posterior graph
         g_grids = self._graph_grid.get_grids()
         g_plotted_widgets = self._graph_grid.get_plotted_widgets()
+        tab_spaces = []
         for space in g_grids:
+            tab_spaces.append(space)
             g_col = pn.Column(g_grids[space])
             if space in g_plotted_widgets:
                 widgetBox = pn.WidgetBox(*list(g_plotted_widgets[space].values()),sizing_mode = 'scale_both')
@@ -73,8 +87,18 @@ class Graph():
                     g_col = pn.Column(pc_grids[var][space])
                     tabs.append((var+'_'+space+'_predictive_checks', pn.Row(g_col)))
         #tabs.append((space+'_predictive_checks', pn.Row(c.get_plot(space,add_info=False), sizing_mode='stretch_both')))
+        if self._lazy and len(tab_spaces):
+            self._graph_grid.initialize_space(tab_spaces[0])
+            tabs.param.watch(partial(self._tab_callback, tab_spaces), 'active')
         return tabs
 
+    def _tab_callback(self, tab_spaces, event):
+        """
+            Builds the cells of a space the first time its tab is opened (lazy mode).
+        """
+        if event.new < len(tab_spaces):
+            self._graph_grid.initialize_space(tab_spaces[event.new])
+
     def set_coordinates(self, dim, options, value):
         self.ic.set_coordinates(self._graph_grid, dim, options, value)
             # try:
@@ -5,7 +5,6 @@ from ipme.classes.cell.static_continuous_cell import  StaticContinuousCell
 from ipme.classes.cell.static_discrete_cell import StaticDiscreteCell
 
 from ...utils.constants import MAX_NUM_OF_COLS_PER_ROW, MAX_NUM_OF_VARS_PER_ROW, COLS_PER_VAR
-import panel as pn
 
 class GraphGrid(Grid):
     def _create_grids(self):
@@ -38,14 +37,14 @@ class GraphGrid(Grid):
                 # grid_bgrd_col = level
                 if self._mode == "i":
                     if self._data.get_var_dist_type(var_name) == "Continuous":
-                        c = InteractiveContinuousCell(var_name, self.ic)
+                        c = InteractiveContinuousCell(var_name, self.ic, lazy = True)
                     else:
-                        c = InteractiveDiscreteCell(var_name, self.ic)
+                        c = InteractiveDiscreteCell(var_name, self.ic, lazy = True)
                 elif self._mode == "s":
                     if self._data.get_var_dist_type(var_name) == "Continuous":
-                        c = StaticContinuousCell(var_name, self.ic)
+                        c = StaticContinuousCell(var_name, self.ic, lazy = True)
                     else:
-                        c = StaticDiscreteCell(var_name, self.ic)
+                        c = StaticDiscreteCell(var_name, self.ic, lazy = True)
                 self.cells[var_name] = c
                 ##Add to grid
                 cell_spaces = c.get_spaces()
@@ -53,10 +52,7 @@ class GraphGrid(Grid):
                     # if space in self._spaces_to_included and space not in self.spaces:
                     #     self.spaces.append(space)
                     if space in self.spaces or self.spaces == 'all':
-                        if space not in self._grids:
-                            self._grids[space] = pn.GridSpec(sizing_mode = 'stretch_both')
-                        self._grids[space][ start_point[0]:end_point[0], start_point[1]:end_point[1] ] = pn.Column(c.get_plot(space, add_info = True), width=220, height=220)
-        self.ic.num_cells = len(self.cells)
+                        self._add_cell_to_grid(c, space, start_point, end_point, add_info = True)
 
     def _create_graph_grid_mapping(self):
         """
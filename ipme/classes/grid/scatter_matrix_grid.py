@@ -6,10 +6,23 @@ from ipme.classes.cell.interactive_discrete_cell import InteractiveDiscreteCell
 from ipme.classes.cell.static_continuous_cell import  StaticContinuousCell
 from ipme.classes.cell.static_discrete_cell import StaticDiscreteCell
 
-from ...utils.constants import COLS_PER_VAR
-import panel as pn
+from ...utils.constants import COLS_PER_VAR, RASTER_THRESHOLD, CONTOURS_PREFETCH
 
 class ScatterMatrixGrid(Grid):
+    def __init__(self, control, mode, vars = 'all', spaces = 'all', lazy = False, raster_threshold = RASTER_THRESHOLD, contours_prefetch = CONTOURS_PREFETCH):
+        """
+            Parameters:
+            --------
+                raster_threshold        An Int of the number of draws above which the scatter cells
+                                        draw their samples as an image (None: never).
+                contours_prefetch       A Boolean: if True, the scatter cells compute the contours of the
+                                        adjacent index dimensions values in the background.
+                The other parameters are those of Grid.
+        """
+        self._raster_threshold = raster_threshold
+        self._contours_prefetch = contours_prefetch
+        Grid.__init__(self, control, mode, vars, spaces, lazy)
+
     def _create_grids(self):
         """
             Creates one Cell object per variable. Cell object is the smallest
@@ -34,23 +47,23 @@ class ScatterMatrixGrid(Grid):
                     var_name = self._vars[col]                    
                     if self._mode == "i":
                         if self._data.get_var_dist_type(var_name) == "Continuous":
-                            c = InteractiveContinuousCell(var_name, self.ic)
+                            c = InteractiveContinuousCell(var_name, self.ic, lazy = True)
                         else:
-                            c = InteractiveDiscreteCell(var_name, self.ic)
+                            c = InteractiveDiscreteCell(var_name, self.ic, lazy = True)
                     elif self._mode == "s":
                         if self._data.get_var_dist_type(var_name) == "Continuous":
-                            c = StaticContinuousCell(var_name, self.ic)
+                            c = StaticContinuousCell(var_name, self.ic, lazy = True)
                         else:
-                            c = StaticDiscreteCell(var_name, self.ic)
+                            c = StaticDiscreteCell(var_name, self.ic, lazy = True)
                     var = var_name
                 else:                    
                     ##plot pair scatter
                     var1 = self._vars[row] 
                     var2 = self._vars[col] 
                     if self._mode == "i":
-                        c = InteractiveScatterCell([var1, var2], self.ic)
+                        c = InteractiveScatterCell([var1, var2], self.ic, lazy = True, raster_threshold = self._raster_threshold, contours_prefetch = self._contours_prefetch)
                     elif self._mode == "s":
-                        c = StaticScatterCell([var1, var2], self.ic)
+                        c = StaticScatterCell([var1, var2], self.ic, lazy = True)
                     var = var1+"_"+var2
                 self.cells[var] = c
                 ##Add to grid
@@ -59,6 +72,4 @@ class ScatterMatrixGrid(Grid):
                 #     if space not in self.spaces:
                 #         self.spaces.append(space)
                     if space in self.spaces or self.spaces == 'all':
-                        if space not in self._grids:
-                            self._grids[space] = pn.GridSpec(sizing_mode = 'stretch_both')
-                        self._grids[space][ start_point[0]:end_point[0], start_point[1]:end_point[1] ] = pn.Column(c.get_plot(space), width=220, height=220)
+                        self._add_cell_to_grid(c, space, start_point, end_point)
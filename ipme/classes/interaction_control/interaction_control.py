@@ -1,65 +1,123 @@
-from ...utils.functions import get_w2_w1_val_mapping
+from ...utils.functions import get_w2_w1_val_mapping, get_mask_hash
+from ...utils.stats import kde_batch
 
+from ...utils.cache import LRUCache, get_nbytes
+from ...utils.constants import SELECTION_NUM_WORKERS, SELECTION_DEBOUNCE_WINDOW, SELECTION_CACHE_MAX_BYTES, CONTOURS_CACHE_MAX_BYTES, \
+    COMBINED_PATCH_BOKEH_VERSIONS
+
+import bokeh
 from bokeh.models import ColumnDataSource
+from bokeh.document import without_document_lock
 
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import namedtuple, OrderedDict
+import asyncio
+from functools import partial
 import numpy as np
 import threading
 
+## An immutable snapshot of the interaction state. A new snapshot with an incremented
+## version replaces the previous one on each change; its Dicts and arrays are never mutated.
+ICState = namedtuple('ICState', ['version', 'sample_inds', 'sample_non_inds', 'sample_inds_hash', 'reconstructed', 'sel_var_masks', 'sel_var_rest_masks',
+                                 'sel_space', 'sel_var_idx_dims_values', 'sel_var_ranges', 'var_x_range', 'global_update',
+                                 'widgets_interactions', 'selection_interactions', 'selection_ranges'])
+
 class IC:
-    def __init__(self, data_obj):
+    def __init__(self, data_obj, asynchronous = False):
         """
             This class regulates the interaction control of the tool.
             Parameters:
             --------
                 data_obj                A Data object.
+                asynchronous            A Boolean: if True, the debounced callbacks of a served document are computed
+                                        in an executor, without the document lock, and their document changes are
+                                        applied together on the next tick of the document, in a single patch.
             Sets:
             --------
-            _sel_var_inds           A Dict {<space>: Dict {<var_name>: List of indices} }
+            _state                  An ICState of the current interaction state. It is read without locking
+                                    and replaced atomically (under _state_lock) by the setters:
+                sample_inds             A Dict {<space>: boolean numpy array of the selected samples}. It is only used
+                                        server-side, so it is not a ColumnDataSource (synced and validated per element).
+                sample_non_inds         A Dict {<space>: boolean numpy array of the non-selected samples}.
+                sample_inds_hash        A Dict {<space>: String of the content hash of sample_inds[<space>]}, so that the cells
+                                        can tell whether the selection mask changed since their last update.
+                reconstructed           A Dict {<space>: Dict {<var_name>: (samples, kde of the selected samples)}}, always
+                                        replaced together with sample_inds[<space>], so that a snapshot's kdes match its indices.
+                sel_var_masks           A Dict {<space>: Dict {<var_name>: boolean numpy array of the samples within the selection of <var_name>} }
+                sel_var_rest_masks      A Dict {<space>: Dict {<var_name>: intersection of the masks of all the other variables of <space>
+                                        (None if there is none)} }, invalidated whenever the mask of another variable changes.
+                sel_space               A String of the space of the latest selection.
+                sel_var_idx_dims_values A Dict {<var_name>: Dict {<dim>: <value>} of the indices of the latest selection of <var_name>}.
+                sel_var_ranges          A Dict {<var_name>: (xmin, xmax)} of the latest selection of each variable.
+                var_x_range             A Dict {(<space>,<var_name>): Dict {'xmin','xmax'} of numpy arrays of the selection range (empty if none)}.
+            _sample_inds_cds        A Dict {<space>: ColumnDataSource {'sel': uint8 numpy array of sample_inds[<space>]}} shared by
+                                    the CDSView filters of the cells, so that a selection sends one mask per space to the browser.
+            _subscribers            A Dict {<space>: List of the callbacks of the cells to call on each update of the sample indices of <space>}.
+            _selection_futures      A Dict {<space>: List of the futures of the callbacks dispatched and not yet waited for}.
+            _dispatcher             A ThreadPoolExecutor running the subscribed callbacks.
+            _debounce_timers        A Dict {<key>: threading.Timer of the pending debounced callback of <key>}.
+            _debounce_generations   A Dict {<key>: Int incremented on each debounced callback of <key>}.
+            _pending_changes        An OrderedDict {(<model id>,<property>): (model, property, value)} of the document changes
+                                    recorded by the asynchronous interaction being computed (None if there is none).
+            _interaction_lock       An asyncio.Lock running the asynchronous interactions one at a time: an interaction
+                                    is computed once the changes of the previous one are applied.
+            _state_lock             A threading.Lock guarding the replacement of _state and the registries _kde_cells
+                                    and _sample_inds_cds.
+            _sel_lock, _widget_lock, _space_lock, _subscribers_lock, _debounce_lock, _changes_lock
+                                    threading.Locks guarding respectively _selection_futures, _widget_threads,
+                                    _space_threads, _subscribers, the debounce Dicts and _pending_changes.
+                                    Lock order: _interaction_lock, then _space_lock (held while the space threads
+                                    run), then any one of the others. These are held only over their own state,
+                                    so no two of them are ever held together.
+            _kde_cells              A Dict {<space>: List of the cells whose reconstructed kde is computed by IC}.
+            _selection_cache        A LRUCache {(<var_name>,<space>,<idx_dims_values>,<sample_inds_hash>): Dict of the
+                                    selection-dependent cds data of a cell}, so that returning to a recent selection is not recomputed.
+            _contours_cache         A LRUCache {(<var_name1>,<var_name2>,<space>,<idx_dims_values>): Dict of the contours
+                                    of a scatter cell}, so that returning to a recent coordinate does not recompute the 2-D kde.
+            _prefetcher             A single-thread ThreadPoolExecutor warming the contours cache in the background.
             _w1_w2_idx_mapping      A Dict {<space>: Dict {<w_name1>:(w_name2,widgets_idx)}}.
             _w2_w1_idx_mapping      A Dict {<space>: Dict {<w_name2>:(w_name1,widgets_idx)}}.
             _w2_w1_val_mapping      A Dict {<space>: Dict {<w_name2>:{<w1_value>: A List of <w_name2> values for <w1_value>}}.
         """
         self.data = data_obj
-        self.num_cells = 0
-        self.widgets_interactions = 0
-        self.selection_interactions = 0
-        self.selection_ranges = []
+        self._asynchronous = asynchronous
+        self._subscribers = {}
+        self._selection_futures = {}
+        self._dispatcher = ThreadPoolExecutor(max_workers = SELECTION_NUM_WORKERS)
+        self._debounce_timers = {}
+        self._debounce_generations = {}
+        self._pending_changes = None
+        self._interaction_lock = None
         ##threads lists
-        self._selection_threads = {}
         self._space_threads = []
         self._widget_threads = []
         ##locks
+        self._state_lock = threading.Lock()
         self._sel_lock = threading.Lock()
         self._widget_lock = threading.Lock()
-        self._sample_inds_lock = threading.Lock()
-        self._sample_inds_update_lock = threading.Lock()
-        self._sel_var_inds_lock = threading.Lock()
-        self._sel_space_lock = threading.Lock()
-        self._sel_var_idx_dims_values_lock = threading.Lock()
-        self._var_x_range_lock = threading.Lock()
-        self._global_update_lock = threading.Lock()
         self._space_lock = threading.Lock()
-        self._w1_w2_idx_mapping_lock = threading.Lock()
-        self._w2_w1_idx_mapping_lock = threading.Lock()
-        self._w2_w1_val_mapping_lock = threading.Lock()
-        self._widgets_interactions_lock = threading.Lock()
-        self._selection_interactions_lock = threading.Lock()
+        self._subscribers_lock = threading.Lock()
+        self._debounce_lock = threading.Lock()
+        self._changes_lock = threading.Lock()
         ##events
-        self.sel_lock_event = threading.Event()
         self.widget_lock_event = threading.Event()
         ##idx_widgets
         self._w1_w2_idx_mapping = {}
         self._w2_w1_idx_mapping = {}
         self._w2_w1_val_mapping = {}
         ##Interaction-related variables
-        self.sample_inds = dict(prior = ColumnDataSource(data = dict(inds = [])), posterior = ColumnDataSource(data = dict(inds=[])))
-        self.sample_non_inds = dict(prior = ColumnDataSource(data = dict(non_inds = [])), posterior = ColumnDataSource(data = dict(non_inds=[])))
-        self.sample_inds_update = dict(prior = ColumnDataSource(data = dict(updated = [False])), posterior = ColumnDataSource(data = dict(updated = [False])))
-        self._sel_var_inds = {}
-        self._sel_space = ""
-        self.sel_var_idx_dims_values = {}
-        self.var_x_range = {}
-        self._global_update = False
+        self._kde_cells = {}
+        self._sample_inds_cds = {}
+        self._selection_cache = LRUCache(SELECTION_CACHE_MAX_BYTES, sizeof = get_nbytes)
+        self._contours_cache = LRUCache(CONTOURS_CACHE_MAX_BYTES, sizeof = get_nbytes)
+        self._prefetcher = ThreadPoolExecutor(max_workers = 1)
+        self._state = ICState(version = 0,
+                              sample_inds = dict(prior = np.zeros(0, dtype = bool), posterior = np.zeros(0, dtype = bool)),
+                              sample_non_inds = dict(prior = np.ones(0, dtype = bool), posterior = np.ones(0, dtype = bool)),
+                              sample_inds_hash = dict(prior = get_mask_hash(np.zeros(0, dtype = bool)), posterior = get_mask_hash(np.zeros(0, dtype = bool))),
+                              reconstructed = {}, sel_var_masks = {}, sel_var_rest_masks = {}, sel_space = "",
+                              sel_var_idx_dims_values = {}, sel_var_ranges = {}, var_x_range = {}, global_update = False,
+                              widgets_interactions = 0, selection_interactions = 0, selection_ranges = ())
 
     def idx_widgets_mapping(self, space, d_dim, w1_title, w2_title):
         if space in self._w1_w2_idx_mapping:
@@ -169,50 +227,285 @@ class IC:
         self._space_threads.clear()
         self._space_lock.release()
 
-    def selection_threads_join(self, space):
-        num_sel_threads = 0
-        while num_sel_threads < self.num_cells:
-            self.sel_lock_event.wait()
-            self.sel_lock_event.clear()
-            self._sel_lock.acquire()
-            if space in self._selection_threads:
-                num_sel_threads = len(self._selection_threads[space])
-            self._sel_lock.release()
+    def subscribe_sample_inds_update(self, space, callback):
+        """
+            Registers the <callback> of a cell to the updates of the sample indices of <space>.
+        """
+        self._subscribers_lock.acquire()
+        if space not in self._subscribers:
+            self._subscribers[space] = []
+        self._subscribers[space].append(callback)
+        self._subscribers_lock.release()
+
+    def _dispatch_sample_inds_update(self, space):
+        """
+            Submits the subscribed callbacks of <space> to the dispatcher's workers.
+            The callbacks of a previous update that have not started yet are cancelled:
+            they would read the new sample indices anyway.
+        """
+        self._subscribers_lock.acquire()
+        callbacks = list(self._subscribers.get(space, []))
+        self._subscribers_lock.release()
         self._sel_lock.acquire()
-        t_sel = self._selection_threads[space]
+        running = [future for future in self._selection_futures.get(space, []) if not future.cancel()]
+        self._selection_futures[space] = running + [self._dispatcher.submit(callback) for callback in callbacks]
         self._sel_lock.release()
-        for t in t_sel:
-            t.start()
-        for t in t_sel:
-            t.join()
+
+    def wait_sample_inds_update(self, space):
+        """
+            Waits until the callbacks dispatched for the updates of the sample indices of <space>
+            are completed. Raises the first exception raised by a callback.
+        """
         self._sel_lock.acquire()
-        del self._selection_threads[space]
+        futures = self._selection_futures.pop(space, [])
         self._sel_lock.release()
+        wait(futures)
+        for future in futures:
+            if not future.cancelled():
+                future.result()
 
-    def set_selection(self, var_name, space, x_range, cur_idx_dims_values):
+    def debounce(self, key, callback, doc = None):
         """
-            Sets user selection
+            Runs <callback> once no other callback has been debounced with the same <key>
+            (e.g. a variable name) for SELECTION_DEBOUNCE_WINDOW seconds: only the latest
+            callback of a burst runs. When <doc> is served by a Bokeh server, it runs on the
+            next tick of the document, holding its lock (in the asynchronous mode, see
+            _run_debounced_async()). Without a document (or without a window, in the
+            synchronous mode), it runs immediately.
         """
-        self._set_sel_space(space)
-        self.set_var_x_range(space, var_name, dict(xmin = np.asarray([x_range[0]]), xmax = np.asarray([x_range[1]])))
-        self._set_sel_var_idx_dims_values(var_name, dict(cur_idx_dims_values))
-        self.increase_selection_interactions(var_name, x_range)
-
-    def add_selection_threads(self, space, t):
-        self._sel_lock.acquire()
-        if space in self._selection_threads:
-            self._selection_threads[space].append(t)
+        self._debounce_lock.acquire()
+        generation = self._debounce_generations.get(key, 0) + 1
+        self._debounce_generations[key] = generation
+        if key in self._debounce_timers:
+            self._debounce_timers.pop(key).cancel()
+        timer = None
+        if doc is not None and (SELECTION_DEBOUNCE_WINDOW or self._asynchronous):
+            run = partial(self._run_debounced, key, generation, callback)
+            if doc.session_context is not None:
+                if self._asynchronous:
+                    run = without_document_lock(partial(self._run_debounced_async, key, generation, callback, doc))
+                timer = threading.Timer(SELECTION_DEBOUNCE_WINDOW, doc.add_next_tick_callback, args = (run,))
+            else:
+                timer = threading.Timer(SELECTION_DEBOUNCE_WINDOW, run)
+            timer.daemon = True
+            self._debounce_timers[key] = timer
+        self._debounce_lock.release()
+        if timer is not None:
+            timer.start()
         else:
-            self._selection_threads[space] = [t]
-        self._sel_lock.release()
+            callback()
 
-    def _get_selection_threads(self, space):
-        sel_t = []
-        self._sel_lock.acquire()
-        if space in self._selection_threads:
-            sel_t = self._selection_threads[space]
-        self._sel_lock.release()
-        return sel_t
+    def _run_debounced(self, key, generation, callback):
+        """
+            Runs <callback> unless another callback has been debounced with <key> since.
+        """
+        if self._is_latest_debounced(key, generation):
+            callback()
+
+    async def _run_debounced_async(self, key, generation, callback, doc):
+        """
+            Asynchronous mode of _run_debounced, run on the next tick of <doc> without its lock.
+            The interaction is split in two steps:
+                compute     <callback> runs in an executor, so that the event loop stays responsive.
+                            The selection masks, kdes/pmfs and contours are computed as usual, but the
+                            changes of the Bokeh models are recorded by set_model_properties().
+                apply       The recorded changes are set by _apply_changes() in a single next-tick
+                            callback of <doc>, which sends them to the browser in one patch.
+            The interactions run one at a time, so that each one is computed from the models
+            updated by the previous one.
+        """
+        if self._interaction_lock is None:
+            self._interaction_lock = asyncio.Lock()
+        async with self._interaction_lock:
+            if not self._is_latest_debounced(key, generation):
+                return
+            loop = asyncio.get_event_loop()
+            changes = await loop.run_in_executor(None, self._collect_changes, callback)
+            applied = loop.create_future()
+            doc.add_next_tick_callback(partial(self._apply_changes, doc, changes, applied))
+            await applied
+
+    def _collect_changes(self, callback):
+        """
+            Runs <callback> recording the changes of the Bokeh models instead of setting them.
+            Returns:
+            --------
+                A List of (model, property, value) in the order of their first change.
+        """
+        with self._changes_lock:
+            self._pending_changes = OrderedDict()
+        try:
+            callback()
+        finally:
+            with self._changes_lock:
+                changes = list(self._pending_changes.values())
+                self._pending_changes = None
+        return changes
+
+    def _apply_changes(self, doc, changes, applied):
+        """
+            Sets the <changes> of an asynchronous interaction on the next tick of <doc>, holding its lock.
+            The document holds and combines them until they are all set. The Future <applied> is
+            resolved once they are set.
+            With the Bokeh versions of COMBINED_PATCH_BOKEH_VERSIONS, they are sent to the browser in a
+            single PATCH-DOC message, instead of one message per change (see _get_patch_receiver()).
+        """
+        session, receiver = IC._get_patch_receiver(doc)
+        events = []
+        def collect(event):
+            events.append(event)
+        try:
+            doc.hold('combine')
+            try:
+                for model, name, value in changes:
+                    setattr(model, name, value)
+            finally:
+                if receiver is not None:
+                    ## the session sends a message per change event: its receiver is replaced by
+                    ## a collector of the events while the held changes are released
+                    del doc._callbacks[session]
+                    doc.on_change(collect)
+                doc.unhold()
+        finally:
+            if receiver is not None:
+                doc.remove_on_change(collect)
+                doc._callbacks[session] = receiver
+            applied.set_result(None)
+        if len(events):
+            IC._send_patch(session, events)
+
+    @staticmethod
+    def _get_patch_receiver(doc):
+        """
+            Returns the server session of <doc> and its receiver of the document change events, used to send
+            the changes of an interaction in one message. They rely on private attributes of the Bokeh server
+            session, so they are only used with the versions of COMBINED_PATCH_BOKEH_VERSIONS and if all
+            these attributes are found.
+            Returns:
+            --------
+                A Tuple (session, receiver), (None, None) if the changes are sent by the session itself.
+        """
+        if not bokeh.__version__.startswith(COMBINED_PATCH_BOKEH_VERSIONS):
+            return (None, None)
+        if doc.session_context is None:
+            return (None, None)
+        session = getattr(doc.session_context, 'session', None)
+        receivers = getattr(doc, '_callbacks', None)
+        if session is None or not isinstance(receivers, dict) or session not in receivers:
+            return (None, None)
+        connections = getattr(session, '_subscribed_connections', None)
+        if connections is None or not isinstance(getattr(session, '_pending_writes', None), list):
+            return (None, None)
+        for connection in connections:
+            if not hasattr(connection, 'protocol') or not hasattr(getattr(connection, '_socket', None), 'send_message'):
+                return (None, None)
+        return (session, receivers[session])
+
+    @staticmethod
+    def _send_patch(session, events):
+        """
+            Sends the document change <events> to all the connections of the server <session> in one PATCH-DOC message.
+        """
+        for connection in session._subscribed_connections:
+            message = connection.protocol.create('PATCH-DOC', events)
+            session._pending_writes.append(connection._socket.send_message(message))
+
+    def set_model_properties(self, model, **properties):
+        """
+            Sets the <properties> of the Bokeh <model> (e.g. the data of a cds, an attribute of a glyph).
+            While an asynchronous interaction is computed, they are recorded instead and set
+            together with the other changes of the interaction by _apply_changes().
+        """
+        with self._changes_lock:
+            if self._pending_changes is not None:
+                for name, value in properties.items():
+                    self._pending_changes[(model.id, name)] = (model, name, value)
+                return
+        for name, value in properties.items():
+            setattr(model, name, value)
+
+    def get_model_property(self, model, name):
+        """
+            Returns the property <name> of the Bokeh <model>, as changed by the asynchronous
+            interaction being computed, if it was, so that its later steps read their own changes.
+        """
+        with self._changes_lock:
+            if self._pending_changes is not None and (model.id, name) in self._pending_changes:
+                return self._pending_changes[(model.id, name)][2]
+        return getattr(model, name)
+
+    def _is_latest_debounced(self, key, generation):
+        self._debounce_lock.acquire()
+        is_latest = self._debounce_generations.get(key) == generation
+        if is_latest:
+            self._debounce_timers.pop(key, None)
+        self._debounce_lock.release()
+        return is_latest
+
+    def get_state(self):
+        """
+            Returns the current ICState. It is immutable, so that it can be read consistently without locking.
+        """
+        return self._state
+
+    def _update_state(self, update):
+        """
+            Replaces atomically the state by a copy with the fields of the Dict returned by <update>(<current state>)
+            and an incremented version. The state is not replaced if <update> returns None.
+            Returns:
+            --------
+                A Boolean: True if the state was replaced.
+        """
+        self._state_lock.acquire()
+        try:
+            changes = update(self._state)
+            if changes is not None:
+                self._state = self._state._replace(version = self._state.version + 1, **changes)
+        finally:
+            self._state_lock.release()
+        return changes is not None
+
+    @staticmethod
+    def _assoc(dictionary, key, value):
+        """
+            Returns a copy of <dictionary> where <key> is set to <value>.
+        """
+        new_dictionary = dict(dictionary)
+        new_dictionary[key] = value
+        return new_dictionary
+
+    @staticmethod
+    def _dissoc(dictionary, key):
+        """
+            Returns a copy of <dictionary> without <key>.
+        """
+        new_dictionary = dict(dictionary)
+        new_dictionary.pop(key, None)
+        return new_dictionary
+
+    def set_selection(self, var_name, space, x_range, cur_idx_dims_values):
+        """
+            Sets user selection
+        """
+        def update(state):
+            changes = dict(sel_space = space,
+                           sel_var_idx_dims_values = IC._assoc(state.sel_var_idx_dims_values, var_name, dict(cur_idx_dims_values)),
+                           sel_var_ranges = IC._assoc(state.sel_var_ranges, var_name, (x_range[0], x_range[1])),
+                           selection_interactions = state.selection_interactions + 1,
+                           selection_ranges = state.selection_ranges + ((state.selection_interactions, var_name, x_range[0], x_range[1]),))
+            if (space, var_name) in state.var_x_range:
+                changes['var_x_range'] = IC._assoc(state.var_x_range, (space, var_name), dict(xmin = np.asarray([x_range[0]]), xmax = np.asarray([x_range[1]])))
+            return changes
+        self._update_state(update)
+
+    def reset_selection(self):
+        """
+            Resets the selections of all the variables and sets the global update flag, in a single state change.
+        """
+        self._update_state(lambda state: dict(sel_var_masks = {}, sel_var_rest_masks = {}, sel_space = "",
+                                              sel_var_idx_dims_values = {}, sel_var_ranges = {},
+                                              var_x_range = {key: dict(xmin = np.array([]), xmax = np.array([])) for key in state.var_x_range},
+                                              global_update = True))
 
     def add_space_threads(self, t):
         self._space_lock.acquire()
@@ -227,225 +520,340 @@ class IC:
         return sp_t
 
     def get_w1_w2_idx_mapping(self):
-        w1_w2_idx_mapping = {}
-        self._w1_w2_idx_mapping_lock.acquire()
-        w1_w2_idx_mapping = self._w1_w2_idx_mapping
-        self._w1_w2_idx_mapping_lock.release()
-        return w1_w2_idx_mapping
+        return self._w1_w2_idx_mapping
 
     def get_w2_w1_idx_mapping(self):
-        w2_w1_idx_mapping = {}
-        self._w2_w1_idx_mapping_lock.acquire()
-        w2_w1_idx_mapping = self._w2_w1_idx_mapping
-        self._w2_w1_idx_mapping_lock.release()
-        return w2_w1_idx_mapping
+        return self._w2_w1_idx_mapping
 
     def get_w2_w1_val_mapping(self):
-        w2_w1_val_mapping = {}
-        self._w2_w1_val_mapping_lock.acquire()
-        w2_w1_val_mapping = self._w2_w1_val_mapping
-        self._w2_w1_val_mapping_lock.release()
-        return w2_w1_val_mapping
+        return self._w2_w1_val_mapping
 
     def add_widget_threads(self, t):
         self._widget_lock.acquire()
         self._widget_threads.append(t)
         self._widget_lock.release()
 
-    def initialize_sample_inds(self, space, inds_dict, non_inds_dict):
-        self._sample_inds_lock.acquire()
-        if space in self.sample_inds:
-            self.sample_inds[space].data = inds_dict
-        if space in self.sample_non_inds:
-            self.sample_non_inds[space].data = non_inds_dict
-        self._sample_inds_lock.release()
-
-    def set_sample_inds(self, space, inds_dict, non_inds_dict):
-        self._sample_inds_lock.acquire()
-        if space in self.sample_inds:
-            self.sample_inds[space].data = inds_dict
-        if space in self.sample_non_inds:
-            self.sample_non_inds[space].data = non_inds_dict
-        self._sample_inds_lock.release()
-        isup = self._get_sample_inds_update(space)
-        self._set_sample_inds_update(space, dict(updated = [not isup]))
+    def initialize_sample_inds(self, space, num_samples):
+        """
+            Initializes the sample indices of <space> to no selection of <num_samples> samples.
+        """
+        def update(state):
+            if space not in state.sample_inds:
+                return None
+            inds = np.zeros(num_samples, dtype = bool)
+            return dict(sample_inds = IC._assoc(state.sample_inds, space, inds),
+                        sample_non_inds = IC._assoc(state.sample_non_inds, space, ~inds),
+                        sample_inds_hash = IC._assoc(state.sample_inds_hash, space, get_mask_hash(inds)),
+                        reconstructed = IC._assoc(state.reconstructed, space, {}))
+        if self._update_state(update):
+            self._update_sample_inds_cds(space)
+
+    def set_sample_inds(self, space, inds):
+        """
+            Sets the sample indices of <space> to the boolean numpy array <inds>
+            and notifies the subscribed cells.
+        """
+        inds_hash = get_mask_hash(inds)
+        reconstructed = self._compute_reconstructed(space, inds, inds_hash)
+        def update(state):
+            if space not in state.sample_inds:
+                return None
+            return dict(sample_inds = IC._assoc(state.sample_inds, space, inds),
+                        sample_non_inds = IC._assoc(state.sample_non_inds, space, ~inds),
+                        sample_inds_hash = IC._assoc(state.sample_inds_hash, space, inds_hash),
+                        reconstructed = IC._assoc(state.reconstructed, space, reconstructed))
+        if self._update_state(update):
+            self._update_sample_inds_cds(space)
+        self._dispatch_sample_inds_update(space)
 
     def reset_sample_inds(self, space):
-        self._sample_inds_lock.acquire()
-        inds = self.sample_inds[space].data['inds']
-        self.sample_inds[space].data = dict(inds = [False]*len(inds))
-        self.sample_non_inds[space].data = dict(non_inds = [True]*len(inds))
-        self._sample_inds_lock.release()
-        isup = self._get_sample_inds_update(space)
-        self._set_sample_inds_update(space, dict(updated = [not isup]))
+        inds, _ = self.get_sample_inds(space)
+        self.set_sample_inds(space, np.zeros(len(inds), dtype = bool))
+
+    def compute_intersection_of_samples(self, space, var_name = None):
+        """
+            Computes the sample indices of <space> as the intersection (logical and)
+            of the selection masks of all the variables of <space> and notifies
+            the subscribed cells. It is computed once per space.
+            When <var_name> is the variable whose selection changed last, the intersection is
+            a single logical and of its mask with the cached intersection of all the other masks.
+            The intersection is computed from a snapshot of the state without locking and it is
+            recomputed if the masks or the sample indices of <space> changed in the meantime.
+            The reconstructed kdes are reused when the sample indices are unchanged.
+        """
+        while True:
+            state = self._state
+            masks = state.sel_var_masks.get(space, {})
+            rest_masks = dict(state.sel_var_rest_masks.get(space, {}))
+            if not len(masks):
+                inds = np.zeros(len(state.sample_inds[space]), dtype = bool)
+            elif var_name is None:
+                inds = IC._intersect_masks(list(masks.values()))
+            else:
+                if var_name not in rest_masks:
+                    rest_masks[var_name] = IC._intersect_masks([mask for var, mask in masks.items() if var != var_name])
+                rest_mask = rest_masks[var_name]
+                if var_name not in masks:
+                    inds = rest_mask.copy()
+                elif rest_mask is None:
+                    inds = masks[var_name].copy()
+                else:
+                    inds = np.logical_and(rest_mask, masks[var_name])
+            inds_hash = get_mask_hash(inds)
+            if inds_hash == state.sample_inds_hash[space] and space in state.reconstructed:
+                reconstructed = state.reconstructed[space]
+            else:
+                reconstructed = self._compute_reconstructed(space, inds, inds_hash)
+            def update(cur_state):
+                if cur_state.sel_var_masks.get(space) is not state.sel_var_masks.get(space) or \
+                    cur_state.sample_inds[space] is not state.sample_inds[space]:
+                    return None
+                return dict(sel_var_rest_masks = IC._assoc(cur_state.sel_var_rest_masks, space, rest_masks),
+                            sample_inds = IC._assoc(cur_state.sample_inds, space, inds),
+                            sample_non_inds = IC._assoc(cur_state.sample_non_inds, space, ~inds),
+                            sample_inds_hash = IC._assoc(cur_state.sample_inds_hash, space, inds_hash),
+                            reconstructed = IC._assoc(cur_state.reconstructed, space, reconstructed))
+            if self._update_state(update):
+                break
+        self._update_sample_inds_cds(space)
+        self._dispatch_sample_inds_update(space)
+
+    @staticmethod
+    def _intersect_masks(masks):
+        """
+            Returns the logical and of the List of boolean numpy arrays <masks> (None if empty).
+        """
+        if not len(masks):
+            return None
+        inds = masks[0].copy()
+        for mask in masks[1:]:
+            np.logical_and(inds, mask, out = inds)
+        return inds
+
+    def register_kde_cell(self, space, cell):
+        """
+            Registers a continuous cell whose reconstructed kde in <space> is computed
+            by IC together with the other registered cells on each update of the sample indices.
+        """
+        self._state_lock.acquire()
+        if space not in self._kde_cells:
+            self._kde_cells[space] = []
+        self._kde_cells[space].append(cell)
+        self._state_lock.release()
+
+    def _compute_reconstructed(self, space, inds, inds_hash):
+        """
+            Computes the kde of the samples selected by <inds> of all the registered cells
+            of <space> with a single kde_batch() call. The kdes memoised in the selection cache
+            for <inds_hash> are not recomputed.
+            Returns:
+            --------
+                A Dict {<var_name>: (samples, kde of the selected samples)}.
+        """
+        self._state_lock.acquire()
+        cells = list(self._kde_cells.get(space, []))
+        self._state_lock.release()
+        names = []
+        samples_list = []
+        reconstructed = {}
+        for cell in cells:
+            samples = cell.samples[space].data['x']
+            if isinstance(samples, np.ndarray) and samples.ndim == 1 and samples.shape[0] == inds.shape[0]:
+                cached = self._selection_cache.get(cell.get_selection_key(space, inds_hash))
+                if cached is not None:
+                    reconstructed[cell.name] = (samples, cached['reconstructed'])
+                    continue
+                names.append(cell.name)
+                samples_list.append(samples)
+        if len(samples_list):
+            block = np.empty((np.count_nonzero(inds), len(samples_list)), order = 'F')
+            for i, samples in enumerate(samples_list):
+                block[:, i] = samples[inds]
+            for name, samples, density in zip(names, samples_list, kde_batch(block)):
+                reconstructed[name] = (samples, density)
+        return reconstructed
+
+    def get_reconstructed_kde(self, space, var_name, samples, state = None):
+        """
+            Returns the kde of the selected <samples> of <var_name> in <space> computed with the
+            sample indices of the ICState <state> (the current state by default), or None if it
+            was computed from other samples (e.g. the cell's samples changed since).
+            A cell passes the snapshot its sample indices were read from, so that the kde
+            matches them even if the sample indices were updated in the meantime.
+        """
+        if state is None:
+            state = self._state
+        reconstructed = state.reconstructed
+        if space in reconstructed and var_name in reconstructed[space]:
+            rec_samples, rec_density = reconstructed[space][var_name]
+            if rec_samples is samples:
+                return rec_density
+        return None
 
     def get_sample_inds(self, space = None):
-        inds = []
+        state = self._state
         non_inds = []
-        self._sample_inds_lock.acquire()
-        if space in self.sample_inds and space in self.sample_non_inds:
-            inds = self.sample_inds[space].data['inds']
-            non_inds = self.sample_non_inds[space].data['non_inds']
+        if space in state.sample_inds and space in state.sample_non_inds:
+            inds = state.sample_inds[space]
+            non_inds = state.sample_non_inds[space]
         else:
-            inds = self.sample_inds
-        self._sample_inds_lock.release()
+            inds = state.sample_inds
         return inds, non_inds
 
-    def _set_sample_inds_update(self, space, dict_data):
-        self._sample_inds_update_lock.acquire()
-        if space in self.sample_inds_update:
-            self.sample_inds_update[space].data = dict_data
-        self._sample_inds_update_lock.release()
-
-    def _get_sample_inds_update(self, space=None):
-        isUpdated = False
-        self._sample_inds_update_lock.acquire()
-        if space in self.sample_inds_update:
-            isUpdated = self.sample_inds_update[space].data['updated'][0]
-        else:
-            isUpdated = self.sample_inds_update
-        self._sample_inds_update_lock.release()
-        return isUpdated
-
-    def set_sel_var_inds(self, space, var_name, inds):
-        self._sel_var_inds_lock.acquire()
-        if space not in self._sel_var_inds:
-            self._sel_var_inds[space] = {}        
-        self._sel_var_inds[space][var_name] = inds
-        self._sel_var_inds_lock.release()
-
-    def reset_sel_var_inds(self):
-        self._sel_var_inds_lock.acquire()
-        self._sel_var_inds = {}
-        self._sel_var_inds_lock.release()
-
-    def get_sel_var_inds(self, space = None, var_name = None):
-        inds = []
-        self._sel_var_inds_lock.acquire()
-        if space in self._sel_var_inds:
-            inds =  self._sel_var_inds[space]
-            if var_name in self._sel_var_inds[space]:
-                inds = inds[var_name]
+    def get_selection_data(self, key, compute):
+        """
+            Returns the selection-dependent cds data of a cell memoised for <key>
+            = (<var_name>, <space>, <idx_dims_values>, <sample_inds_hash>). If it is not
+            memoised, it is computed once by <compute>() and memoised.
+        """
+        return self._selection_cache.get_or_compute(key, compute)
+
+    def get_contours_data(self, key, compute):
+        """
+            Returns the contours of a scatter cell cached for <key>
+            = (<var_name1>, <var_name2>, <space>, <idx_dims_values>). If they are not
+            cached, they are computed once by <compute>() and cached.
+        """
+        return self._contours_cache.get_or_compute(key, compute)
+
+    def prefetch_contours_data(self, key, compute):
+        """
+            Computes the contours of <key> by <compute>() in the background, if they are not cached.
+            A later get_contours_data() of <key> waits for this computation instead of repeating it.
+        """
+        if key not in self._contours_cache:
+            self._prefetcher.submit(self._contours_cache.get_or_compute, key, compute)
+
+    def _update_sample_inds_cds(self, space):
+        """
+            Sets the shared selection cds of <space> to the current sample indices of <space>.
+        """
+        inds = self._state.sample_inds[space]
+        self._state_lock.acquire()
+        if space not in self._sample_inds_cds:
+            self._sample_inds_cds[space] = ColumnDataSource(data = dict(sel = inds.view(np.uint8)))
+            cds = None
         else:
-            inds =  self._sel_var_inds
-        self._sel_var_inds_lock.release()
-        return inds
+            cds = self._sample_inds_cds[space]
+        self._state_lock.release()
+        if cds is not None:
+            self.set_model_properties(cds, data = dict(sel = inds.view(np.uint8)))
 
-    def delete_sel_var_inds(self, space, var_name):
-        self._sel_var_inds_lock.acquire()
-        if space in self._sel_var_inds and var_name in self._sel_var_inds[space]:
-            del self._sel_var_inds[space][var_name]
-        self._sel_var_inds_lock.release()
+    def get_sample_inds_cds(self, space):
+        """
+            Returns the selection cds of <space>: its 'sel' column is 1 for the selected samples and 0 otherwise.
+        """
+        return self._sample_inds_cds.get(space)
+
+    def get_sample_inds_hash(self, space):
+        """
+            Returns the content hash of the sample indices of <space>.
+        """
+        return self._state.sample_inds_hash.get(space)
 
-    def _set_sel_space(self, space):
-        self._sel_space_lock.acquire()
-        self._sel_space = space
-        self._sel_space_lock.release()
+    def set_sel_var_mask(self, space, var_name, mask):
+        """
+            Sets the boolean numpy array of the samples of <space> within the selection of <var_name>.
+        """
+        self._update_state(lambda state: dict(sel_var_masks = IC._assoc(state.sel_var_masks, space, IC._assoc(state.sel_var_masks.get(space, {}), var_name, mask)),
+                                              sel_var_rest_masks = IC._invalidate_rest_masks(state, space, var_name)))
+
+    def reset_sel_var_masks(self):
+        self._update_state(lambda state: dict(sel_var_masks = {}, sel_var_rest_masks = {}))
+
+    def get_sel_var_masks(self, space = None, var_name = None):
+        sel_var_masks = self._state.sel_var_masks
+        if space in sel_var_masks:
+            masks = sel_var_masks[space]
+            if var_name in masks:
+                masks = masks[var_name]
+        else:
+            masks = sel_var_masks
+        return masks
+
+    def delete_sel_var_mask(self, space, var_name):
+        def update(state):
+            if var_name not in state.sel_var_masks.get(space, {}):
+                return None
+            return dict(sel_var_masks = IC._assoc(state.sel_var_masks, space, IC._dissoc(state.sel_var_masks[space], var_name)),
+                        sel_var_rest_masks = IC._invalidate_rest_masks(state, space, var_name))
+        self._update_state(update)
+
+    @staticmethod
+    def _invalidate_rest_masks(state, space, var_name):
+        """
+            Returns a copy of the cached intersections of <state> without those that include the mask of <var_name>,
+            i.e. those of all the other variables of <space>.
+        """
+        rest_masks = state.sel_var_rest_masks.get(space, {})
+        return IC._assoc(state.sel_var_rest_masks, space, {var_name: rest_masks[var_name]} if var_name in rest_masks else {})
 
     def reset_sel_space(self):
-        self._sel_space_lock.acquire()
-        self._sel_space = ""
-        self._sel_space_lock.release()
+        self._update_state(lambda state: dict(sel_space = ""))
 
     def get_sel_space(self):
-        sel_space = ""
-        self._sel_space_lock.acquire()
-        sel_space = self._sel_space
-        self._sel_space_lock.release()
-        return sel_space
-
-    def _set_sel_var_idx_dims_values(self, var_name, dict_data):
-        self._sel_var_idx_dims_values_lock.acquire()
-        self.sel_var_idx_dims_values[var_name] = dict_data
-        self._sel_var_idx_dims_values_lock.release()
+        return self._state.sel_space
 
     def reset_sel_var_idx_dims_values(self):
-        self._sel_var_idx_dims_values_lock.acquire()
-        self.sel_var_idx_dims_values = {}
-        self._sel_var_idx_dims_values_lock.release()
+        self._update_state(lambda state: dict(sel_var_idx_dims_values = {}))
 
     def get_sel_var_idx_dims_values(self, var_name=None):
-        idx_v = {}
-        self._sel_var_idx_dims_values_lock.acquire()
-        if var_name in self.sel_var_idx_dims_values:
-            idx_v = self.sel_var_idx_dims_values[var_name]
-        else:
-            idx_v = self.sel_var_idx_dims_values
-        self._sel_var_idx_dims_values_lock.release()
-        return idx_v
+        sel_var_idx_dims_values = self._state.sel_var_idx_dims_values
+        if var_name in sel_var_idx_dims_values:
+            return sel_var_idx_dims_values[var_name]
+        return sel_var_idx_dims_values
 
     def delete_sel_var_idx_dims_values(self, var_name):
-        self._sel_var_idx_dims_values_lock.acquire()
-        if var_name in self.sel_var_idx_dims_values:
-            del self.sel_var_idx_dims_values[var_name]
-        self._sel_var_idx_dims_values_lock.release()
+        self._update_state(lambda state: dict(sel_var_idx_dims_values = IC._dissoc(state.sel_var_idx_dims_values, var_name)))
+
+    def reset_sel_var_ranges(self):
+        self._update_state(lambda state: dict(sel_var_ranges = {}))
+
+    def get_sel_var_ranges(self):
+        return self._state.sel_var_ranges
+
+    def delete_sel_var_range(self, var_name):
+        self._update_state(lambda state: dict(sel_var_ranges = IC._dissoc(state.sel_var_ranges, var_name)))
+
+    def initialize_var_x_range(self, space, var_name):
+        """
+            Registers the selection range of <var_name> in <space>, initially empty.
+        """
+        self._update_state(lambda state: dict(var_x_range = IC._assoc(state.var_x_range, (space, var_name), dict(xmin = np.array([]), xmax = np.array([])))))
 
     def set_var_x_range(self, space, var_name, dict_data):
-        self._var_x_range_lock.acquire()
-        if (space,var_name) in self.var_x_range:
-            self.var_x_range[(space, var_name)].data = dict_data
-        self._var_x_range_lock.release()
+        def update(state):
+            if (space, var_name) not in state.var_x_range:
+                return None
+            return dict(var_x_range = IC._assoc(state.var_x_range, (space, var_name), dict_data))
+        self._update_state(update)
 
     def reset_var_x_range(self):
-        self._var_x_range_lock.acquire()
-        for sp, var in self.var_x_range:
-            self.var_x_range[(sp, var)].data = dict(xmin=[], xmax=[])
-        self._var_x_range_lock.release()
+        self._update_state(lambda state: dict(var_x_range = {key: dict(xmin = np.array([]), xmax = np.array([])) for key in state.var_x_range}))
 
     def get_var_x_range(self, space=None, var_name=None):
-        x_range = {}
-        self._var_x_range_lock.acquire()
-        if (space,var_name) in self.var_x_range:
-            x_range = self.var_x_range[(space, var_name)].data
-        else:
-            x_range = self.var_x_range
-        self._var_x_range_lock.release()
-        return x_range
+        var_x_range = self._state.var_x_range
+        if (space,var_name) in var_x_range:
+            return var_x_range[(space, var_name)]
+        return var_x_range
 
     def set_global_update(self, global_update):
-        self._global_update_lock.acquire()
-        self._global_update = global_update
-        self._global_update_lock.release()
+        self._update_state(lambda state: dict(global_update = global_update))
 
     def get_global_update(self):
-        global_update = False
-        self._global_update_lock.acquire()
-        global_update = self._global_update
-        self._global_update_lock.release()
-        return global_update
+        return self._state.global_update
 
     def increase_widgets_interactions(self):
-        self._widgets_interactions_lock.acquire()
-        self.widgets_interactions = self.widgets_interactions + 1
-        self._widgets_interactions_lock.release()
+        self._update_state(lambda state: dict(widgets_interactions = state.widgets_interactions + 1))
 
     def decrease_widgets_interactions(self):
-        self._widgets_interactions_lock.acquire()
-        self.widgets_interactions = self.widgets_interactions - 1
-        self._widgets_interactions_lock.release()
+        self._update_state(lambda state: dict(widgets_interactions = state.widgets_interactions - 1))
 
     def get_widgets_interactions(self):
-        w_inters = -1
-        self._widgets_interactions_lock.acquire()
-        w_inters = self.widgets_interactions
-        self._widgets_interactions_lock.release()
-        return w_inters
-
-    def increase_selection_interactions(self, var_name, x_range):
-        self._selection_interactions_lock.acquire()
-        self.selection_ranges.append((self.selection_interactions,var_name,x_range[0],x_range[1]))
-        self.selection_interactions = self.selection_interactions + 1
-        self._selection_interactions_lock.release()
+        return self._state.widgets_interactions
 
     def get_selection_interactions(self):
-        s_inters = -1
-        self._selection_interactions_lock.acquire()
-        s_inters = self.selection_interactions
-        self._selection_interactions_lock.release()
-        return s_inters
+        return self._state.selection_interactions
 
     def get_selection_ranges(self):
-        self._selection_interactions_lock.acquire()
-        s_ranges = self.selection_ranges
-        self._selection_interactions_lock.release()
-        return s_ranges
+        return list(self._state.selection_ranges)
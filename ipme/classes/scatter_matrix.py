@@ -1,11 +1,14 @@
 from .data.data import Data
+from .data.mmap_data import MmapData
 from .grid.scatter_matrix_grid import ScatterMatrixGrid
 from .interaction_control.interaction_control import IC
+from ..utils.constants import RASTER_THRESHOLD, CONTOURS_PREFETCH
 
 import panel as pn
+from functools import partial
 
 class ScatterMatrix():
-    def __init__(self, data_path, mode = "i", vars = [], spaces = 'all'):
+    def __init__(self, data_path, mode = "i", vars = [], spaces = 'all', memory_map = False, lazy = False, asynchronous = False, raster_threshold = RASTER_THRESHOLD, contours_prefetch = CONTOURS_PREFETCH):
         """
             Parameters:
             --------
@@ -14,17 +17,33 @@ class ScatterMatrix():
                                         (interactive or static).
                 vars                    A List of model variables to be included in the plot.
                 spaces                  A List of spaces to be included in graph
+                memory_map              A Boolean: if True, the inference data is converted once into
+                                        an uncompressed store of .npy files that are memory-mapped.
+                lazy                    A Boolean: if True, the cells of a space are built when its tab
+                                        is first opened instead of all at start-up.
+                asynchronous            A Boolean: if True (and served by a Bokeh server), the updates of a selection
+                                        are computed in an executor and their document changes are sent together.
+                raster_threshold        An Int of the number of draws above which the scatter cells draw
+                                        their samples as an image of fixed size (None: never).
+                contours_prefetch       A Boolean: if True, the contours of the previous and next values of the
+                                        index dimensions widgets are computed in the background after a change.
             Sets:
             --------
                 _mode                   A String in {"i","s"}, "i":interactive, "s":static.
                 _scatter_matrix         A Panel component object to visualize model's scatter matrix.
         """
-        self.ic = IC(Data(data_path))
+        if memory_map:
+            self.ic = IC(MmapData(data_path), asynchronous)
+        else:
+            self.ic = IC(Data(data_path), asynchronous)
         if mode not in ["s","i"]:
             raise ValueError("ValueError: mode should take a value in {'i','s'}")
         self._mode = mode
         self._vars = vars
         self._spaces = spaces
+        self._lazy = lazy
+        self._raster_threshold = raster_threshold
+        self._contours_prefetch = contours_prefetch
         self._scatter_matrix_grid = self._create_scatter_matrix_grid()
         self._scatter_matrix = self._create_scatter_matrix()
 
@@ -34,7 +53,7 @@ class ScatterMatrix():
             collection of Panel grids (one per space) and a
             collection of plotted widges.
         """
-        return ScatterMatrixGrid(self.ic, self._mode, self._vars, self._spaces)
+        return ScatterMatrixGrid(self.ic, self._mode, self._vars, self._spaces, self._lazy, self._raster_threshold, self._contours_prefetch)
 
     def _create_scatter_matrix(self):
         """
@@ -44,7 +63,9 @@ class ScatterMatrix():
         ## Tabs for prior-posterior scatter matrix
         g_grids = self._scatter_matrix_grid.get_grids()
         g_plotted_widgets = self._scatter_matrix_grid.get_plotted_widgets()
+        tab_spaces = []
         for space in g_grids:
+            tab_spaces.append(space)
             g_col = pn.Column(g_grids[space])
             if space in g_plotted_widgets:
                 widgetBox = pn.WidgetBox(*list(g_plotted_widgets[space].values()),sizing_mode = 'scale_both')
@@ -52,8 +73,18 @@ class ScatterMatrix():
                 tabs.append((space, pn.Row(w_col, g_col)))#, height_policy='max', max_height=800
             else:
                 tabs.append((space, pn.Row(g_col)))
+        if self._lazy and len(tab_spaces):
+            self._scatter_matrix_grid.initialize_space(tab_spaces[0])
+            tabs.param.watch(partial(self._tab_callback, tab_spaces), 'active')
         return tabs
 
+    def _tab_callback(self, tab_spaces, event):
+        """
+            Builds the cells of a space the first time its tab is opened (lazy mode).
+        """
+        if event.new < len(tab_spaces):
+            self._scatter_matrix_grid.initialize_space(tab_spaces[event.new])
+
     def set_coordinates(self, dim, options, value):
         self.ic.set_coordinates(self._scatter_matrix_grid, dim, options, value)
 
@@ -4,13 +4,15 @@ from ipme.classes.cell.utils.cell_widgets import CellWidgets
 from bokeh.io.export import get_screenshot_as_png
 
 class Cell(ABC):
-    def __init__(self, vars, control):
+    def __init__(self, vars, control, lazy = False):
         """
             Each cell will occupy a certain number of grid columns and will lie on a certain grid row.
             Parameters:
             --------
                 vars                    A List of variableNames of the model.
                 control                 An IC object
+                lazy                    A Boolean: if True, the data and figures of the cell are not built
+                                        until initialize_space() is called for each space.
             Sets:
             --------
                 vars
@@ -21,6 +23,10 @@ class Cell(ABC):
 
                 plot                   A Dict {<space>: (bokeh) plot object}.
                 widgets                A Dict {<space>: {<widget_title>: A (bokeh) widget object} }.
+                _initialized_spaces    A List of the spaces whose data and figure have been built.
+                _rendered_versions     A Dict {<space>: version of the IC state of the last update of the cds of <space>}.
+                _rendered_masks        A Dict {<space>: (hash of the sample indices, cur_idx_dims_values) of the last update
+                                       of the selection-dependent cds of <space>}.
         """
         self.vars = vars
         self.ic = control
@@ -33,8 +39,12 @@ class Cell(ABC):
 
         self.plot = {}
         self.widgets = {}
+        self._initialized_spaces = []
+        self._rendered_versions = {}
+        self._rendered_masks = {}
         self._initialize_widgets()
-        self._initialize_plot()
+        if not lazy:
+            self._initialize_plot()
 
     def _define_spaces(self):
         data_spaces = self._data.get_spaces()
@@ -52,8 +62,24 @@ class Cell(ABC):
     def widget_callback(self, attr, old, new, w_title, space):
         pass
 
-    @abstractmethod
     def _initialize_plot(self):
+        for space in self.spaces:
+            self.initialize_space(space)
+
+    def initialize_space(self, space):
+        """
+            Builds the data and the figure of <space> once.
+        """
+        if space in self._initialized_spaces:
+            return
+        self._initialize_space(space)
+        self._initialized_spaces.append(space)
+
+    def is_initialized(self, space):
+        return space in self._initialized_spaces
+
+    @abstractmethod
+    def _initialize_space(self, space):
         pass
 
     ## GETTERS
@@ -86,3 +112,28 @@ class Cell(ABC):
 
     def get_spaces(self):
         return self.spaces
+
+    ## UPDATE
+    def sample_inds_callback(self, space):
+        """
+            Updates cds when indices of selected samples -- IC.sample_inds --
+            are updated. It runs on a worker of the IC dispatcher. The update is skipped
+            if the cds of <space> were already updated for the current version of the IC state.
+        """
+        version = self.ic.get_state().version
+        if self._rendered_versions.get(space) == version:
+            return
+        self._rendered_versions[space] = version
+        self.update_cds(space)
+
+    def mask_unchanged(self, space):
+        """
+            Returns True if the selection-dependent cds of <space> were last updated for the same
+            sample indices (compared by content hash) and the same indices of the cell's variables.
+            Otherwise, records them as the ones of the update that follows and returns False.
+        """
+        key = (self.ic.get_sample_inds_hash(space), {var: dict(values) for var, values in self.cur_idx_dims_values.items()})
+        if self._rendered_masks.get(space) == key:
+            return True
+        self._rendered_masks[space] = key
+        return False
@@ -10,6 +10,8 @@ class Data_Interface(ABC):
             Sets:
             --------
                 _inferencedata      A structure of the inference data.
+                _header             A Dict of the inference data header parsed once at load time.
+                _arrays_index       A Dict {<space>:{<var_name>:ArrayMetadata obj}}.
                 _graph              A structure of the  model's variables graph data.
                 _observed_variables A List of Strings of the observed variables.
                 _idx_dimensions     A Dict {<var_name>:{<dim_name>:Dimension obj}}. 
@@ -17,6 +19,8 @@ class Data_Interface(ABC):
                                     the available MCMC sample spaces in the inference data        
         """
         self._inferencedata = self._load_inference_data(inference_path)
+        self._header = self._get_header()
+        self._arrays_index = self._get_arrays_index()
         self._graph = self._get_graph()
         self._observed_variables = self._get_obeserved_variables()
         self.all_variables = []
@@ -27,6 +31,14 @@ class Data_Interface(ABC):
     def _load_inference_data(self,datapath):
         pass
 
+    @abstractmethod
+    def _get_header(self):
+        pass
+
+    @abstractmethod
+    def _get_arrays_index(self):
+        pass
+
     @abstractmethod
     def _get_graph(self):
         pass  
@@ -64,7 +76,7 @@ class Data_Interface(ABC):
         pass
 
     @abstractmethod
-    def get_samples(self,var_name,space=['prior','posterior']):
+    def get_samples(self,var_name,space=['prior','posterior'],average_chains=False):
         pass
 
     @abstractmethod
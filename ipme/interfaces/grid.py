@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
 from ..classes.cell.utils.cell_widgets import CellWidgets
+from ..utils.functions import find_mask
+
+import panel as pn
 
 class Grid(ABC):
-    def __init__(self, control, mode, vars = 'all', spaces = 'all'):
+    def __init__(self, control, mode, vars = 'all', spaces = 'all', lazy = False):
         """
             Parameters:
             --------
@@ -10,6 +13,9 @@ class Grid(ABC):
                 mode                    A String in {"i","s"}, "i":interactive, "s":static.
                 vars                    A List of variables to be presented in the graph
                 spaces                  A List of spaces to be included in graph
+                lazy                    A Boolean: if True, the cells of a space are built the first time
+                                        initialize_space() is called for it (e.g. when its tab is opened).
+                                        Otherwise, all spaces are built here.
             Sets:
             --------
                 ic
@@ -24,6 +30,8 @@ class Grid(ABC):
                 cells_widgets          A Dict dict1 of the form (key1,value1) = (<widget_name>, dict2)
                                         dict2 of the form (key1,value1) = (<space>, List of <cell_name>).
                 plotted_widgets        A Dict of the form {<space>: List of widget objects to be plotted} .
+                _placeholders          A Dict {<space>: List of (Cell object, pn.Column, get_plot kwargs)}
+                                        of the cells not built yet in lazy mode.
         """
         self.ic = control
         self._data = control.data
@@ -33,7 +41,12 @@ class Grid(ABC):
         self._grids = {}
         self.cells = {}
         self.spaces = spaces
+        self._lazy = lazy
+        self._placeholders = {}
         self._create_grids()
+        if not self._lazy:
+            for space in list(self._placeholders):
+                self.initialize_space(space)
 
         self.cells_widgets = {}
         self.plotted_widgets = {}
@@ -43,6 +56,44 @@ class Grid(ABC):
     def _create_grids(self):
         pass
 
+    def _add_cell_to_grid(self, cell, space, start_point, end_point, **kwargs):
+        """
+            Places an empty column in the <space> grid that is filled with
+            the plot of <cell> by initialize_space(). The cell should be created lazily.
+        """
+        if space not in self._grids:
+            self._grids[space] = pn.GridSpec(sizing_mode = 'stretch_both')
+        column = pn.Column(width=220, height=220)
+        if space not in self._placeholders:
+            self._placeholders[space] = []
+        self._placeholders[space].append((cell, column, kwargs))
+        self._grids[space][ start_point[0]:end_point[0], start_point[1]:end_point[1] ] = column
+
+    def initialize_space(self, space):
+        """
+            Builds the cells of <space> that are still placeholders and applies
+            to them the selections made so far in the other spaces.
+        """
+        placeholders = self._placeholders.pop(space, [])
+        if not len(placeholders):
+            return
+        for cell, column, kwargs in placeholders:
+            cell.initialize_space(space)
+            column.append(cell.get_plot(space, **kwargs))
+        if self._mode == "i":
+            self._restore_selection(space)
+
+    def _restore_selection(self, space):
+        restored = False
+        for var_name, (xmin, xmax) in self.ic.get_sel_var_ranges().items():
+            if var_name in self.cells and self.cells[var_name].is_initialized(space):
+                samples = self.cells[var_name].samples[space].data['x']
+                self.ic.set_sel_var_mask(space, var_name, find_mask(samples, xmin, xmax))
+                restored = True
+        if restored:
+            self.ic.compute_intersection_of_samples(space)
+            self.ic.wait_sample_inds_update(space)
+
     def _add_widgets(self):
         CellWidgets.link_cells_widgets(self)
         if self._mode == "i":
@@ -1,6 +1,5 @@
 from ..interfaces.cell import Cell
 
-import threading
 from abc import abstractmethod
 
 class PredictiveCheckCell(Cell):
@@ -15,7 +14,7 @@ class PredictiveCheckCell(Cell):
                 _func
                 _source
                 _reconstructed
-                _samples
+                _samples        A Dict {<space>: numpy.ndarray of the check statistic of each predictive draw}.
                 _seg
 
         """
@@ -31,28 +30,24 @@ class PredictiveCheckCell(Cell):
     ## DATA
     def get_samples_for_cur_idx_dims_values(self, space):
         """
-            Returns the observed data and predictive samples of the observed variable
-            <self._name> in space <space>.
+            Returns the observed data and the check statistic <self.func> of every predictive
+            draw of the observed variable <self._name> in space <space>.
 
             Returns:
             --------
-                A Tuple (data,samples): data-> observed data and samples-> predictive samples.
+                A Tuple (data,samples): data-> observed data and samples-> numpy.ndarray of the statistic
+                of each predictive draw (NaN for the draws with non-finite samples), shared by the
+                check cells of the variable (see Data.get_pred_check_stats).
         """
         data = self.ic.data.get_samples(self.name, 'observed_data')
-        if self.ic.data.get_var_type(self.name) == "observed":
-            if space == "posterior" and "posterior_predictive" in self.ic.data.get_spaces():
-                space="posterior_predictive"
-            elif space == "prior" and "prior_predictive" in self.ic.data.get_spaces():
-                space="prior_predictive"
-        samples = self.ic.data.get_samples(self.name, space)
+        samples = self.ic.data.get_pred_check_stats(self.name, space)[self.func]
         return data, samples
 
     ## INITIALIZATIONS
-    def _initialize_plot(self):
-        for space in self.spaces:
-            self.initialize_cds(space)
-            self.initialize_fig(space)
-            self.initialize_glyphs(space)
+    def _initialize_space(self, space):
+        self.initialize_cds(space)
+        self.initialize_fig(space)
+        self.initialize_glyphs(space)
 
     @abstractmethod
     def initialize_fig(self, space):
@@ -75,14 +70,3 @@ class PredictiveCheckCell(Cell):
     @abstractmethod
     def update_cds(self, space):
         pass
-
-    def sample_inds_callback(self, space, attr, old, new):
-        """
-            Updates cds when indices of selected samples -- Cell._sample_inds--
-            are updated.
-        """
-        self.ic.add_selection_threads(space, threading.Thread(target = self._sample_inds_thread, args = (space,), daemon = True))
-        self.ic.sel_lock_event.set()
-
-    def _sample_inds_thread(self, space):
-        self.update_cds(space)
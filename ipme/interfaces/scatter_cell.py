@@ -1,17 +1,16 @@
 from ..interfaces.cell import Cell
-from ..utils.stats import find_x_range
 
 import numpy as np
-import threading
 from abc import abstractmethod
 
 class ScatterCell(Cell):
-    def __init__(self, vars, control):
+    def __init__(self, vars, control, lazy = False):
         """
             Parameters:
             --------
                 vars            A List of variableNames of the model.
                 control         A Control object
+                lazy            A Boolean: if True, the cell's spaces are built on demand.
             Sets:
             -----
                 x_range         Figures axes x_range
@@ -20,27 +19,20 @@ class ScatterCell(Cell):
         self.contours = {}
         self._all_samples = {}
         self.x_range = {}
-        Cell.__init__(self, vars, control)
+        Cell.__init__(self, vars, control, lazy)
 
     ## DATA
     def get_samples(self, space):
         """
-            Retrieves MCMC samples of <space> into a numpy.ndarray and
-            sets an entry into self._all_samples Dict.
+            Retrieves the shared MCMC samples of <space> (all chains concatenated
+            along the draws) and their x-range, and sets an entry into self._all_samples Dict.
         """
         for var in self.vars:
-            space_gsam = space
-            if self._data.get_var_type(var) == "observed":
-                if space == "posterior" and "posterior_predictive" in self._data.get_spaces():
-                    space_gsam = "posterior_predictive"
-                elif space == "prior" and "prior_predictive" in self._data.get_spaces():
-                    space_gsam = "prior_predictive"
             if var not in self._all_samples:
                 self._all_samples[var] = {}
-            self._all_samples[var][space] = self._data.get_samples(var, space_gsam).T
-            # compute x_range
-            self.x_range[var] = {}
-            self.x_range[var][space] = find_x_range(self._all_samples[var][space])
+            if var not in self.x_range:
+                self.x_range[var] = {}
+            self._all_samples[var][space], self.x_range[var][space] = self._data.get_shared_samples(var, space)
             # self.x_range[var][space] = find_x_range(self.get_samples_for_cur_idx_dims_values(var, space))
 
     def get_samples_for_cur_idx_dims_values(self, var_name, space):
@@ -52,6 +44,13 @@ class ScatterCell(Cell):
             --------
                 A numpy.ndarray.
         """    
+        return self.get_samples_for_idx_dims_values(var_name, space, self.cur_idx_dims_values)
+
+    def get_samples_for_idx_dims_values(self, var_name, space, idx_dims_values):
+        """
+            Returns a numpy.ndarray of the MCMC samples of the <name> parameter
+            for the index dimensions values <idx_dims_values> (of the form of cur_idx_dims_values).
+        """
         if var_name in self._all_samples:
             data =  self._all_samples[var_name]
             if space in data:
@@ -60,18 +59,56 @@ class ScatterCell(Cell):
                 raise ValueError("cel {}-{}: space {} not in self._all_samples[{}].keys() {}".format(self.vars[0],self.vars[1],space,var_name,data.keys()))
         else:
             raise ValueError("var_name {} not in self._all_samples.keys() {}".format(var_name, self._all_samples.keys()))
-        if var_name in self.cur_idx_dims_values:
-            for _, dim_value in self.cur_idx_dims_values[var_name].items():
+        if var_name in idx_dims_values:
+            for _, dim_value in idx_dims_values[var_name].items():
                 data = data[dim_value]
         return np.squeeze(data).T
 
+    def get_contours_key(self, space, idx_dims_values):
+        """
+            Returns the key of the contours of <space> for <idx_dims_values> in the IC contours cache:
+            (<var_name1>, <var_name2>, <space>, <indices of the index dimensions of each variable>).
+        """
+        return (self.vars[0], self.vars[1], space, tuple((var, tuple((dim, tuple(values)) for dim, values in sorted(idx_dims_values.get(var, {}).items())))
+                                                          for var in self.vars))
+
+    def get_adjacent_idx_dims_values(self):
+        """
+            Returns a List of the index dimensions values (of the form of cur_idx_dims_values)
+            where one index dimension is set to the previous or the next option of its widget,
+            i.e. the most likely next coordinates. Dimensions paired with another
+            one (<dim1>_idx_<dim2>) are left out.
+        """
+        cur_idx_dims_values = {var: dict(values) for var, values in self.cur_idx_dims_values.items()}
+        dims_values = {}
+        for var in self.idx_dims:
+            for dim, d_dim in self.idx_dims[var].items():
+                if "_idx_" not in dim and dim in cur_idx_dims_values.get(var, {}):
+                    dims_values[dim] = list(d_dim.values)
+        adjacent = []
+        for dim, values in dims_values.items():
+            options = list(dict.fromkeys(values))
+            cur_var = next(var for var in cur_idx_dims_values if dim in cur_idx_dims_values[var])
+            cur_inds = cur_idx_dims_values[cur_var][dim]
+            if not len(cur_inds):
+                continue
+            pos = options.index(values[cur_inds[0]])
+            for adj_pos in [pos + 1, pos - 1]:
+                if 0 <= adj_pos < len(options):
+                    inds = [i for i,v in enumerate(values) if v == options[adj_pos]]
+                    idx_dims_values = {var: dict(var_values) for var, var_values in cur_idx_dims_values.items()}
+                    for var in idx_dims_values:
+                        if dim in idx_dims_values[var]:
+                            idx_dims_values[var][dim] = inds
+                    adjacent.append(idx_dims_values)
+        return adjacent
+
     ## INITIALIZATION
-    def _initialize_plot(self):
-        for space in self.spaces:
-            self.get_samples(space)
-            self.initialize_cds(space)
-            self.initialize_fig(space)
-            self.initialize_glyphs(space)
+    def _initialize_space(self, space):
+        self.get_samples(space)
+        self.initialize_cds(space)
+        self.initialize_fig(space)
+        self.initialize_glyphs(space)
 
     @abstractmethod
     def initialize_fig(self, space):
@@ -95,14 +132,3 @@ class ScatterCell(Cell):
     def update_cds(self, space):
         pass
 
-    def sample_inds_callback(self, space, attr, old, new):
-        """
-            Updates cds when indices of selected samples -- Cell._sample_inds--
-            are updated.
-        """
-        self.ic.add_selection_threads(space, threading.Thread(target = self._sample_inds_thread, args = (space,), daemon = True))
-        self.ic.sel_lock_event.set()
-
-    def _sample_inds_thread(self, space):
-        self.update_cds(space)
-
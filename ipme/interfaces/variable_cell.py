@@ -1,5 +1,4 @@
 from ..interfaces.cell import Cell
-from ..utils.stats import find_x_range
 from ..utils.constants import BORDER_COLORS
 
 from bokeh.models import  Toggle, Div
@@ -7,16 +6,16 @@ from bokeh.layouts import layout
 from bokeh.io.export import get_screenshot_as_png
 
 import numpy as np
-import threading
 from abc import abstractmethod
 
 class VariableCell(Cell):
-    def __init__(self, name, control):
+    def __init__(self, name, control, lazy = False):
         """
             Parameters:
             --------
                 name            A String within the set {"<variableName>"}.
                 control         A Control object
+                lazy            A Boolean: if True, the cell's spaces are built on demand.
             Sets:
             -----
                 x_range         Figures axes x_range
@@ -30,34 +29,26 @@ class VariableCell(Cell):
         self._all_samples = {}
         self._all_data = {}
         self.x_range = {}
-        Cell.__init__(self, [name], control)
         self._toggle = {}
         self._div = {}
-        self._initialize_toggle_div()
+        Cell.__init__(self, [name], control, lazy)
 
     ## DATA
     def get_samples(self, space):
         """
-            Retrieves MCMC samples of <space> into a numpy.ndarray and
-            sets an entry into self._all_samples Dict.
+            Retrieves the shared MCMC samples of <space> (all chains concatenated
+            along the draws) and their x-range, and sets an entry into self._all_samples Dict.
         """
         for var in self.vars:
-            space_gsam = space
-            if self._data.get_var_type(var) == "observed":
-                if space == "posterior" and "posterior_predictive" in self._data.get_spaces():
-                    space_gsam = "posterior_predictive"
-                elif space == "prior" and "prior_predictive" in self._data.get_spaces():
-                    space_gsam = "prior_predictive"
             if var not in self._all_samples:
                 self._all_samples[var] = {}
-            self._all_samples[var][space] = self._data.get_samples(var, space_gsam).T
+            if var not in self.x_range:
+                self.x_range[var] = {}
+            self._all_samples[var][space], self.x_range[var][space] = self._data.get_shared_samples(var, space)
             # get observed data
             data = self._data.get_observations(var)
             if data is not None:
                 self._all_data[var] = data
-            # compute x_range
-            self.x_range[var] = {}
-            self.x_range[var][space] = find_x_range(self._all_samples[var][space])
             # self.x_range[var][space] = find_x_range(self.get_samples_for_cur_idx_dims_values(var, space))
 
     def get_samples_for_cur_idx_dims_values(self, var_name, space):
@@ -107,12 +98,12 @@ class VariableCell(Cell):
             return np.squeeze(data).T
 
     ## INITIALIZATION
-    def _initialize_plot(self):
-        for space in self.spaces:
-            self.get_samples(space)
-            self.initialize_cds(space)
-            self.initialize_fig(space)
-            self.initialize_glyphs(space)
+    def _initialize_space(self, space):
+        self.get_samples(space)
+        self.initialize_cds(space)
+        self.initialize_fig(space)
+        self.initialize_glyphs(space)
+        self._initialize_toggle_div(space)
 
     @abstractmethod
     def initialize_fig(self, space):
@@ -136,66 +127,43 @@ class VariableCell(Cell):
     def update_cds(self, space):
         pass
 
-    def sample_inds_callback(self, space, attr, old, new):
+    def get_selection_key(self, space, inds_hash):
         """
-            Updates cds when indices of selected samples -- Cell._sample_inds--
-            are updated.
+            Returns the key of the selection-dependent data of <space> in the IC selection cache:
+            (<name>, <space>, <current indices of the index dimensions>, <inds_hash>).
         """
-        self.ic.add_selection_threads(space, threading.Thread(target = self._sample_inds_thread, args = (space,), daemon = True))
-        self.ic.sel_lock_event.set()
+        idx_dims_values = self.cur_idx_dims_values.get(self.name, {})
+        return (self.name, space, tuple((dim, tuple(values)) for dim, values in sorted(idx_dims_values.items())), inds_hash)
 
-    def _sample_inds_thread(self, space):
-        self.update_cds(space)
-
-    def compute_intersection_of_samples(self, space):
-        """
-            Computes intersection of sample points based on user's
-            restrictions per parameter.
-        """
-        sel_var_inds = self.ic.get_sel_var_inds(space = space)
-        sp_keys = list(sel_var_inds.keys())
-        inds_list = np.full((len(self.samples[space].data['x']),), False)
-        if len(sp_keys)>1:
-            sets = []
-            for var in sp_keys:
-                sets.append(set(sel_var_inds[var]))
-            inds_set = set.intersection(*sorted(sets, key = len))
-            inds_list[list(inds_set)] = True
-        elif len(sp_keys) == 1:
-            inds_list[sel_var_inds[sp_keys[0]]] = True
-        non_inds_list = list(~inds_list)
-        self.ic.set_sample_inds(space, dict(inds = list(inds_list)), dict(non_inds = non_inds_list))
-
-    def _initialize_toggle_div(self):
+    def _initialize_toggle_div(self, space):
         """"
-            Creates the toggle headers of each variable node.
+            Creates the toggle header of the variable node in <space>.
         """
-        for space in self.spaces:
-            width = self.plot[space].plot_width
-            height = 40
-            sizing_mode = self.plot[space].sizing_mode
-            label = self.name + " ~ " + self._data.get_var_dist(self.name)
-            text = """parents: %s <br>dims: %s"""%(self._data.get_var_parents(self.name), list(self._data.get_idx_dimensions(self.name)))
-            if sizing_mode == 'fixed':
-                self._toggle[space] = Toggle(label = label,  active = False,
-                                             width = width, height = height, sizing_mode = sizing_mode, margin = (0,0,0,0))
-                self._div[space] = Div(text = text,
-                                       width = width, height = height, sizing_mode = sizing_mode, margin = (0,0,0,0), background = BORDER_COLORS[0] )
-            elif sizing_mode == 'scale_width' or sizing_mode == 'stretch_width':
-                self._toggle[space] = Toggle(label = label,  active = False,
-                                             height = height, sizing_mode = sizing_mode, margin = (0,0,0,0))
-                self._div[space] = Div(text = text,
-                                       height = height, sizing_mode = sizing_mode, margin = (0,0,0,0), background = BORDER_COLORS[0] )
-            elif sizing_mode == 'scale_height' or sizing_mode == 'stretch_height':
-                self._toggle[space] = Toggle(label = label,  active = False,
-                                             width = width, sizing_mode = sizing_mode, margin = (0,0,0,0))
-                self._div[space] = Div(text = text,
-                                       width = width, sizing_mode = sizing_mode, margin = (0,0,0,0), background = BORDER_COLORS[0] )
-            else:
-                self._toggle[space] = Toggle(label = label,  active = False,
-                                             sizing_mode = sizing_mode, margin = (0,0,0,0))
-                self._div[space] = Div(text = text, sizing_mode = sizing_mode, margin = (0,0,0,0), background = BORDER_COLORS[0] )
-            self._toggle[space].js_link('active', self.plot[space], 'visible')
+        width = self.plot[space].plot_width
+        height = 40
+        sizing_mode = self.plot[space].sizing_mode
+        label = self.name + " ~ " + self._data.get_var_dist(self.name)
+        text = """parents: %s <br>dims: %s"""%(self._data.get_var_parents(self.name), list(self._data.get_idx_dimensions(self.name)))
+        if sizing_mode == 'fixed':
+            self._toggle[space] = Toggle(label = label,  active = False,
+                                         width = width, height = height, sizing_mode = sizing_mode, margin = (0,0,0,0))
+            self._div[space] = Div(text = text,
+                                   width = width, height = height, sizing_mode = sizing_mode, margin = (0,0,0,0), background = BORDER_COLORS[0] )
+        elif sizing_mode == 'scale_width' or sizing_mode == 'stretch_width':
+            self._toggle[space] = Toggle(label = label,  active = False,
+                                         height = height, sizing_mode = sizing_mode, margin = (0,0,0,0))
+            self._div[space] = Div(text = text,
+                                   height = height, sizing_mode = sizing_mode, margin = (0,0,0,0), background = BORDER_COLORS[0] )
+        elif sizing_mode == 'scale_height' or sizing_mode == 'stretch_height':
+            self._toggle[space] = Toggle(label = label,  active = False,
+                                         width = width, sizing_mode = sizing_mode, margin = (0,0,0,0))
+            self._div[space] = Div(text = text,
+                                   width = width, sizing_mode = sizing_mode, margin = (0,0,0,0), background = BORDER_COLORS[0] )
+        else:
+            self._toggle[space] = Toggle(label = label,  active = False,
+                                         sizing_mode = sizing_mode, margin = (0,0,0,0))
+            self._div[space] = Div(text = text, sizing_mode = sizing_mode, margin = (0,0,0,0), background = BORDER_COLORS[0] )
+        self._toggle[space].js_link('active', self.plot[space], 'visible')
 
 
     def get_max_prob(self, space):
@@ -204,10 +172,13 @@ class VariableCell(Cell):
         """
         max_sv = -1
         max_rv = -1
-        if self.source[space].data['y'].size:
-            max_sv = self.source[space].data['y'].max()
-        if hasattr(self,'reconstructed') and self.reconstructed[space].data['y'].size:
-            max_rv = self.reconstructed[space].data['y'].max()
+        source_y = self.ic.get_model_property(self.source[space], 'data')['y']
+        if source_y.size:
+            max_sv = source_y.max()
+        if hasattr(self,'reconstructed'):
+            reconstructed_y = self.ic.get_model_property(self.reconstructed[space], 'data')['y']
+            if reconstructed_y.size:
+                max_rv = reconstructed_y.max()
         max_v = max([max_sv,max_rv])
         return  max_v if max_v!=-1 else None
 
@@ -1,10 +1,11 @@
 from .classes.graph import Graph
 from .classes.scatter_matrix import ScatterMatrix
+from .utils.constants import RASTER_THRESHOLD, CONTOURS_PREFETCH
 
-def graph(data_path, mode = "i", vars = 'all', spaces = 'all', predictive_checks = []):
-    graph = Graph(data_path, mode, vars, spaces, predictive_checks)
+def graph(data_path, mode = "i", vars = 'all', spaces = 'all', predictive_checks = [], memory_map = False, lazy = False, asynchronous = False):
+    graph = Graph(data_path, mode, vars, spaces, predictive_checks, memory_map, lazy, asynchronous)
     graph.get_graph().show()
 
-def scatter_matrix(data_path, mode = "i", vars = [], spaces = 'all'):
-    scatter_matrix = ScatterMatrix(data_path, mode, vars, spaces)
+def scatter_matrix(data_path, mode = "i", vars = [], spaces = 'all', memory_map = False, lazy = False, asynchronous = False, raster_threshold = RASTER_THRESHOLD, contours_prefetch = CONTOURS_PREFETCH):
+    scatter_matrix = ScatterMatrix(data_path, mode, vars, spaces, memory_map, lazy, asynchronous, raster_threshold, contours_prefetch)
     scatter_matrix.get_scatter_matrix().show()
\ No newline at end of file
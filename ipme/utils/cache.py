@@ -0,0 +1,133 @@
+from collections import OrderedDict
+
+import threading
+import numpy as np
+
+## marks a key missing from the cache, as None is a valid cached value
+_MISSING = object()
+
+def get_nbytes(value):
+    """
+        Returns the number of bytes of the numpy arrays held by <value>,
+        which may be nested in Dicts, Lists and Tuples.
+    """
+    if isinstance(value, dict):
+        return sum(get_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(get_nbytes(v) for v in value)
+    return getattr(value, 'nbytes', 0)
+
+def get_base_nbytes(value):
+    """
+        Returns the number of bytes of the memory kept alive by the numpy arrays held by <value>,
+        which may be nested in Dicts, Lists and Tuples: a view keeps the whole array it was taken from.
+        Memory maps are not counted, as their pages are reclaimed by the system.
+    """
+    if isinstance(value, dict):
+        return sum(get_base_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(get_base_nbytes(v) for v in value)
+    if isinstance(value, np.ndarray):
+        while isinstance(value.base, np.ndarray):
+            value = value.base
+        if isinstance(value, np.memmap):
+            return 0
+    return getattr(value, 'nbytes', 0)
+
+class LRUCache:
+    def __init__(self, max_bytes, sizeof = None):
+        """
+            A thread-safe Least Recently Used (LRU) cache bounded by a memory budget.
+
+            Parameters:
+            --------
+                max_bytes       An Int of the maximum number of bytes held by the cache.
+                                If None, the cache is unbounded and never evicts.
+                sizeof          A function returning the size in bytes of a value.
+                                Defaults to the <nbytes> attribute of the value.
+            Sets:
+            --------
+                _items          An OrderedDict {<key>: (<value>, <size>)} from least to most recently used.
+                _nbytes         An Int of the number of bytes currently held.
+                _in_flight      A Dict {<key>: [threading.Lock, value]} of the values being computed, shared
+                                with the concurrent callers of get_or_compute() for the same key.
+        """
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof if sizeof is not None else (lambda value: getattr(value, 'nbytes', 0))
+        self._items = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def get(self, key, default = None):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key][0]
+            return default
+
+    def put(self, key, value):
+        """
+            Caches <value> and evicts the least recently used values until
+            the cache fits its budget. Values larger than the budget are not cached.
+        """
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self._nbytes -= self._items.pop(key)[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._items[key] = (value, size)
+            self._nbytes += size
+            while self.max_bytes is not None and self._nbytes > self.max_bytes and len(self._items):
+                _, (_, ev_size) = self._items.popitem(last = False)
+                self._nbytes -= ev_size
+
+    def get_or_compute(self, key, func):
+        """
+            Returns the cached value of <key>. If <key> is not cached, the value
+            is computed by <func>() exactly once, even when requested concurrently.
+            A computed None is cached as any other value. A value larger than the budget
+            is returned to all the concurrent callers, but it is not cached, so it is
+            computed again by the next call.
+        """
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key][0]
+            flight = self._in_flight.setdefault(key, [threading.Lock(), _MISSING])
+        try:
+            with flight[0]:
+                if flight[1] is _MISSING:
+                    value = self.get(key, _MISSING)
+                    if value is _MISSING:
+                        value = func()
+                        self.put(key, value)
+                    flight[1] = value
+                return flight[1]
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is flight:
+                    del self._in_flight[key]
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._items:
+                self._nbytes -= self._items.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._nbytes = 0
+
+    def get_nbytes(self):
+        with self._lock:
+            return self._nbytes
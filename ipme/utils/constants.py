@@ -24,10 +24,59 @@ RUG_SIZE = 10 #in screen units
 DATA_DIST_RATIO = 3.0
 DATA_SIZE = 6 #in screen units
 
+## Raster mode of the interactive scatter cells: above RASTER_THRESHOLD draws
+## (None: never), the samples are drawn as an image of RASTER_SIZE x RASTER_SIZE pixels
+## whose opacity takes RASTER_ALPHA_LEVELS levels from RASTER_MIN_ALPHA to 1
+RASTER_THRESHOLD = 10000
+RASTER_SIZE = 100
+RASTER_ALPHA_LEVELS = 64
+RASTER_MIN_ALPHA = 0.25
+
+## Contours of the scatter plots: kde on a CONTOUR_GRID_SIZE x CONTOUR_GRID_SIZE grid, contour lines
+## of the highest density regions holding CONTOUR_HDI_PROBS of the mass (1, 2 and 3 sigma)
+CONTOUR_GRID_SIZE = 128
+CONTOUR_HDI_PROBS = [0.393, 0.865, 0.989]
+
 """" Grid Interface
 
 """
 ##
 MAX_NUM_OF_COLS_PER_ROW = 12
 COLS_PER_VAR = 2
-MAX_NUM_OF_VARS_PER_ROW = 5
\ No newline at end of file
+MAX_NUM_OF_VARS_PER_ROW = 5
+
+"""" Interaction Control Interface
+
+"""
+## Number of worker threads updating the cells on each selection
+## (None: default of concurrent.futures.ThreadPoolExecutor)
+SELECTION_NUM_WORKERS = None
+
+## Window in seconds within which the successive selections of a variable are coalesced
+## (only the latest is applied; 0: every selection is applied immediately)
+SELECTION_DEBOUNCE_WINDOW = 0.05
+
+## Versions of Bokeh (prefixes) whose server session internals are used to send the changes of an asynchronous
+## interaction to the browser in one message. With other versions, one message is sent per change.
+COMBINED_PATCH_BOKEH_VERSIONS = ('2.0.',)
+
+## Memory budget of the memo of the selection-dependent data of the cells
+## (reconstructed densities), keyed by the selection signature
+SELECTION_CACHE_MAX_BYTES = 256*1024**2
+
+## Memory budget of the cache of the scatter plots contours, keyed by the index dimensions values
+CONTOURS_CACHE_MAX_BYTES = 64*1024**2
+
+## Default of the contours_prefetch option of the scatter matrix: if True, the contours of the previous
+## and next options of the index dimensions widgets are computed in the background after a change of
+## index dimension (this competes for the cores with the interactions)
+CONTOURS_PREFETCH = False
+
+"""" Data Interface
+
+"""
+## Memory budget of the decoded arrays cache
+ARRAYS_CACHE_MAX_BYTES = 2*1024**3
+
+## Metadata file of the memory-mapped store
+MMAP_METADATA_FILE = "metadata.json"
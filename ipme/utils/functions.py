@@ -1,4 +1,5 @@
 import numpy as np
+import hashlib
 from math import gcd, ceil
 
 def lcm(list_of_int):
@@ -20,21 +21,102 @@ def lcm(list_of_int):
     except IndexError:
         return None
 
-def find_indices(lst, condition, xmin=0, xmax=0):
-    # return [i for i, elem in enumerate(lst) if condition(elem)]
-    # return [ _ for _ in itertools.compress(list(range(0,len(lst))), map(condition,lst)) ]
-    return list(np.where((lst>=xmin) & (lst<=xmax))[0])
+def find_mask(lst, xmin, xmax):
+    """
+        Returns the boolean numpy array of the elements of <lst> within [xmin, xmax].
+    """
+    return (lst>=xmin) & (lst<=xmax)
 
-def find_inds_before_after(lst, el):
-    inds_sm=find_indices(lst, lambda e: e<= el)
-    if len(inds_sm):
-        ind_before=inds_sm[-1]
-    else:
-        ind_before=-1
-    inds_bi=find_indices(lst, lambda e: e>= el)
-    if len(inds_bi):
-        ind_after=inds_bi[0]
+def find_sorted_mask(lst, perm, sorted_lst, xmin, xmax):
+    """
+        Returns the boolean numpy array of the elements of <lst> within [xmin, xmax], given the
+        argsort permutation <perm> of <lst> and its sorted elements <sorted_lst>.
+        The range is found with two binary searches. Only the elements within the range (or out of it,
+        whichever are fewer) are scattered into the mask, unless both are many, where a full scan is faster.
+        NaNs are sorted last and never within the range.
+    """
+    n = len(perm)
+    lo = np.searchsorted(sorted_lst, xmin, side = 'left')
+    hi = max(lo, np.searchsorted(sorted_lst, xmax, side = 'right'))
+    if hi - lo <= n // 4:
+        mask = np.zeros(n, dtype = bool)
+        mask[perm[lo:hi]] = True
+    elif hi - lo >= n - n // 4:
+        mask = np.ones(n, dtype = bool)
+        mask[perm[:lo]] = False
+        mask[perm[hi:]] = False
     else:
+        mask = find_mask(lst, xmin, xmax)
+    return mask
+
+def get_mask_hash(mask):
+    """
+        Returns a hex digest of the content of the boolean numpy array <mask>,
+        hashed 8 samples per byte.
+    """
+    digest = hashlib.blake2b(np.packbits(mask).tobytes(), digest_size = 16)
+    digest.update(str(len(mask)).encode())
+    return digest.hexdigest()
+
+## Marching squares: the corners (bottom-left, bottom-right, top-right, top-left) of a cell
+## above the level add 1, 2, 4, 8 to its case. Each case lists the segments between the
+## crossed edges (0: bottom, 1: right, 2: top, 3: left); saddles are split around the corners above the level.
+MARCHING_SQUARES_SEGMENTS = [[], [(3, 0)], [(0, 1)], [(3, 1)], [(1, 2)], [(3, 0), (1, 2)], [(0, 2)], [(3, 2)],
+                             [(2, 3)], [(0, 2)], [(0, 1), (2, 3)], [(1, 2)], [(1, 3)], [(0, 1)], [(3, 0)], []]
+
+def find_contour_segments(xs, ys, z, levels):
+    """
+        Finds the contour lines of <z> at each of <levels> with a vectorised marching squares.
+
+        Parameters:
+        --------
+            xs          A numpy.ndarray of the x coordinates of the columns of <z>.
+            ys          A numpy.ndarray of the y coordinates of the rows of <z>.
+            z           A 2-D numpy.ndarray of the values on the grid.
+            levels      A List of the contour levels.
+        Returns:
+        --------
+            A Dict {'x0','y0','x1','y1'} of numpy.ndarrays of the end points of the (unconnected)
+            line segments of all the contours.
+    """
+    segment_edges = np.full((2, 2, 16), -1)
+    for case, segments in enumerate(MARCHING_SQUARES_SEGMENTS):
+        for slot, (start, end) in enumerate(segments):
+            segment_edges[slot, :, case] = (start, end)
+    x0, y0, x1, y1 = [], [], [], []
+    for level in levels:
+        above = z > level
+        cases = above[:-1, :-1] + 2 * above[:-1, 1:] + 4 * above[1:, 1:] + 8 * above[1:, :-1]
+        rows, cols = np.nonzero((cases != 0) & (cases != 15))
+        cases = cases[rows, cols]
+        bl, br, tr, tl = z[rows, cols], z[rows, cols + 1], z[rows + 1, cols + 1], z[rows + 1, cols]
+        left, right, bottom, top = xs[cols], xs[cols + 1], ys[rows], ys[rows + 1]
+        # crossing point of each edge (only used for the edges actually crossed)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            edges_x = np.stack([left + (level - bl) / (br - bl) * (right - left), right,
+                                left + (level - tl) / (tr - tl) * (right - left), left])
+            edges_y = np.stack([bottom, bottom + (level - br) / (tr - br) * (top - bottom),
+                                top, bottom + (level - bl) / (tl - bl) * (top - bottom)])
+        for slot in range(2):
+            starts = segment_edges[slot, 0, cases]
+            ends = segment_edges[slot, 1, cases]
+            segs = np.flatnonzero(starts >= 0)
+            x0.append(edges_x[starts[segs], segs])
+            y0.append(edges_y[starts[segs], segs])
+            x1.append(edges_x[ends[segs], segs])
+            y1.append(edges_y[ends[segs], segs])
+    if not x0:
+        return dict(x0 = np.array([]), y0 = np.array([]), x1 = np.array([]), y1 = np.array([]))
+    return dict(x0 = np.concatenate(x0), y0 = np.concatenate(y0), x1 = np.concatenate(x1), y1 = np.concatenate(y1))
+
+def find_inds_before_after(lst, el):
+    """
+        Returns the indices of the last element <= el and of the first element >= el
+        of the ascending <lst> (-1 if there is no such element).
+    """
+    ind_before=np.searchsorted(lst, el, side = 'right') - 1
+    ind_after=np.searchsorted(lst, el, side = 'left')
+    if ind_after == len(lst):
         ind_after=-1
     return (ind_before,ind_after)
 
@@ -11,4 +11,21 @@ HOVER_CODE="""
             data['isIn'][start]=1      
         }
         source.data = data
-    """
\ No newline at end of file
+    """
+SELECTION_FILTER_CODE="""
+        const sel = selection.data['sel']
+        const indices = []
+        for (var i = 0; i < sel.length; i++) {
+            if (sel[i] == selected) {
+                indices.push(i)
+            }
+        }
+        return indices
+    """
+
+SELECTION_VIEWS_CODE="""
+        for (var i = 0; i < views.length; i++) {
+            views[i].compute_indices()
+            views[i].change.emit()
+        }
+    """
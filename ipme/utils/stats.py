@@ -1,7 +1,6 @@
-from scipy.stats.kde import gaussian_kde
 from scipy.interpolate import griddata
 from scipy.signal import savgol_filter, unit_impulse
-from numpy.linalg import LinAlgError
+from scipy.fft import next_fast_len
 
 from .functions import get_finite_samples
 
@@ -31,51 +30,380 @@ def find_x_range(data):
     return (min - 0.1*(max-min),max + 0.1*(max-min))
 
 def kde(samples, filled = False):
-    try:
-        if len(samples) == 0:
-            return dict(x = np.array([]), y = np.array([]))
-        samples = samples.flatten()
-        if ~np.isfinite(samples).all():
-            samples = get_finite_samples(samples)
-        kde_samples = gaussian_kde(samples)
-        bw = kde_samples.scotts_factor() * samples.std(ddof=1)
-        #x = _kde_support(bw, bin_range=(samples.min(),samples.max()), clip=(samples.min(),samples.max()))
-        x = kde_support(bw, bin_range=(samples.min(),samples.max()))      
-        y = kde_samples(x)
-        if filled:
-            x = np.append(x, x[-1])
-            x = np.insert(x, 0, x[0], axis=0)
-            y = np.append(y, 0.0)
-            y = np.insert(y, 0, 0.0, axis=0)
-        return dict(x = x,y = y)
-    except ValueError:
-        print("KDE cannot be estimated because {} samples were provided to kde".format(len(samples)))
-        return dict(x=np.array([]),y=np.array([])) 
-    except LinAlgError as err:
-        if 'singular matrix' in str(err):
-            print("KDE: singular matrix")
-            y = unit_impulse(100,'mid')
-            x = np.arange(-50, 50) 
-            if filled:
-                x=np.append(x,x[-1])
-                x=np.insert(x, 0, x[0], axis=0)
-                y=np.append(y,0.0)
-                y=np.insert(y, 0, 0.0, axis=0)
-            return dict(x=x,y=y)
-        else:
-            raise
+    """
+        Estimates the Gaussian kernel density of <samples> (Scott's rule bandwidth)
+        on the 100 points of kde_support().
+    """
+    if len(samples) == 0:
+        return dict(x = np.array([]), y = np.array([]))
+    samples = samples.flatten()
+    if ~np.isfinite(samples).all():
+        samples = get_finite_samples(samples)
+    if samples.size < 2:
+        print("KDE cannot be estimated because {} samples were provided to kde".format(samples.size))
+        return dict(x=np.array([]),y=np.array([]))
+    if samples.std() == 0:
+        print("KDE: singular matrix")
+        y = unit_impulse(100,'mid')
+        x = np.arange(-50, 50)
+    else:
+        density = kde_batch(samples[:, np.newaxis])[0]
+        x = density['x']
+        y = density['y']
+    if filled:
+        x = np.append(x, x[-1])
+        x = np.insert(x, 0, x[0], axis=0)
+        y = np.append(y, 0.0)
+        y = np.insert(y, 0, 0.0, axis=0)
+    return dict(x = x,y = y)
+
+def kde_batch(block, supports = None, n_points = 100, max_grid_size = 2**14, chunk_size = 2**16):
+    """
+        Estimates the Gaussian kernel density (Scott's rule bandwidth) of every column
+        of <block> in one vectorised pass.
+
+        The samples are linearly binned onto a grid that refines the evaluation points
+        <k> times (grid step at most bw/8, at most <max_grid_size> grid points) and the bins
+        are convolved with the Gaussian kernels through FFT, so the cost is
+        O(n_samples + n_grid*log(n_grid)) per column instead of O(n_samples*n_points).
+        Columns whose kernels are too narrow for such a grid (heavy tails) are evaluated
+        directly at the points, each sample reaching only its nearest ones.
+        The samples are processed in groups of columns of about <chunk_size> values, so
+        that the temporary arrays stay in cache.
+
+        Parameters:
+        --------
+            block           A 2-D numpy.ndarray (draws x variables). Non-finite samples are ignored.
+                            A Fortran-ordered block is not copied.
+            supports        A List of (xmin, xmax) evaluation ranges, one per column.
+                            Defaults to the kde_support() of each column.
+            n_points        An Int of the number of evaluation points.
+        Returns:
+        --------
+            A List of Dicts {'x': evaluation points, 'y': density}, one per column.
+            Columns with less than 2 finite samples get empty arrays and constant
+            columns get a unit impulse.
+    """
+    block = np.asarray(block, dtype = np.float64)
+    if block.ndim == 1:
+        block = block[:, np.newaxis]
+    num_cols = block.shape[1]
+    densities = [dict(x = np.array([]), y = np.array([])) for _ in range(num_cols)]
+    if block.shape[0] < 2:
+        return densities
+    # one contiguous row per variable
+    values = np.ascontiguousarray(block.T)
+    chunks = [slice(start, start + max(1, chunk_size // values.shape[1])) for start in range(0, num_cols, max(1, chunk_size // values.shape[1]))]
+    n = np.empty(num_cols, dtype = np.int64)
+    std = np.empty(num_cols)
+    vmin = np.empty(num_cols)
+    vmax = np.empty(num_cols)
+    for chunk in chunks:
+        n[chunk], std[chunk], vmin[chunk], vmax[chunk] = _rows_stats(values[chunk])
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        bw = n**(-1./5) * std
+    for col in np.flatnonzero((n >= 2) & (bw == 0)):
+        densities[col] = dict(x = np.arange(-50, 50), y = unit_impulse(100,'mid'))
+    valid = (n >= 2) & (bw > 0)
+    cols = np.flatnonzero(valid)
+    if not cols.size:
+        return densities
+    if supports is None:
+        xmin = vmin - 3 * bw
+        xmax = vmax + 3 * bw
+    else:
+        xmin = np.asarray([supports[col][0] if valid[col] else 0. for col in range(num_cols)], dtype = np.float64)
+        xmax = np.asarray([supports[col][1] if valid[col] else 1. for col in range(num_cols)], dtype = np.float64)
+    step = (xmax - xmin) / (n_points - 1)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        refinement = np.ceil(8. * step / bw)
+    ## the kernels are much narrower than the evaluation step (heavy tails): the points fall
+    ## on their flanks, where the binning error is large, and a fine enough grid could exceed
+    ## max_grid_size. Each sample reaches at most 4 points, so these columns are evaluated directly
+    sparse = (refinement[cols] > 32) | (refinement[cols] > (max_grid_size - 1) // (n_points - 1))
+    for col in cols[sparse]:
+        densities[col] = dict(x = np.linspace(xmin[col], xmax[col], n_points),
+                              y = _sparse_kde(values[col], xmin[col], step[col], bw[col], n_points))
+    cols = cols[~sparse]
+    if not cols.size:
+        return densities
+    k = int(max(refinement[cols].max(), 1))
+    grid_size = (n_points - 1) * k + 1
+    grid_step = step / k
+    counts = np.zeros((num_cols, grid_size))
+    for chunk in chunks:
+        counts[chunk] = _rows_linear_binning(values[chunk], xmin[chunk], grid_step[chunk], grid_size)
+    counts = counts[cols]
+    offsets = np.arange(-(grid_size - 1), grid_size) * (grid_step[cols] / bw[cols])[:, np.newaxis]
+    kernels = np.exp(-0.5 * offsets**2)
+    fft_size = next_fast_len(3 * grid_size - 2)
+    density = np.fft.irfft(np.fft.rfft(counts, fft_size, axis = 1) * np.fft.rfft(kernels, fft_size, axis = 1), fft_size, axis = 1)
+    density = density[:, grid_size - 1:2 * grid_size - 1:k]
+    density = np.maximum(density, 0.) / (n[cols] * bw[cols] * np.sqrt(2 * np.pi))[:, np.newaxis]
+    for i, col in enumerate(cols):
+        densities[col] = dict(x = np.linspace(xmin[col], xmax[col], n_points), y = density[i])
+    return densities
+
+def _rows_stats(values):
+    """
+        Returns the number of finite values, the standard deviation (ddof=1),
+        the min and the max of the finite values of each row of <values>.
+    """
+    finite = np.isfinite(values)
+    if finite.all():
+        n = np.full(values.shape[0], values.shape[1])
+        return n, values.std(axis = 1, ddof = 1), values.min(axis = 1), values.max(axis = 1)
+    n = finite.sum(axis = 1)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        mean = np.where(finite, values, 0.).sum(axis = 1) / n
+        std = np.sqrt((np.where(finite, values - mean[:, np.newaxis], 0.)**2).sum(axis = 1) / (n - 1))
+    return n, std, np.where(finite, values, np.inf).min(axis = 1), np.where(finite, values, -np.inf).max(axis = 1)
+
+def _rows_linear_binning(values, xmin, grid_step, grid_size):
+    """
+        Linear binning of each row of <values> onto the grid xmin + i*grid_step, i < grid_size:
+        each value is shared between its two neighbouring grid points.
+        Non-finite values and values outside the grid are ignored.
+    """
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        pos = (values - xmin[:, np.newaxis]) / grid_step[:, np.newaxis]
+        inside = (pos >= 0) & (pos <= grid_size - 1)
+    if inside.all():
+        idx = pos.astype(np.int64)
+        np.minimum(idx, grid_size - 2, out = idx)
+        frac = pos - idx
+        weights = 1. - frac
+    else:
+        pos = np.where(inside, pos, 0.)
+        idx = np.minimum(pos.astype(np.int64), grid_size - 2)
+        frac = np.where(inside, pos - idx, 0.)
+        weights = inside - frac
+    idx += (np.arange(values.shape[0]) * grid_size)[:, np.newaxis]
+    idx = idx.ravel()
+    counts = np.bincount(idx, weights = weights.ravel(), minlength = values.shape[0] * grid_size)
+    # idx <= grid_size - 2, so the right neighbour never crosses to the next row
+    counts[1:] += np.bincount(idx, weights = frac.ravel(), minlength = values.shape[0] * grid_size)[:-1]
+    return counts.reshape(values.shape[0], grid_size)
+
+def _sparse_kde(values, xmin, step, bw, n_points, cut = 8):
+    """
+        Evaluates the Gaussian kde of the finite <values> at the n_points xmin + i*step directly,
+        summing each value's kernel only over the points within <cut>*<bw> of it. It costs
+        O(n_values*cut*bw/step), which is small when the kernels are narrower than the step.
+    """
+    values = values[np.isfinite(values)]
+    reach = int(np.ceil(cut * bw / step))
+    nearest = np.floor((values - xmin) / step).astype(np.int64)
+    density = np.zeros(n_points)
+    for offset in range(-reach + 1, reach + 1):
+        idx = nearest + offset
+        inside = (idx >= 0) & (idx < n_points)
+        dist = (xmin + idx[inside] * step - values[inside]) / bw
+        density += np.bincount(idx[inside], weights = np.exp(-0.5 * dist**2), minlength = n_points)
+    return density / (values.size * bw * np.sqrt(2 * np.pi))
+
+def kde_2d(x, y, grid_size = 128, cut = 3):
+    """
+        Estimates the Gaussian kernel density of the 2-D samples (<x>,<y>) with the full
+        covariance bandwidth of Scott's rule (sample covariance * n**(-1/3)).
+
+        The samples are linearly binned onto a <grid_size>x<grid_size> grid spanning their range
+        extended by <cut> kernel standard deviations, and the bins are convolved with the kernel
+        through FFT, so the cost is O(n_samples + n_grid*log(n_grid)).
+
+        Returns:
+        --------
+            A Dict {'x': grid x coordinates, 'y': grid y coordinates, 'density': <grid_size>x<grid_size>
+            numpy.ndarray with one row per y coordinate}, or None if the density cannot be
+            estimated (less than 3 finite samples or a singular covariance).
+    """
+    x = np.asarray(x, dtype = np.float64).flatten()
+    y = np.asarray(y, dtype = np.float64).flatten()
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.all():
+        x = x[finite]
+        y = y[finite]
+    n = x.size
+    if n < 3:
+        return None
+    cov = np.cov(x, y) * n**(-1./3)
+    det = np.linalg.det(cov)
+    if not np.isfinite(det) or det <= 0:
+        return None
+    std_x, std_y = np.sqrt(np.diag(cov))
+    grid_x = np.linspace(x.min() - cut * std_x, x.max() + cut * std_x, grid_size)
+    grid_y = np.linspace(y.min() - cut * std_y, y.max() + cut * std_y, grid_size)
+    step_x = grid_x[1] - grid_x[0]
+    step_y = grid_y[1] - grid_y[0]
+    counts = _linear_binning_2d(x, y, grid_x[0], grid_y[0], step_x, step_y, grid_size)
+    inv_cov = np.linalg.inv(cov)
+    offsets_x = (np.arange(-(grid_size - 1), grid_size) * step_x)[np.newaxis, :]
+    offsets_y = (np.arange(-(grid_size - 1), grid_size) * step_y)[:, np.newaxis]
+    kernel = np.exp(-0.5 * (inv_cov[0, 0] * offsets_x**2 + 2 * inv_cov[0, 1] * offsets_x * offsets_y + inv_cov[1, 1] * offsets_y**2))
+    # the terms of the circular convolution wrapping around fall before the central block
+    fft_shape = (next_fast_len(2 * grid_size - 1),) * 2
+    density = np.fft.irfft2(np.fft.rfft2(counts, fft_shape) * np.fft.rfft2(kernel, fft_shape), fft_shape)
+    density = density[grid_size - 1:2 * grid_size - 1, grid_size - 1:2 * grid_size - 1]
+    density = np.maximum(density, 0.) / (n * 2 * np.pi * np.sqrt(det))
+    return dict(x = grid_x, y = grid_y, density = density)
+
+def _linear_binning_2d(x, y, xmin, ymin, step_x, step_y, grid_size):
+    """
+        Bilinear binning of the samples (<x>,<y>) onto the grid (xmin + j*step_x, ymin + i*step_y):
+        each sample is shared between the four corners of its grid cell.
+    """
+    pos_x = np.clip((x - xmin) / step_x, 0, grid_size - 1)
+    pos_y = np.clip((y - ymin) / step_y, 0, grid_size - 1)
+    # idx <= grid_size - 2 on both axes, so the neighbours never cross the grid edges
+    idx_x = np.minimum(pos_x.astype(np.int64), grid_size - 2)
+    idx_y = np.minimum(pos_y.astype(np.int64), grid_size - 2)
+    frac_x = pos_x - idx_x
+    frac_y = pos_y - idx_y
+    idx = idx_y * grid_size + idx_x
+    size = grid_size * grid_size
+    counts = np.bincount(idx, weights = (1. - frac_x) * (1. - frac_y), minlength = size)
+    counts[1:] += np.bincount(idx, weights = frac_x * (1. - frac_y), minlength = size)[:-1]
+    counts[grid_size:] += np.bincount(idx, weights = (1. - frac_x) * frac_y, minlength = size)[:-grid_size]
+    counts[grid_size + 1:] += np.bincount(idx, weights = frac_x * frac_y, minlength = size)[:-grid_size - 1]
+    return counts.reshape(grid_size, grid_size)
+
+def hdi_levels(density, probs):
+    """
+        Returns a numpy.ndarray of the density values whose upper level sets hold the
+        probabilities <probs> of the mass of <density> (a grid of equal-area cells), i.e. the
+        contour levels of the highest density regions of <probs>.
+    """
+    values = np.sort(density.ravel())[::-1]
+    mass = np.cumsum(values)
+    mass /= mass[-1]
+    return values[np.minimum(np.searchsorted(mass, probs), values.size - 1)]
+
+def pred_check_stats(samples, chunk_size = 2**16):
+    """
+        Computes the predictive check statistics of every draw (first axis) of <samples> in one
+        pass: the draws are processed in groups of about <chunk_size> values, which stay in
+        cache across the four reductions.
+
+        Returns:
+        --------
+            A Dict {'min','max','mean','std'} of numpy.ndarrays with one value per draw.
+            The draws with a non-finite sample get NaN, as they are left out of the checks
+            (see get_finite_samples). One-dimensional <samples> hold one value per draw, the
+            statistics of a draw being computed over its value only (get_samples_for_pred_check
+            reduces them to a single value over all the draws instead).
+    """
+    samples = np.asarray(samples)
+    num_draws = samples.shape[0] if samples.ndim and samples.size else 0
+    stats = {func: np.full(num_draws, np.nan) for func in ['min', 'max', 'mean', 'std']}
+    if not num_draws:
+        return stats
+    values = samples.reshape(num_draws, -1)
+    rows = max(1, chunk_size // values.shape[1])
+    for start in range(0, num_draws, rows):
+        chunk = np.asarray(values[start:start + rows], dtype = np.float64)
+        draws = slice(start, start + chunk.shape[0])
+        finite = np.isfinite(chunk).all(axis = 1)
+        with np.errstate(invalid = 'ignore', over = 'ignore'):
+            mean = chunk.mean(axis = 1)
+            chunk_stats = dict(min = chunk.min(axis = 1), max = chunk.max(axis = 1), mean = mean,
+                               std = np.sqrt(((chunk - mean[:, np.newaxis])**2).mean(axis = 1)))
+        for func, value in chunk_stats.items():
+            value[~finite] = np.nan
+            stats[func][draws] = value
+    return stats
 
 def pmf(samples):
     """
         Estimate probability mass function.
     """
-    # samples = np.asarray(samples, dtype=np.float64).flatten()
     samples = samples.flatten()
     if ~np.isfinite(samples).all():
         samples = get_finite_samples(samples)
-    x = np.sort( np.unique(samples))
-    y = np.asarray([ np.count_nonzero(samples == xi) / len(samples) for xi in x])
-    return dict(x=x,y=y,y0=np.zeros(len(x)))
+    x, counts = np.unique(samples, return_counts = True)
+    return dict(x=x,y=counts/len(samples),y0=np.zeros(len(x)))
+
+def encode_discrete(samples):
+    """
+        Encodes discrete samples into integer codes of a table of levels.
+
+        Returns:
+        --------
+            A Tuple (codes, levels): <codes> is a numpy.ndarray of the smallest integer type
+            with the index of each (flattened) sample in <levels>; <levels> is the sorted numpy.ndarray
+            of the unique finite samples. Non-finite samples get the code len(levels).
+    """
+    samples = samples.flatten()
+    finite = np.isfinite(samples)
+    if finite.all():
+        levels, codes = np.unique(samples, return_inverse = True)
+    else:
+        levels, finite_codes = np.unique(samples[finite], return_inverse = True)
+        codes = np.full(samples.size, len(levels))
+        codes[finite] = finite_codes
+    return codes.astype(np.min_scalar_type(len(levels))), levels
+
+def pmf_from_codes(codes, levels, weights = None):
+    """
+        Estimates the probability mass function of encoded samples (see encode_discrete)
+        with one bincount. Levels with zero count are omitted, as in pmf().
+
+        Parameters:
+        --------
+            codes       A numpy.ndarray of the integer codes.
+            levels      A numpy.ndarray of the levels values.
+            weights     A numpy.ndarray of the weight of each sample (e.g. a boolean selection mask).
+                        If None, every sample has weight 1.
+    """
+    if weights is not None:
+        weights = np.asarray(weights, dtype = np.float64)
+    counts = np.bincount(codes, weights = weights, minlength = len(levels) + 1)[:len(levels)]
+    nonzero = counts > 0
+    total = counts.sum()
+    y = counts[nonzero] / total if total > 0 else np.array([])
+    return dict(x=levels[nonzero],y=y,y0=np.zeros(np.count_nonzero(nonzero)))
+
+def encode_raster(x, y, x_range, y_range, size):
+    """
+        Encodes 2-D samples into the integer codes of the pixels of a <size>x<size> grid
+        spanning <x_range> x <y_range> (row-major, the first row at y_range[0]).
+
+        Returns:
+        --------
+            A numpy.ndarray of the smallest integer type with the pixel of each sample.
+            Non-finite samples and samples outside the grid get the code size*size.
+    """
+    cols = _raster_pixels(x, x_range, size)
+    rows = _raster_pixels(y, y_range, size)
+    with np.errstate(invalid = 'ignore'):
+        inside = (cols >= 0) & (cols < size) & (rows >= 0) & (rows < size)
+    codes = np.where(inside, rows * size + cols, size * size)
+    return codes.astype(np.min_scalar_type(size * size))
+
+def _raster_pixels(values, values_range, size):
+    width = values_range[1] - values_range[0]
+    if width <= 0:
+        return np.where(np.isfinite(values), size // 2, -1)
+    with np.errstate(invalid = 'ignore'):
+        return np.floor((values - values_range[0]) * (size / width))
+
+def raster_counts(codes, size, weights = None):
+    """
+        Counts the encoded samples (see encode_raster) of each pixel with one bincount.
+
+        Parameters:
+        --------
+            codes       A numpy.ndarray of the pixel codes.
+            size        An Int of the number of pixels per side of the grid.
+            weights     A numpy.ndarray of the weight of each sample (e.g. a boolean selection mask).
+                        If None, every sample has weight 1.
+        Returns:
+        --------
+            A <size>x<size> numpy.ndarray of the counts, the first row at the bottom of the grid.
+    """
+    if weights is not None:
+        weights = np.asarray(weights, dtype = np.float64)
+    counts = np.bincount(codes, weights = weights, minlength = size * size + 1)[:size * size]
+    return counts.reshape(size, size)
 
 def hist(x, density=True, bins=20, range=()):    
     return np.histogram(x, range=range, density=density, bins=bins)
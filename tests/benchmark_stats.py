@@ -0,0 +1,100 @@
+"""Benchmarks the density estimates and contours of `ipme.utils.stats`.
+
+Run with `python -m tests.benchmark_stats` from the repository root.
+"""
+
+import time
+
+import arviz as az
+import numpy as np
+
+from tests.test_stats import reference_kde, reference_pmf
+from ipme.classes.cell.utils.cell_scatter_handler import CellScatterHandler
+from ipme.utils.stats import encode_discrete, kde, pmf, pmf_from_codes
+
+
+def best_time(func, repeat):
+    """Returns the fastest of <repeat> runs of func() in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_kde():
+    """Times kde() against scipy gaussian_kde."""
+    rng = np.random.default_rng(0)
+    row = '{:>9} {:>11.2f} ms {:>11.2f} ms {:>8.0f}x'
+    print('{:>9} {:>14} {:>14} {:>9}'.format('samples', 'gaussian_kde',
+                                             'kde', 'speedup'))
+    for n in (10**3, 10**4, 10**5, 10**6):
+        samples = rng.normal(size=n)
+        repeat = 3 if n < 10**6 else 1
+        t_ref = best_time(lambda: reference_kde(samples), repeat)
+        t_kde = best_time(lambda: kde(samples), 20)
+        print(row.format(n, 1e3 * t_ref, 1e3 * t_kde, t_ref / t_kde))
+
+
+def benchmark_pmf():
+    """Times the pmfs of 1e6 draws of 1e3 levels, full and 30% selected."""
+    rng = np.random.default_rng(0)
+    samples = rng.integers(0, 1000, 10**6).astype(float)
+    mask = rng.random(samples.size) < 0.3
+    codes, levels = encode_discrete(samples)
+    row = '{:<34} {:>9.2f} ms'
+    print()
+    print('pmf of 1e6 draws, 1e3 levels')
+    print(row.format('per-level count (full)',
+                     1e3 * best_time(lambda: reference_pmf(samples), 1)))
+    print(row.format('per-level count (selection)',
+                     1e3 * best_time(lambda: reference_pmf(samples[mask]),
+                                     1)))
+    print(row.format('pmf (full)', 1e3 * best_time(lambda: pmf(samples), 3)))
+    print(row.format('encode_discrete (once per values)',
+                     1e3 * best_time(lambda: encode_discrete(samples), 3)))
+    print(row.format('pmf_from_codes (full)',
+                     1e3 * best_time(lambda: pmf_from_codes(codes, levels),
+                                     20)))
+    print(row.format('pmf_from_codes (selection)',
+                     1e3 * best_time(
+                         lambda: pmf_from_codes(codes, levels, mask), 20)))
+
+
+def reference_contours(x, y):
+    """Returns the contour patches of <x>,<y> drawn by arviz plot_kde."""
+    _, contour_glyphs = az.plot_kde(
+        x, y, contour_kwargs={"line_color": "black", "line_alpha": 1},
+        contourf_kwargs={"fill_alpha": 0, "cmap": "viridis"},
+        backend="bokeh", return_glyph=True, show=False)
+    return ([renderer.data_source.data['x'].tolist()
+             for renderer in contour_glyphs],
+            [renderer.data_source.data['y'].tolist()
+             for renderer in contour_glyphs])
+
+
+def benchmark_contours():
+    """Times the scatter contours against the arviz plot_kde contours."""
+    rng = np.random.default_rng(0)
+    row = '{:>9} {:>11.2f} ms {:>11.2f} ms {:>8.1f}x'
+    print()
+    print('{:>9} {:>14} {:>14} {:>9}'.format('samples', 'az.plot_kde',
+                                             'get_contours', 'speedup'))
+    for n in (2 * 10**3, 2 * 10**4, 2 * 10**5):
+        x, y = rng.multivariate_normal([0., 1.], [[1., 0.8], [0.8, 2.]], n).T
+        t_ref = best_time(lambda: reference_contours(x, y), 3)
+        t_contours = best_time(lambda: CellScatterHandler.get_contours(x, y),
+                               10)
+        print(row.format(n, 1e3 * t_ref, 1e3 * t_contours,
+                         t_ref / t_contours))
+
+
+def main():
+    benchmark_kde()
+    benchmark_pmf()
+    benchmark_contours()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Tests for `ipme.utils.cache.LRUCache`."""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from ipme.utils.cache import LRUCache, get_base_nbytes
+
+
+class TestLRUCache(unittest.TestCase):
+    """Tests the eviction and the single-flight computation of LRUCache."""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2000)
+        for key in 'abc':
+            cache.put(key, np.zeros(100))
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.get_nbytes(), 1600)
+        cache.get('b')
+        cache.put('d', np.zeros(100))
+        self.assertIn('b', cache)
+        self.assertNotIn('c', cache)
+
+    def test_computes_once(self):
+        cache = LRUCache(None)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return np.arange(10)
+
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(cache.get_or_compute('x', compute)))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_caches_none(self):
+        cache = LRUCache(1000)
+        calls = []
+        for _ in range(3):
+            value = cache.get_or_compute('x', lambda: calls.append(1))
+            self.assertIsNone(value)
+        self.assertEqual(len(calls), 1)
+
+    def test_value_over_budget(self):
+        cache = LRUCache(100)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return np.zeros(100)
+
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(cache.get_or_compute('x', compute)))
+            for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # concurrent callers share the value, but it is not cached
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertNotIn('x', cache)
+        self.assertEqual(cache.get_nbytes(), 0)
+        cache.get_or_compute('x', compute)
+        self.assertEqual(len(calls), 2)
+
+    def test_failed_computation(self):
+        cache = LRUCache(None)
+
+        def fail():
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            cache.get_or_compute('x', fail)
+        self.assertEqual(cache.get_or_compute('x', lambda: 1), 1)
+        self.assertEqual(cache._in_flight, {})
+
+
+class TestGetBaseNbytes(unittest.TestCase):
+    """Tests that views are accounted with the array they keep alive."""
+
+    def test_views(self):
+        array = np.zeros((100, 10))
+        self.assertEqual(get_base_nbytes(array), 8000)
+        self.assertEqual(get_base_nbytes(array.T.view()), 8000)
+        self.assertEqual(get_base_nbytes(array[:1, :1]), 8000)
+        self.assertEqual(get_base_nbytes((array[0], 1.)), 8000)
+        self.assertEqual(get_base_nbytes({'x': array[0].copy()}), 80)
+
+    def test_memmap(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'array.npy')
+            np.save(path, np.zeros((100, 10)))
+            array = np.load(path, mmap_mode='r')
+            self.assertEqual(get_base_nbytes(array.T.view()), 0)
+            del array
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Tests for the .npy header parsing of `ipme.classes.data.data`."""
+
+import io
+import unittest
+
+import numpy as np
+
+from ipme.classes.data.data import Data
+
+
+def npy_file(array, version):
+    """Returns a file object of <array> saved in .npy format <version>."""
+    fp = io.BytesIO()
+    np.lib.format.write_array(fp, array, version=version)
+    fp.seek(0)
+    return fp
+
+
+class TestReadNpyHeader(unittest.TestCase):
+    """Tests Data._read_npy_header against the arrays written by numpy."""
+
+    def test_versions(self):
+        array = np.zeros((4, 1000, 3), dtype='<f8')
+        for version in [(1, 0), (2, 0), (3, 0)]:
+            with self.subTest(version=version):
+                shape, dtype = Data._read_npy_header(npy_file(array, version))
+                self.assertEqual(shape, array.shape)
+                self.assertEqual(dtype, array.dtype)
+
+    def test_utf8_header(self):
+        array = np.zeros(5, dtype=[('μ', '<f8'), ('σ', '<i4')])
+        shape, dtype = Data._read_npy_header(npy_file(array, (3, 0)))
+        self.assertEqual(shape, (5,))
+        self.assertEqual(dtype, array.dtype)
+
+    def test_unsupported_version(self):
+        fp = io.BytesIO(np.lib.format.magic(4, 0) + b'\x00' * 16)
+        with self.assertRaises(ValueError):
+            Data._read_npy_header(fp)
+
+    def test_not_npy(self):
+        with self.assertRaises(ValueError):
+            Data._read_npy_header(io.BytesIO(b'PK\x03\x04' + b'\x00' * 16))
+
+
+if __name__ == '__main__':
+    unittest.main()
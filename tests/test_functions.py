@@ -0,0 +1,111 @@
+"""Tests for the range selections and contours of `ipme.utils.functions`."""
+
+import unittest
+
+import numpy as np
+
+from ipme.utils.functions import (find_contour_segments, find_mask,
+                                  find_sorted_mask)
+
+
+def sorted_index(samples):
+    """Returns the argsort permutation of <samples> and its sorted values."""
+    perm = np.argsort(samples, kind='stable')
+    return perm, samples[perm]
+
+
+class TestFindSortedMask(unittest.TestCase):
+    """Tests find_sorted_mask against the full scan of find_mask."""
+
+    def assert_same_mask(self, samples, xmin, xmax):
+        perm, sorted_samples = sorted_index(samples)
+        np.testing.assert_array_equal(
+            find_sorted_mask(samples, perm, sorted_samples, xmin, xmax),
+            find_mask(samples, xmin, xmax))
+
+    def test_random_ranges(self):
+        rng = np.random.default_rng(0)
+        for step in range(500):
+            n = int(rng.integers(1, 2000))
+            samples = rng.normal(size=n)
+            if step % 3 == 0:
+                # repeated values
+                samples = np.round(samples, 1)
+            xmin, xmax = np.sort(rng.normal(scale=1.5, size=2))
+            with self.subTest(step=step):
+                self.assert_same_mask(samples, xmin, xmax)
+
+    def test_bounds_equal_to_samples(self):
+        rng = np.random.default_rng(1)
+        samples = np.round(rng.normal(size=1000), 1)
+        for _ in range(200):
+            xmin, xmax = np.sort(rng.choice(samples, 2))
+            with self.subTest(xmin=xmin, xmax=xmax):
+                self.assert_same_mask(samples, xmin, xmax)
+                self.assert_same_mask(samples, xmin, xmin)
+
+    def test_range_sizes(self):
+        # few, about half and most of the samples within the range
+        samples = np.random.default_rng(2).uniform(size=1000)
+        for xmin, xmax in [(0.4, 0.45), (0.2, 0.7), (0.01, 0.99),
+                           (-1., 2.), (2., 3.), (0.6, 0.4)]:
+            with self.subTest(xmin=xmin, xmax=xmax):
+                self.assert_same_mask(samples, xmin, xmax)
+
+    def test_non_finite(self):
+        rng = np.random.default_rng(3)
+        samples = rng.normal(size=1000)
+        samples[rng.integers(0, 1000, 50)] = np.nan
+        samples[:5] = [np.inf, -np.inf, np.inf, 0., 0.]
+        for xmin, xmax in [(-1., 1.), (0., 0.), (-np.inf, np.inf),
+                           (-10., 10.)]:
+            with self.subTest(xmin=xmin, xmax=xmax):
+                self.assert_same_mask(samples, xmin, xmax)
+
+
+class TestFindContourSegments(unittest.TestCase):
+    """Tests the marching squares contours on fields of known contours."""
+
+    def setUp(self):
+        self.grid = np.linspace(-2, 2, 201)
+        self.x, self.y = np.meshgrid(self.grid, self.grid)
+
+    def test_circle(self):
+        # the radius falls between the grid points, so that no end point
+        # is a grid point shared by more than two cells
+        radius = 1.2345
+        segments = find_contour_segments(self.grid, self.grid,
+                                         self.x**2 + self.y**2, [radius**2])
+        for end in ('0', '1'):
+            np.testing.assert_allclose(
+                np.hypot(segments['x' + end], segments['y' + end]), radius,
+                atol=1e-4)
+        lengths = np.hypot(segments['x1'] - segments['x0'],
+                           segments['y1'] - segments['y0'])
+        self.assertAlmostEqual(lengths.sum(), 2 * np.pi * radius, places=3)
+        # a closed curve: every end point is shared by two segments
+        ends = np.round(np.r_[np.c_[segments['x0'], segments['y0']],
+                              np.c_[segments['x1'], segments['y1']]], 9)
+        _, counts = np.unique(ends, axis=0, return_counts=True)
+        self.assertTrue(np.all(counts == 2))
+
+    def test_rows_along_y(self):
+        # z varies along the rows only: horizontal contours at y = level
+        segments = find_contour_segments(self.grid, self.grid[:101],
+                                         self.y[:101], [-1.234, -0.5])
+        for end in ('0', '1'):
+            self.assertEqual(
+                set(np.round(segments['y' + end], 12)), {-1.234, -0.5})
+        lengths = np.abs(segments['x1'] - segments['x0'])
+        self.assertAlmostEqual(lengths.sum(), 2 * 4.)
+
+    def test_levels_out_of_range(self):
+        segments = find_contour_segments(self.grid, self.grid,
+                                         self.x**2 + self.y**2, [-1., 9.])
+        self.assertEqual(sorted(segments), ['x0', 'x1', 'y0', 'y1'])
+        for values in segments.values():
+            self.assertEqual(values.size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Tests for the selection intersection of `IC`."""
+
+import unittest
+from functools import reduce
+
+import numpy as np
+
+from ipme.classes.interaction_control.interaction_control import IC
+
+
+def reference_intersection(masks, num_samples):
+    """Returns the logical and of <masks> (no selection if there is none)."""
+    if not len(masks):
+        return np.zeros(num_samples, dtype=bool)
+    return reduce(np.logical_and, masks)
+
+
+class TestIntersection(unittest.TestCase):
+    """Tests the incremental intersection against np.logical_and."""
+
+    num_samples = 1000
+    variables = ['a', 'b', 'c', 'd']
+
+    def setUp(self):
+        self.ic = IC(None)
+        self.rng = np.random.default_rng(0)
+        self.masks = {}
+        for space in ('prior', 'posterior'):
+            self.ic.initialize_sample_inds(space, self.num_samples)
+            self.masks[space] = {}
+
+    def tearDown(self):
+        self.ic._dispatcher.shutdown()
+        self.ic._prefetcher.shutdown()
+
+    def select(self, space, var_name):
+        mask = self.rng.random(self.num_samples) < self.rng.uniform(.3, .9)
+        self.masks[space][var_name] = mask
+        self.ic.set_sel_var_mask(space, var_name, mask)
+
+    def clear(self, space, var_name):
+        self.masks[space].pop(var_name, None)
+        self.ic.delete_sel_var_mask(space, var_name)
+
+    def assert_intersection(self, space):
+        inds, non_inds = self.ic.get_sample_inds(space)
+        reference = reference_intersection(
+            list(self.masks[space].values()), self.num_samples)
+        np.testing.assert_array_equal(inds, reference)
+        np.testing.assert_array_equal(non_inds, ~reference)
+
+    def test_full_intersection(self):
+        for var_name in self.variables:
+            self.select('posterior', var_name)
+        self.ic.compute_intersection_of_samples('posterior')
+        self.assert_intersection('posterior')
+        self.assert_intersection('prior')
+
+    def test_incremental_intersection(self):
+        for step in range(200):
+            space = ('prior', 'posterior')[step % 2]
+            var_name = self.variables[self.rng.integers(len(self.variables))]
+            if self.rng.random() < 0.3:
+                self.clear(space, var_name)
+            else:
+                self.select(space, var_name)
+            with self.subTest(step=step):
+                self.ic.compute_intersection_of_samples(space, var_name)
+                self.assert_intersection(space)
+
+    def test_rest_masks_after_clear(self):
+        for var_name in self.variables:
+            self.select('posterior', var_name)
+            self.ic.compute_intersection_of_samples('posterior', var_name)
+        # the cached intersections of the other variables include 'b'
+        self.clear('posterior', 'b')
+        for var_name in ('a', 'c', 'b'):
+            self.select('posterior', var_name)
+            self.ic.compute_intersection_of_samples('posterior', var_name)
+            self.assert_intersection('posterior')
+        for var_name in self.variables:
+            self.clear('posterior', var_name)
+            self.ic.compute_intersection_of_samples('posterior', var_name)
+            self.assert_intersection('posterior')
+        self.assertFalse(self.ic.get_sample_inds('posterior')[0].any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,316 @@
+"""Tests for the density estimates of `ipme.utils.stats`."""
+
+import unittest
+
+import numpy as np
+from scipy.stats import gaussian_kde
+
+from ipme.utils.functions import get_finite_samples, get_samples_for_pred_check
+from ipme.utils.stats import (encode_discrete, hdi_levels, kde, kde_2d,
+                              kde_batch, kde_support, pmf, pmf_from_codes,
+                              pred_check_stats)
+
+
+def reference_kde(samples):
+    """Returns scipy gaussian_kde of <samples> on its kde_support() points."""
+    kde_samples = gaussian_kde(samples)
+    bw = kde_samples.scotts_factor() * samples.std(ddof=1)
+    x = kde_support(bw, bin_range=(samples.min(), samples.max()))
+    return x, kde_samples(x)
+
+
+def reference_pmf(samples):
+    """Returns the pmf of <samples> counted one level at a time."""
+    samples = samples.flatten()
+    if ~np.isfinite(samples).all():
+        samples = get_finite_samples(samples)
+    x = np.sort(np.unique(samples))
+    y = np.asarray([np.count_nonzero(samples == xi) / len(samples)
+                    for xi in x])
+    return dict(x=x, y=y, y0=np.zeros(len(x)))
+
+
+def reference_pred_check(samples, func):
+    """Returns the statistic <func> of the finite draws of <samples>."""
+    if ~np.isfinite(samples).all():
+        samples = get_finite_samples(samples)
+    return get_samples_for_pred_check(samples, func)
+
+
+class TestKde(unittest.TestCase):
+    """Tests the binned FFT kde against scipy.stats.gaussian_kde."""
+
+    # linear binning on a grid of step <= bw/8 errs by about 1e-3 of the peak
+    rtol = 2e-3
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.distributions = {
+            'normal': lambda n: rng.normal(size=n),
+            'bimodal': lambda n: np.r_[rng.normal(-3, 0.5, n // 2),
+                                       rng.normal(2, 1, n - n // 2)],
+            'lognormal': lambda n: rng.lognormal(0, 1, n),
+            'cauchy': lambda n: rng.standard_cauchy(n),
+            'poisson': lambda n: rng.poisson(3, n).astype(float),
+        }
+
+    def assert_close_to_reference(self, samples, density):
+        x, y = reference_kde(samples)
+        np.testing.assert_allclose(density['x'], x)
+        np.testing.assert_allclose(density['y'], y, rtol=0,
+                                   atol=self.rtol * y.max())
+
+    def test_matches_gaussian_kde(self):
+        for name, draw in self.distributions.items():
+            for n in (100, 1000, 10000):
+                with self.subTest(distribution=name, n=n):
+                    samples = draw(n)
+                    self.assert_close_to_reference(samples, kde(samples))
+
+    def test_batch_matches_gaussian_kde(self):
+        block = np.column_stack([draw(5000)
+                                 for draw in self.distributions.values()])
+        for col, density in enumerate(kde_batch(block)):
+            with self.subTest(column=col):
+                self.assert_close_to_reference(block[:, col], density)
+
+    def test_heavy_tails(self):
+        # the kernels are narrower than the support step: evaluated exactly
+        samples = self.distributions['cauchy'](100000)
+        x, y = reference_kde(samples)
+        np.testing.assert_allclose(kde(samples)['y'], y, rtol=0,
+                                   atol=1e-9 * y.max())
+
+    def test_filled(self):
+        samples = self.distributions['normal'](1000)
+        density = kde(samples)
+        filled = kde(samples, filled=True)
+        self.assertEqual(len(filled['x']), len(density['x']) + 2)
+        self.assertEqual((filled['y'][0], filled['y'][-1]), (0.0, 0.0))
+        np.testing.assert_array_equal(filled['y'][1:-1], density['y'])
+
+    def test_empty(self):
+        density = kde(np.array([]))
+        self.assertEqual(density['x'].size, 0)
+        self.assertEqual(density['y'].size, 0)
+
+    def test_single(self):
+        density = kde(np.array([1.5]))
+        self.assertEqual(density['x'].size, 0)
+        self.assertEqual(density['y'].size, 0)
+
+    def test_constant(self):
+        density = kde(np.full(50, 2.))
+        np.testing.assert_array_equal(density['x'], np.arange(-50, 50))
+        self.assertEqual(density['y'].sum(), 1.)
+        self.assertEqual(density['y'][50], 1.)
+
+    def test_non_finite(self):
+        samples = self.distributions['normal'](1000)
+        with_nan = np.r_[samples, np.nan, np.inf, -np.inf]
+        self.assert_close_to_reference(samples, kde(with_nan))
+        density = kde(np.array([np.nan, np.nan]))
+        self.assertEqual(density['y'].size, 0)
+
+    def test_batch_columns(self):
+        samples = self.distributions['normal'](1000)
+        block = np.column_stack([samples, np.full(1000, 3.),
+                                 np.r_[np.nan * np.ones(999), 1.]])
+        densities = kde_batch(block)
+        self.assert_close_to_reference(samples, densities[0])
+        np.testing.assert_array_equal(densities[1]['x'], np.arange(-50, 50))
+        self.assertEqual(densities[2]['y'].size, 0)
+
+
+class TestPmf(unittest.TestCase):
+    """Tests the integer-coded pmfs against the pmf counted per level."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.samples = {
+            'poisson': rng.poisson(3, 10000).astype(float),
+            'signed': rng.integers(-500, 500, (100, 50)).astype(float),
+            'levels': rng.choice([0.5, 2., 1e6], 1000),
+            'non_finite': np.r_[rng.poisson(3, 1000), np.nan, np.inf, -np.inf],
+        }
+
+    def assert_equal_pmf(self, density, reference):
+        self.assertEqual(density.keys(), reference.keys())
+        for key in reference:
+            np.testing.assert_array_equal(density[key], reference[key])
+
+    def test_pmf(self):
+        for name, samples in self.samples.items():
+            with self.subTest(samples=name):
+                self.assert_equal_pmf(pmf(samples), reference_pmf(samples))
+
+    def test_encode_discrete(self):
+        for name, samples in self.samples.items():
+            with self.subTest(samples=name):
+                codes, levels = encode_discrete(samples)
+                finite = np.isfinite(samples.flatten())
+                np.testing.assert_array_equal(levels[codes[finite]],
+                                              samples.flatten()[finite])
+                self.assertTrue((codes[~finite] == len(levels)).all())
+                self.assertEqual(codes.dtype,
+                                 np.min_scalar_type(len(levels)))
+
+    def test_pmf_from_codes(self):
+        for name, samples in self.samples.items():
+            with self.subTest(samples=name):
+                codes, levels = encode_discrete(samples)
+                self.assert_equal_pmf(pmf_from_codes(codes, levels),
+                                      reference_pmf(samples))
+
+    def test_selection(self):
+        rng = np.random.default_rng(1)
+        for name, samples in self.samples.items():
+            with self.subTest(samples=name):
+                codes, levels = encode_discrete(samples)
+                mask = rng.random(samples.size) < 0.3
+                self.assert_equal_pmf(
+                    pmf_from_codes(codes, levels, mask),
+                    reference_pmf(samples.flatten()[mask]))
+
+    def test_empty_selection(self):
+        codes, levels = encode_discrete(self.samples['poisson'])
+        density = pmf_from_codes(codes, levels, np.zeros(codes.size, bool))
+        for key in ('x', 'y', 'y0'):
+            self.assertEqual(density[key].size, 0)
+
+
+class TestKde2d(unittest.TestCase):
+    """Tests the binned FFT 2-D kde against scipy.stats.gaussian_kde."""
+
+    # linear binning on the 128x128 grid errs by about 5e-3 of the peak
+    rtol = 6e-3
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.samples = {
+            'correlated': rng.multivariate_normal(
+                [0., 1.], [[1., 0.8], [0.8, 2.]], 20000).T,
+            'bimodal': np.c_[rng.normal(-3, 0.5, (2, 5000)),
+                             rng.normal(2, 1, (2, 5000))],
+            'small': rng.normal(size=(2, 200)),
+        }
+
+    def assert_close_to_reference(self, x, y, density):
+        grid_x, grid_y = np.meshgrid(density['x'], density['y'])
+        reference = gaussian_kde(np.vstack([x, y]))(
+            np.vstack([grid_x.ravel(), grid_y.ravel()]))
+        # one row of density per y coordinate
+        reference = reference.reshape(grid_x.shape)
+        np.testing.assert_allclose(density['density'], reference, rtol=0,
+                                   atol=self.rtol * reference.max())
+
+    def test_matches_gaussian_kde(self):
+        for name, (x, y) in self.samples.items():
+            with self.subTest(samples=name):
+                self.assert_close_to_reference(x, y, kde_2d(x, y))
+
+    def test_mass(self):
+        x, y = self.samples['correlated']
+        density = kde_2d(x, y)
+        area = ((density['x'][1] - density['x'][0]) *
+                (density['y'][1] - density['y'][0]))
+        self.assertAlmostEqual(density['density'].sum() * area, 1., places=4)
+
+    def test_non_finite(self):
+        x, y = self.samples['small']
+        x_nan = np.r_[x, np.nan, 0., np.inf]
+        y_nan = np.r_[y, 0., -np.inf, 0.]
+        density = kde_2d(x_nan, y_nan)
+        np.testing.assert_array_equal(density['density'],
+                                      kde_2d(x, y)['density'])
+
+    def test_degenerate(self):
+        self.assertIsNone(kde_2d(np.array([1., 2.]), np.array([1., 3.])))
+        x = np.random.default_rng(1).normal(size=100)
+        self.assertIsNone(kde_2d(x, 2 * x + 1))
+        self.assertIsNone(kde_2d(x, np.full(100, 3.)))
+
+
+class TestHdiLevels(unittest.TestCase):
+    """Tests the probability mass above the levels of hdi_levels."""
+
+    probs = [0.393, 0.865, 0.989]
+
+    def test_mass_above_levels(self):
+        density = kde_2d(*np.random.default_rng(0).normal(size=(2, 5000)))
+        values = density['density']
+        total = values.sum()
+        for level, prob in zip(hdi_levels(values, self.probs), self.probs):
+            with self.subTest(prob=prob):
+                # the level is the lowest value of the highest cells
+                # holding at least <prob> of the mass
+                self.assertGreaterEqual(values[values >= level].sum(),
+                                        prob * total)
+                self.assertLess(values[values > level].sum(), prob * total)
+
+    def test_standard_normal(self):
+        # the region of mass p is the disc of density (1 - p) / (2 pi)
+        grid = np.linspace(-6, 6, 601)
+        x, y = np.meshgrid(grid, grid)
+        density = np.exp(-(x**2 + y**2) / 2) / (2 * np.pi)
+        np.testing.assert_allclose(hdi_levels(density, self.probs),
+                                   (1 - np.array(self.probs)) / (2 * np.pi),
+                                   rtol=2e-3)
+
+    def test_descending_levels(self):
+        density = np.random.default_rng(2).random((50, 50))
+        levels = hdi_levels(density, self.probs)
+        self.assertTrue(np.all(np.diff(levels) < 0))
+        self.assertEqual(hdi_levels(density, [1.])[0], density.min())
+
+
+class TestPredCheckStats(unittest.TestCase):
+    """Tests the one-pass check statistics against the per-function ones."""
+
+    funcs = ['min', 'max', 'mean', 'std']
+
+    def assert_same_stats(self, samples, chunk_size=2**16):
+        stats = pred_check_stats(samples, chunk_size=chunk_size)
+        for func in self.funcs:
+            with self.subTest(func=func):
+                # the draws with non-finite samples are NaN instead of left out
+                finite = stats[func][np.isfinite(stats[func])]
+                np.testing.assert_allclose(
+                    finite, reference_pred_check(samples, func), rtol=1e-12)
+
+    def test_draws_by_observations(self):
+        samples = np.random.default_rng(0).normal(size=(2000, 30))
+        self.assert_same_stats(samples)
+        self.assert_same_stats(samples, chunk_size=100)
+
+    def test_many_dimensions(self):
+        samples = np.random.default_rng(1).poisson(3, (500, 4, 6))
+        self.assert_same_stats(samples.astype(float))
+
+    def test_non_finite(self):
+        samples = np.random.default_rng(2).normal(size=(1000, 10))
+        samples[[3, 40, 41], [0, 9, 5]] = [np.nan, np.inf, -np.inf]
+        self.assert_same_stats(samples)
+        stats = pred_check_stats(samples)
+        self.assertEqual(np.isnan(stats['mean']).sum(), 3)
+
+    def test_one_dimension(self):
+        # one value per draw: the statistics of the draws of one observation
+        # (get_samples_for_pred_check reduces them to a single value)
+        samples = np.random.default_rng(3).normal(size=1000)
+        stats = pred_check_stats(samples)
+        self.assert_same_stats(samples[:, np.newaxis])
+        for func in ['min', 'max', 'mean']:
+            np.testing.assert_array_equal(stats[func], samples)
+        np.testing.assert_array_equal(stats['std'], np.zeros(1000))
+        self.assertEqual(np.size(reference_pred_check(samples, 'mean')), 1)
+
+    def test_empty(self):
+        for samples in (np.array([]), np.zeros((0, 5))):
+            stats = pred_check_stats(samples)
+            for func in self.funcs:
+                self.assertEqual(stats[func].size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()